@@ -0,0 +1,115 @@
+'''
+Benchmark a dans run over a multi-year history
+
+Compares the previous linear scans for last-alert lookup and retention, against the product index in
+informa.plugins.dans.HistoryIndex. Compacting history outside the retention windows into daily & weekly
+summaries happens once, on the first run after upgrading, so it is timed separately. The first indexed run
+then starts from compacted state, as loaded from disk.
+'''
+
+import datetime
+import decimal
+import random
+import timeit
+
+from informa.lib.utils import now_aest
+from informa.plugins.dans import Config, History, Product, State, add_to_history
+
+PRODUCTS = 100
+DAYS = 3 * 365
+QUERIES_PER_DAY = 2
+ROUNDS = 3
+
+
+def make_history() -> tuple[list[Product], State]:
+    rnd = random.Random(1)
+    start = now_aest() - datetime.timedelta(days=DAYS)
+    products = [Product(str(i), f'Product {i}', 20 + i) for i in range(PRODUCTS)]
+
+    return products, State(
+        history=[
+            History(
+                product,
+                decimal.Decimal(f'{rnd.uniform(15, 80):.2f}'),
+                start + datetime.timedelta(hours=24 / QUERIES_PER_DAY * q),
+                alerted=rnd.random() < 0.01,  # noqa: PLR2004
+            )
+            for q in range(DAYS * QUERIES_PER_DAY)
+            for product in products
+        ]
+    )
+
+
+def legacy_run(products: list[Product], history: list[History]):
+    '''
+    Lookup and retention as previously implemented, with reverse & full scans of history per product. The
+    retention comparison is corrected, so expired items are removed.
+    '''
+    for product in products:
+        for history_item in reversed(history):
+            if history_item.product == product and history_item.alerted:
+                break
+
+        for i, history_item in enumerate(history):
+            if history_item.ts < now_aest() - datetime.timedelta(days=400):
+                del history[i]
+
+        history.append(History(product, decimal.Decimal('20.00'), now_aest()))
+
+
+def indexed_run(products: list[Product], state: State):
+    config = Config(products)
+    for product in products:
+        state.index.get_last_alert(product)
+        add_to_history(state, History(product, decimal.Decimal('20.00'), now_aest()), config)
+
+
+def main():
+    products, state = make_history()
+    print(f'{len(state.history)} history items over {DAYS} days')
+
+    # Each round runs against a fresh copy, as the first run prunes expired history
+    results = {
+        'linear scans': min(
+            timeit.repeat(
+                'legacy_run(products, history)',
+                setup='history = list(state.history)',
+                globals={**globals(), 'products': products, 'state': state},
+                number=1,
+                repeat=ROUNDS,
+            )
+        ),
+        'compaction (once)': min(
+            timeit.repeat(
+                'indexed_run(products, s)',
+                setup='s = State(history=list(state.history))',
+                globals={**globals(), 'products': products, 'state': state},
+                number=1,
+                repeat=ROUNDS,
+            )
+        ),
+    }
+
+    s = State(history=list(state.history))
+    indexed_run(products, s)
+
+    # Compacted state freshly loaded, so the index is built on first use
+    results['indexed (first)'] = min(
+        timeit.repeat(
+            'indexed_run(products, loaded)',
+            setup='loaded = State(history=list(s.history), daily=list(s.daily), weekly=list(s.weekly))',
+            globals={**globals(), 'products': products, 's': s},
+            number=1,
+            repeat=ROUNDS,
+        )
+    )
+
+    # Steady state: index already built, as with state cached between runs
+    results['indexed (next)'] = min(timeit.repeat(lambda: indexed_run(products, s), number=1, repeat=ROUNDS))
+
+    for name, secs in results.items():
+        print(f'{name:>18}: {secs * 1000:10.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
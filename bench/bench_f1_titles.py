@@ -0,0 +1,111 @@
+'''
+Benchmark matching torrent titles over a large synthetic torrentgalaxy feed
+
+Compares the previous substring checks in check_torrentgalaxy, against the compiled title rules in
+informa.plugins.f1torrents.Config, with the default rules alone, and alongside rules for other series.
+'''
+
+import random
+import timeit
+
+from informa.plugins.f1torrents import DEFAULT_TITLE_RULES, TitleRule, match_title
+
+ENTRIES = 20000
+SEASON = 2025
+ROUNDS = 5
+NUMBER = 3
+
+SESSIONS = [
+    'Race',
+    'Qualifying',
+    'Sprint',
+    'Sprint.Qualifying',
+    'Season.Review',
+    'Pre-Race.Buildup',
+    'Teds.Notebook',
+    'FP1',
+]
+
+
+def make_titles() -> list[str]:
+    rnd = random.Random(1)
+    titles = []
+
+    for _ in range(ENTRIES):
+        kind = rnd.random()
+        season = rnd.choice([SEASON, SEASON - 1])
+        if kind < 0.6:  # noqa: PLR2004
+            quality = rnd.choice(['SkyF1HD.1080p', 'SkyF1HD.SD', 'F1TV.1080p'])
+            session = rnd.choice(SESSIONS)
+            # Season reviews are not part of a round
+            race = season if session == 'Season.Review' else f'{season}x{rnd.randint(1, 24):02}.GP'
+            titles.append(f'Formula.1.{race}.{session}.{quality}')
+        elif kind < 0.8:  # noqa: PLR2004
+            titles.append(f'Formula.2.{season}x{rnd.randint(1, 14):02}.GP.Feature.Race.1080p')
+        else:
+            titles.append(f'Some.Show.S{rnd.randint(1, 9):02}E{rnd.randint(1, 20):02}.1080p.WEB.h264')
+
+    return titles
+
+
+def match_previous(title: str, current_season: int) -> str | None:
+    'The previous checks in check_torrentgalaxy'
+    RACE_TYPES = {'Race', 'Qualifying', 'Sprint', 'Season.Review', 'Shootout'}
+
+    if 'Formula.1' in title and str(current_season) in title and 'SkyF1HD.1080p' in title:
+        if not any(s in title for s in RACE_TYPES) or 'Teds' in title:
+            return None
+
+        if 'Sprint' in title:
+            session_type = 'sq' if 'Qualifying' in title else 'sr'
+        elif 'Qualifying' in title:
+            session_type = 'qu'
+        elif 'Race' in title:
+            session_type = 'ra'
+        else:
+            session_type = 'rv'
+
+        return f'{title[10:17]}{session_type}'
+
+    return None
+
+
+def main():
+    titles = make_titles()
+
+    rules = list(DEFAULT_TITLE_RULES)
+    series_rules = [
+        *rules,
+        TitleRule(
+            r'^Formula\.2\.(?P<season>\d{4})x(?P<round>\d{2})\..*\.(?P<session>Feature|Sprint)\.',
+            {'Feature': 'fe', 'Sprint': 'sp'},
+            'f2-',
+        ),
+        TitleRule(
+            r'^Formula\.1\.(?P<season>\d{4})x(?P<round>\d{2})\..*\.(?P<session>Race|Qualifying)\.F1TV\.1080p',
+            {'Race': 'ra', 'Qualifying': 'qu'},
+            'f1tv-',
+        ),
+    ]
+
+    # The rules and the previous checks agree, except the rules no longer take a Pre-Race show for the race
+    for title in titles:
+        if 'Pre-Race' not in title:
+            assert match_title(title, rules, SEASON) == match_previous(title, SEASON), title
+
+    cases = {
+        'previous': lambda: [match_previous(t, SEASON) for t in titles],
+        'rules': lambda: [match_title(t, rules, SEASON) for t in titles],
+        'series rules': lambda: [match_title(t, series_rules, SEASON) for t in titles],
+    }
+
+    print(f'{ENTRIES} titles')
+
+    results = {name: min(timeit.repeat(case, number=NUMBER, repeat=ROUNDS)) / NUMBER for name, case in cases.items()}
+
+    for name, secs in results.items():
+        print(f'{name:>15}: {secs * 1000:8.2f}ms  {secs / ENTRIES * 1e9:6.0f}ns/title')
+
+
+if __name__ == '__main__':
+    main()
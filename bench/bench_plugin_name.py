@@ -0,0 +1,66 @@
+'''
+Benchmark per-call overhead of resolving the plugin name in @pass_plugin_name
+
+Compares the current implementation against the previous `inspect.stack()` lookup, called from a nested
+stack similar to a Rocketry task thread.
+'''
+
+import inspect
+import threading
+import timeit
+
+from informa.lib import pass_plugin_name
+
+STACK_DEPTH = 30
+CALLS = 2000
+
+
+def pass_plugin_name_stack(func):
+    'Previous implementation, using inspect.stack()'
+
+    def inner(*args, **kwargs):
+        frame = inspect.stack()[1]
+        plugin_name = inspect.getmodule(frame[0]).__name__
+        return func(plugin_name, *args, **kwargs)
+
+    return inner
+
+
+@pass_plugin_name
+def current(plugin_name: str) -> str:
+    return plugin_name
+
+
+@pass_plugin_name_stack
+def previous(plugin_name: str) -> str:
+    return plugin_name
+
+
+def nested(depth: int, func):
+    'Call `func` from a stack of `depth` frames'
+    if depth:
+        return nested(depth - 1, func)
+    return timeit.timeit(lambda: func(), number=CALLS) / CALLS  # noqa: PLW0108
+
+
+def run(results: dict, name: str, func):
+    results[name] = nested(STACK_DEPTH, func)
+
+
+def main():
+    results: dict[str, float] = {}
+
+    for name, func in (('inspect.stack', previous), ('frame globals', current)):
+        # Run in a thread, as plugins do under Rocketry
+        t = threading.Thread(target=run, args=(results, name, func))
+        t.start()
+        t.join()
+
+    for name, per_call in results.items():
+        print(f'{name:>15}: {per_call * 1e6:10.2f}us per call')
+
+    print(f'{"speedup":>15}: {results["inspect.stack"] / results["frame globals"]:10.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+'''
+Benchmark each plugin's main() end-to-end, offline
+
+Replays the plugin's recorded exchanges from test/fixtures/replay, so the timing covers parsing, state updates
+and serialisation of state, but no network. Record a fixture with `informa plugin <name> record`.
+
+Save a baseline with `--save`, and compare against it with `--compare`, which exits non-zero when any plugin
+is slower than `--threshold` times its baseline.
+'''
+
+import argparse
+import sys
+import time
+
+import orjson
+
+from informa.lib import get_plugin
+from informa.lib.codec import encode
+from informa.lib.registry import load_plugin, manifest
+from informa.lib.replay import Cassette, fixture_path, run_main
+
+ROUNDS = 20
+
+
+def time_plugin(plugin_name: str) -> float:
+    'Return the fastest duration of main() plus encoding its state, over ROUNDS replays'
+    plugin = get_plugin(plugin_name)
+    durations = []
+
+    for _ in range(ROUNDS):
+        # Each replay consumes the cassette
+        cassette = Cassette.load(fixture_path(plugin_name))
+
+        with cassette:
+            start = time.perf_counter()
+            state = plugin.state_cls()
+            run_main(plugin, cassette, state)
+            encode(state)
+            durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--save', metavar='PATH', help='Write timings to a baseline file')
+    parser.add_argument('--compare', metavar='PATH', help='Compare timings with a baseline file')
+    parser.add_argument('--threshold', type=float, default=1.25, help='Allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    # Load plugins up-front, so their import time is not measured
+    plugins = []
+    for filename, entry in manifest().items():
+        try:
+            with open(fixture_path(entry.import_path), 'rb'):
+                pass
+        except FileNotFoundError:
+            continue
+        load_plugin(filename)
+        plugins.append(entry.import_path)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'rb') as f:
+            baseline = orjson.loads(f.read())
+
+    results = {}
+    regressed = False
+
+    for plugin_name in plugins:
+        results[plugin_name] = secs = time_plugin(plugin_name)
+        line = f'{plugin_name:>30}: {secs * 1000:8.2f}ms'
+
+        if plugin_name in baseline:
+            ratio = secs / baseline[plugin_name]
+            line += f'  {ratio:5.2f}x baseline'
+            if ratio > args.threshold:
+                line += '  REGRESSED'
+                regressed = True
+
+        print(line)
+
+    if args.save:
+        with open(args.save, 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+Benchmark the rtorrent priority sweep against an in-process fake rtorrent
+
+Times listing and describing every torrent with the blocking RTorrent client, against the first sweep with
+AsyncRTorrent which sets all tags & priorities, and a steady-state sweep once every torrent is settled.
+'''
+
+import asyncio
+import pathlib
+import sys
+import threading
+import timeit
+from unittest.mock import patch
+
+from informa.plugins import f1torrents
+
+# The fake rtorrent is shared with the tests
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent / 'test'))
+from conftest import FakeRtorrent  # noqa: E402
+
+TORRENTS = 200
+FILES = 10
+ROUNDS = 5
+NUMBER = 5
+
+
+def add_torrents(server: FakeRtorrent):
+    server.torrents.clear()
+    for i in range(TORRENTS):
+        server.add_torrent(
+            f'{i:040X}',
+            f'Formula.1.2025x{i % 24:02}.Race.SkyF1HD.1080p.{i}',
+            [f'{f:02}.Session.mkv' for f in range(FILES)],
+        )
+
+
+def first_sweep(server: FakeRtorrent):
+    add_torrents(server)
+    f1torrents._settled_torrents.clear()  # noqa: SLF001
+    asyncio.run(f1torrents.set_torrent_file_priorities())
+
+
+def main():
+    server = FakeRtorrent()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    rt = f1torrents.RTorrent('127.0.0.1', server.port)
+
+    cases = {
+        'full rescan': rt.get_torrents,
+        'first sweep': lambda: first_sweep(server),
+        'settled sweep': lambda: asyncio.run(f1torrents.set_torrent_file_priorities()),
+    }
+
+    print(f'{TORRENTS} torrents of {FILES} files')
+
+    with (
+        patch.object(f1torrents, 'RTORRENT_HOST', '127.0.0.1'),
+        patch.object(f1torrents, 'RTORRENT_PORT', server.port),
+    ):
+        add_torrents(server)
+
+        for name, case in cases.items():
+            server.calls.clear()
+            case()
+            requests = len(server.calls)
+
+            secs = min(timeit.repeat(case, number=NUMBER, repeat=ROUNDS)) / NUMBER
+            print(f'{name:>15}: {secs * 1000:8.2f}ms  requests: {requests}')
+
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+Benchmark parsing a large rtorrent d.multicall2 response
+
+Compares the previous SCGITransport.parse_response, which read 1KB at a time into a str with += and regex-split
+the headers, against informa.plugins.f1torrents reading a bytes buffer to the Content-Length, and parsing with
+the xmlrpc parser or streaming downloads from the XML.
+'''
+
+import io
+import re
+import timeit
+import tracemalloc
+import xmlrpc.client
+
+from informa.plugins.f1torrents import SCGITransport, iter_response_array
+
+DOWNLOADS = 5000
+ROUNDS = 5
+NUMBER = 3
+
+
+def make_response() -> bytes:
+    downloads = [
+        [f'{i:040X}', f'Formula.1.2025x{i % 24:02}.Race.SkyF1HD.1080p.{i}', i * 1024, 'F1' if i % 3 else '']
+        for i in range(DOWNLOADS)
+    ]
+    body = xmlrpc.client.dumps((downloads,), methodresponse=True).encode()
+    return b'Status: 200 OK\r\nContent-Type: text/xml\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body)
+
+
+def parse_previous(response: bytes) -> list:
+    'The previous implementation, reading a text file of the socket'
+    p, u = xmlrpc.client.getparser()
+    f = io.TextIOWrapper(io.BufferedReader(io.BytesIO(response)))
+
+    response_body = ''
+    while True:
+        data = f.read(1024)
+        if not data:
+            break
+        response_body += data
+
+    _, response_body = re.split(r'\n\s*?\n', response_body, maxsplit=1)
+    p.feed(response_body)
+    p.close()
+    return u.close()[0]
+
+
+def parse_buffered(response: bytes) -> list:
+    p, u = xmlrpc.client.getparser()
+    for chunk in SCGITransport().read_response(io.BufferedReader(io.BytesIO(response))):
+        p.feed(chunk)
+    p.close()
+    return u.close()[0]
+
+
+def parse_streamed(response: bytes) -> list:
+    return list(iter_response_array(SCGITransport().read_response(io.BufferedReader(io.BytesIO(response)))))
+
+
+def count_streamed(response: bytes) -> int:
+    'Stream downloads without holding them, as a caller filtering or aggregating would'
+    return sum(1 for _ in iter_response_array(SCGITransport().read_response(io.BufferedReader(io.BytesIO(response)))))
+
+
+def peak_memory(func, response: bytes) -> int:
+    tracemalloc.start()
+    func(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    response = make_response()
+
+    cases = {
+        'previous': parse_previous,
+        'buffered': parse_buffered,
+        'streamed': parse_streamed,
+    }
+
+    # All parsers must return the same downloads
+    expected = parse_previous(response)
+    assert all(case(response) == expected for case in cases.values())
+    cases['streamed count'] = count_streamed
+
+    print(f'{DOWNLOADS} downloads: {len(response) / 1024:.0f}KB')
+
+    results = {
+        name: min(timeit.repeat(lambda case=case: case(response), number=NUMBER, repeat=ROUNDS)) / NUMBER
+        for name, case in cases.items()
+    }
+
+    for name, secs in results.items():
+        peak = peak_memory(cases[name], response) / 1024**2
+        print(f'{name:>15}: {secs * 1000:8.2f}ms  {results["previous"] / secs:5.1f}x  peak {peak:6.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Benchmark parsing the saved HA release notes page
+
+Compares BeautifulSoup's html.parser and lxml backends, which build a Python tree of the whole page, against
+informa.lib.scrape which selects the target elements from lxml's C tree.
+'''
+
+import timeit
+import warnings
+
+import bs4
+
+from informa.lib import scrape
+
+FIXTURE = 'test/fixtures/ha_releases.txt'
+ROUNDS = 5
+NUMBER = 20
+
+
+def extract_soup(soup: bs4.BeautifulSoup) -> tuple[str, int]:
+    'The same queries made by ha_releases'
+    return soup.select('.release-date')[0].text.strip(), len(soup.find_all('article'))
+
+
+def extract_lxml(html: str) -> tuple[str, int]:
+    page = scrape.parse(html)
+    return scrape.text(scrape.select(page, '.release-date')[0]), len(scrape.select(page, 'article'))
+
+
+def main():
+    with open(FIXTURE, encoding='utf8') as f:
+        html = f.read()
+
+    cases = {
+        'html.parser': lambda: extract_soup(bs4.BeautifulSoup(html, 'html.parser')),
+        'bs4 lxml': lambda: extract_soup(bs4.BeautifulSoup(html, 'lxml')),
+        'scrape': lambda: extract_lxml(html),
+    }
+
+    # All parsers must find the same content
+    assert len({case() for case in cases.values()}) == 1
+
+    print(f'{FIXTURE}: {len(html) / 1024:.0f}KB')
+
+    results = {name: min(timeit.repeat(case, number=NUMBER, repeat=ROUNDS)) / NUMBER for name, case in cases.items()}
+
+    for name, secs in results.items():
+        print(f'{name:>15}: {secs * 1000:8.2f}ms  {results["html.parser"] / secs:5.1f}x')
+
+
+if __name__ == '__main__':
+    warnings.simplefilter('ignore', DeprecationWarning)
+    main()
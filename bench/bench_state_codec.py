@@ -0,0 +1,59 @@
+'''
+Benchmark inflating a large dans history from JSON
+
+Compares dataclasses_json `from_dict` against the compiled codec in informa.lib.codec.
+'''
+
+import datetime
+import decimal
+import random
+import timeit
+
+import orjson
+
+from informa.lib.codec import decode, encode
+from informa.plugins.dans import History, Product, State
+
+PRODUCTS = 50
+QUERIES_PER_PRODUCT = 730  # two queries a day for a year
+ROUNDS = 3
+
+
+def make_history() -> State:
+    rnd = random.Random(1)
+    start = datetime.datetime(2023, 1, 1, tzinfo=datetime.UTC)
+    products = [Product(str(i), f'Product {i}', 20 + i) for i in range(PRODUCTS)]
+
+    return State(
+        history=[
+            History(
+                product,
+                decimal.Decimal(f'{rnd.uniform(15, 80):.2f}'),
+                start + datetime.timedelta(hours=12 * q),
+                alerted=rnd.random() < 0.05,  # noqa: PLR2004
+            )
+            for q in range(QUERIES_PER_PRODUCT)
+            for product in products
+        ]
+    )
+
+
+def main():
+    raw = encode(make_history())
+    data = orjson.loads(raw)
+
+    print(f'{len(data["history"])} history items, {len(raw) / 1024 / 1024:.1f}MB JSON')
+
+    results = {
+        'from_dict': min(timeit.repeat(lambda: State.from_dict(data), number=1, repeat=ROUNDS)),
+        'codec': min(timeit.repeat(lambda: decode(State, data), number=1, repeat=ROUNDS)),
+    }
+
+    for name, secs in results.items():
+        print(f'{name:>15}: {secs * 1000:10.1f}ms')
+
+    print(f'{"speedup":>15}: {results["from_dict"] / results["codec"]:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
-from fastapi import APIRouter
+import dataclasses
+
+from fastapi import APIRouter, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from informa.lib import app as app_rocketry
 from informa.lib import fastapi as app_fastapi
+from informa.lib.metrics import metrics
 
 # CORS support for React frontends
 app_fastapi.add_middleware(
@@ -43,3 +47,26 @@ def patch_session_config(values: dict):
 
 
 app_fastapi.include_router(router_config)
+
+
+######
+# Plugin Metrics API
+#
+router_metrics = APIRouter(tags=['metrics'])
+
+
+@router_metrics.get('/metrics', response_class=PlainTextResponse)
+def get_metrics():
+    'Plugin run metrics in Prometheus text format'
+    return PlainTextResponse(metrics.prometheus(), media_type='text/plain; version=0.0.4')
+
+
+@router_metrics.get('/metrics/plugins/{plugin_name}')
+def get_plugin_metrics(plugin_name: str):
+    try:
+        return dataclasses.asdict(metrics.snapshot()[plugin_name])
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail='No runs recorded for plugin') from e
+
+
+app_fastapi.include_router(router_metrics)
@@ -1,12 +1,10 @@
 import asyncio
-import inspect
 import logging
 import os
 
 import click
 
-from informa.main import init_plugins
-from informa.main import start as start_app
+from informa.lib import registry
 
 logger = logging.getLogger('informa')
 sh = logging.StreamHandler()
@@ -25,19 +23,43 @@ def cli(debug):
         logger.setLevel(logging.DEBUG)
 
 
-@cli.group('plugin')
-def plugin_():
-    'Invoke a plugin\'s CLI'
+class LazyPluginGroup(click.Group):
+    '''
+    Click group which resolves plugin CLIs from the plugin manifest.
+
+    Only the plugin being invoked is imported, so a single plugin's command does not pay for
+    importing every other plugin's dependencies.
+    '''
+
+    def list_commands(self, ctx):  # noqa: ARG002
+        return sorted(m.cli_name for m in registry.manifest().values() if m.cli_name)
+
+    def get_command(self, ctx, cmd_name):  # noqa: ARG002
+        spec = registry.find_by_cli_name(cmd_name)
+        if spec is None:
+            return None
 
+        module = registry.load_plugin(spec.filename)
+        if module is None:
+            return None
 
-# Load all the plugins at import time
-PLUGINS = init_plugins()
+        return module.cli
 
-# Iterate plugins, looking for Click Groups to include in the CLI
-for plugin_module in PLUGINS.values():
-    for _, member in inspect.getmembers(plugin_module):
-        if isinstance(member, click.core.Group):
-            plugin_.add_command(member)
+    def format_commands(self, ctx, formatter):
+        'Render help listing from the static manifest, without importing plugins'
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            spec = registry.find_by_cli_name(cmd_name)
+            rows.append((cmd_name, click.utils.make_default_short_help(spec.cli_help or '', formatter.width - 6)))
+
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+@cli.group('plugin', cls=LazyPluginGroup)
+def plugin_():
+    'Invoke a plugin\'s CLI'
 
 
 @cli.command
@@ -45,6 +67,9 @@ for plugin_module in PLUGINS.values():
 @click.option('--port', help='Bind FastAPI server to port', default=3000, type=int)
 def start(host: str, port: int):
     'Start the async workers for each plugin, and the API server'
+    # Defer import of the apps, which loads every plugin
+    from informa.main import start as start_app  # noqa: PLC0415
+
     logger.info('Starting FastAPI and Rocketry workers')
     asyncio.run(start_app(host, port))
 
@@ -54,5 +79,5 @@ def list_plugins():
     '''
     List configured plugins
     '''
-    for plug in PLUGINS:
+    for plug in registry.manifest():
         print(plug)
@@ -7,6 +7,14 @@ class StateJsonDecodeError(AppError):
     'Unable to decode plugin state JSON'
 
 
+class UnknownStateStore(AppError):
+    'Env var STATE_STORE must be one of "json" or "sqlite"'
+
+
+class UnknownStateFsync(AppError):
+    'Env var STATE_FSYNC must be one of "always", "batch" or "never"'
+
+
 class MailgunKeyMissing(AppError):
     'Environment var MAILGUN_KEY is missing. Are you running in DEBUG?'
 
@@ -21,3 +29,10 @@ class MailgunSendFailed(AppError):
 
 class ReachedLastSeen(AppError):
     'Reached a value already seen in previous run'
+
+
+class ReplayMissing(AppError):
+    'No recorded exchange left in the cassette for this request'
+
+    def __str__(self):
+        return f'{self.__doc__}: {self.args[0]}' if self.args else str(self.__doc__)
@@ -1,20 +1,26 @@
 import abc
+import asyncio
+import contextlib
+import contextvars
 import datetime
-import decimal
-import inspect
+import functools
 import logging
-import os
-from dataclasses import dataclass
-from typing import cast
+import sys
+import threading
+from collections.abc import AsyncIterator, Callable, Iterator
+from dataclasses import dataclass, field
+from typing import Any, cast
 
+import dataclasses_json
 import orjson
-import yaml
 from dataclasses_json import DataClassJsonMixin
 from fastapi import FastAPI
 from rocketry import Rocketry
 from zoneinfo import ZoneInfo
 
 from informa.exceptions import StateJsonDecodeError
+from informa.lib.config import config_cache
+from informa.lib.store import get_state_store
 
 app = Rocketry(
     config={
@@ -27,14 +33,56 @@ app = Rocketry(
 fastapi = FastAPI()
 
 
+# Setup dataclasses_json to serialise date & datetime as ISO8601
+dataclasses_json.cfg.global_config.encoders[datetime.date] = datetime.date.isoformat
+dataclasses_json.cfg.global_config.decoders[datetime.date] = datetime.date.fromisoformat
+dataclasses_json.cfg.global_config.encoders[datetime.datetime] = datetime.datetime.isoformat
+dataclasses_json.cfg.global_config.decoders[datetime.datetime] = datetime.datetime.fromisoformat
+
+
+@dataclass
+class Plugin:
+    '''
+    Descriptor for a plugin, populated as the plugin module is imported.
+
+    Also used as the Click context object for the plugin's CLI.
+    '''
+
+    name: str
+    logger: logging.Logger | logging.LoggerAdapter | None = None
+    state_cls: type | None = None
+    config_cls: type | None = None
+    main: Callable | None = None
+    tasks: list[Any] = field(default_factory=list)
+    routes: list[Any] = field(default_factory=list)
+    load_time: float | None = None
+
+
+_plugins: dict[str, Plugin] = {}
+
+
+def get_plugin(module_name: str) -> Plugin:
+    'Return the descriptor for a plugin module, creating it on first access'
+    if module_name not in _plugins:
+        _plugins[module_name] = Plugin(module_name)
+    return _plugins[module_name]
+
+
 class PluginAdapter(logging.LoggerAdapter):
     def __init__(self, logger_, plugin_name: str | None = None):
+        module_name = None
+
         if plugin_name is None:
             # Automatically determine plugin name from calling class
-            plugin_name = inspect.getmodule(inspect.stack()[1][0]).__name__.split('.')[-1]
+            module_name = sys._getframe(1).f_globals['__name__']  # noqa: SLF001
+            plugin_name = module_name.split('.')[-1]
 
         super().__init__(logger_, plugin_name.upper())
 
+        if module_name:
+            # Register the plugin's logger
+            get_plugin(module_name).logger = self
+
     def process(self, msg, kwargs):
         return f'[{self.extra}] {msg}', kwargs
 
@@ -42,6 +90,14 @@ class PluginAdapter(logging.LoggerAdapter):
 class ConfigBase(DataClassJsonMixin, abc.ABC):
     'Base class from which plugin Config classes must inherit'
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # Register the first Config class defined in a plugin
+        plugin = get_plugin(cls.__module__)
+        if plugin.config_cls is None:
+            plugin.config_cls = cls
+
 
 @dataclass
 class StateBase(DataClassJsonMixin):
@@ -50,13 +106,49 @@ class StateBase(DataClassJsonMixin):
     last_run: datetime.datetime | None = None
     last_count: int | None = None
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        # Track assignment to state attributes, so unchanged state need not be written
+        object.__setattr__(self, '_dirty', True)
+
+    def mark_dirty(self):
+        'Flag state as changed, after modifying a nested attribute in-place'
+        object.__setattr__(self, '_dirty', True)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # Register the first State class defined in a plugin
+        plugin = get_plugin(cls.__module__)
+        if plugin.state_cls is None:
+            plugin.state_cls = cls
+
+
+# Module name of the plugin currently running, set for the duration of a plugin run
+current_plugin: contextvars.ContextVar[str | None] = contextvars.ContextVar('current_plugin', default=None)
+
+
+@contextlib.contextmanager
+def plugin_context(plugin_name: str) -> Iterator[None]:
+    'Set the current plugin for code running within this context'
+    token = current_plugin.set(plugin_name)
+    try:
+        yield
+    finally:
+        current_plugin.reset(token)
+
 
 def pass_plugin_name(func):
-    'Lookup the name of the calling module, and pass as the first parameter to `func`'
+    '''
+    Lookup the name of the calling module, and pass as the first parameter to `func`
+
+    The current plugin context is used when set, otherwise the calling module name is read from the caller's
+    frame globals. Both are constant cost, unlike `inspect.stack()` which materialises the whole stack.
+    '''
 
+    @functools.wraps(func)
     def inner(*args, **kwargs):
-        frame = inspect.stack()[1]
-        plugin_name = inspect.getmodule(frame[0]).__name__
+        plugin_name = current_plugin.get() or sys._getframe(1).f_globals['__name__']  # noqa: SLF001
         return func(plugin_name, *args, **kwargs)
 
     return inner
@@ -64,35 +156,85 @@ def pass_plugin_name(func):
 
 def _load_config(plugin_name: str, config_cls: type[ConfigBase]) -> DataClassJsonMixin | None:
     '''
-    Load plugin config
+    Load plugin config, reparsing the YAML only when the file has changed
+    '''
+    return cast(ConfigBase | None, config_cache.load(plugin_name, config_cls))
+
+
+_state_locks: dict[str, threading.Lock] = {}
+
+# Plugins whose state lock is held by the current context
+_held_state_locks: contextvars.ContextVar[frozenset[str]] = contextvars.ContextVar(
+    'held_state_locks', default=frozenset()
+)
+
+
+def _raw_state_lock(plugin_name: str) -> threading.Lock:
+    # setdefault is atomic, so concurrent first runs share one lock
+    return _state_locks.setdefault(plugin_name, threading.Lock())
+
+
+@contextlib.contextmanager
+def _state_lock(plugin_name: str) -> Iterator[None]:
     '''
+    Hold the lock guarding a plugin's state, which is held across a plugin run.
+
+    The lock is reentrant within the context holding it, rather than the thread. So a plugin run can load and
+    persist its state on worker threads which copy its context, eg. via asyncio.to_thread.
+    '''
+    held = _held_state_locks.get()
+    if plugin_name in held:
+        yield
+        return
+
+    with _raw_state_lock(plugin_name):
+        token = _held_state_locks.set(held | {plugin_name})
+        try:
+            yield
+        finally:
+            _held_state_locks.reset(token)
+
+
+@contextlib.asynccontextmanager
+async def _astate_lock(plugin_name: str) -> AsyncIterator[None]:
+    'As `_state_lock`, waiting for the lock on a worker thread rather than blocking the event loop'
+    held = _held_state_locks.get()
+    if plugin_name in held:
+        yield
+        return
+
+    lock = _raw_state_lock(plugin_name)
+    acquire = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
     try:
-        with open(f'config/{plugin_name}.yaml', encoding='utf8') as f:
-            data = yaml.load(f, Loader=yaml.Loader)  # noqa: S506
-            if not data:
-                return None
-    except FileNotFoundError:
-        return None
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # The worker thread still takes the lock, so release it once taken
+        acquire.add_done_callback(lambda _: lock.release())
+        raise
 
-    return cast(ConfigBase, config_cls.from_dict(data))
+    token = _held_state_locks.set(held | {plugin_name})
+    try:
+        yield
+    finally:
+        _held_state_locks.reset(token)
+        lock.release()
 
 
 def _load_state(
     plugin_name: str, logger: logging.Logger | logging.LoggerAdapter, state_cls: type[StateBase]
 ) -> StateBase:
     '''
-    Load or initialise plugin state
+    Load or initialise plugin state. Raises StateJsonDecodeError if the persisted state is corrupt.
     '''
     try:
-        with open(f'state/{plugin_name}.json', encoding='utf8') as f:
-            data = orjson.loads(f.read())
-            if not data:
-                raise StateJsonDecodeError
-
-        # Inflate JSON into the State dataclass
-        state = state_cls.from_dict(data)
+        with _state_lock(plugin_name):
+            state = get_state_store().load(plugin_name, state_cls)
+    except orjson.JSONDecodeError as e:
+        # Fail the run rather than start from empty state, which would repeat every alert and overwrite the
+        # corrupt file, the only copy which could be recovered
+        raise StateJsonDecodeError from e
 
-    except (FileNotFoundError, orjson.JSONDecodeError):
+    if state is None:
         logger.debug('Empty state initialised for %s', plugin_name)
         state = state_cls()
 
@@ -103,18 +245,14 @@ def _load_state(
 
 def _write_state(plugin_name: str, state_obj: StateBase):
     '''
-    Utility function to write state to a file
+    Utility function to write state to the configured store. Skipped if the state is not dirty.
+    '''
+    with _state_lock(plugin_name):
+        get_state_store().write(plugin_name, state_obj)
+
+
+def _invalidate_state(plugin_name: str):
+    '''
+    Drop cached state, eg. after a failed plugin run leaves the state object partially modified
     '''
-    if not os.path.exists('state'):
-        os.mkdir('state')
-
-    def default(obj):
-        'Handler for types unknown to orjson'
-        if isinstance(obj, decimal.Decimal):
-            return str(obj)
-        if isinstance(obj, set):
-            return list(obj)
-        raise TypeError
-
-    with open(f'state/{plugin_name}.json', 'w', encoding='utf8') as f:
-        f.write(orjson.dumps(state_obj, default=default).decode())
+    get_state_store().invalidate(plugin_name)
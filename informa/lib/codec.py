@@ -0,0 +1,148 @@
+import dataclasses
+import datetime
+import decimal
+import functools
+import types
+import typing
+from collections.abc import Callable
+from typing import Any
+
+import orjson
+
+Converter = Callable[[Any], Any]
+
+
+def orjson_default(obj):
+    'Handler for types unknown to orjson'
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError
+
+
+def encode(obj: Any) -> bytes:
+    'Serialise a dataclass to JSON; the inverse of `decode`'
+    return orjson.dumps(obj, default=orjson_default)
+
+
+def decode(cls: type, data: dict) -> Any:
+    '''
+    Inflate decoded JSON (or YAML) into dataclass `cls`
+
+    Params:
+        cls:   Dataclass type
+        data:  Dict as returned by orjson.loads
+    '''
+    return decoder(cls)(data)
+
+
+def _to_datetime(value):
+    return value if isinstance(value, datetime.datetime) else datetime.datetime.fromisoformat(value)
+
+
+def _to_date(value):
+    return value if isinstance(value, datetime.date) else datetime.date.fromisoformat(value)
+
+
+def _to_decimal(value):
+    return value if isinstance(value, decimal.Decimal) else decimal.Decimal(str(value))
+
+
+def _optional(conv: Converter) -> Converter:
+    return lambda value: None if value is None else conv(value)
+
+
+def _collection(factory: type, conv: Converter | None) -> Converter:
+    if conv is None:
+        return factory
+    return lambda values: factory(conv(v) for v in values)
+
+
+def _fixed_tuple(convs: tuple[Converter | None, ...]) -> Converter:
+    if not any(convs):
+        return tuple
+    convs = tuple(_optional(c) if c else None for c in convs)
+    return lambda values: tuple(v if c is None else c(v) for c, v in zip(convs, values, strict=True))
+
+
+def _mapping(key_conv: Converter | None, value_conv: Converter | None) -> Converter:
+    if key_conv is None and value_conv is None:
+        return dict
+    if key_conv is None:
+        return lambda values: {k: value_conv(v) for k, v in values.items()}
+    if value_conv is None:
+        return lambda values: {key_conv(k): v for k, v in values.items()}
+    return lambda values: {key_conv(k): value_conv(v) for k, v in values.items()}
+
+
+@functools.cache
+def _converter(tp: Any) -> Converter | None:
+    '''
+    Return a function converting a decoded JSON value into type `tp`, or None when the value needs no conversion
+    '''
+    if dataclasses.is_dataclass(tp):
+        return decoder(tp)
+
+    if tp is datetime.datetime:
+        return _to_datetime
+    if tp is datetime.date:
+        return _to_date
+    if tp is decimal.Decimal:
+        return _to_decimal
+
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+
+    if origin in {typing.Union, types.UnionType}:
+        non_none = [a for a in args if a is not type(None)]
+        if len(non_none) != 1:
+            # Ambiguous unions are passed through as decoded
+            return None
+        conv = _converter(non_none[0])
+        return _optional(conv) if conv else None
+
+    if origin is tuple and args and args[-1] is not Ellipsis:
+        # Fixed length tuples, eg. tuple[int, str], convert each element by position
+        return _fixed_tuple(tuple(_converter(a) for a in args))
+
+    if origin in {list, set, frozenset, tuple}:
+        # Variable length tuples, eg. tuple[int, ...]
+        conv = _converter(args[0]) if args else None
+        return _collection(origin, _optional(conv) if conv else None)
+
+    if origin is dict:
+        key_conv, value_conv = (_converter(a) for a in args) if args else (None, None)
+        return _mapping(key_conv, _optional(value_conv) if value_conv else None)
+
+    # str, int, float, bool, Any and unknown types are used as decoded
+    return None
+
+
+@functools.cache
+def decoder(cls: type) -> Callable[[dict], Any]:
+    '''
+    Compile a decoder for dataclass `cls`, once per type
+
+    Field types are resolved up-front into a converter per field, so decoding does no type introspection.
+    Missing fields take their dataclass default, unknown keys are ignored. Raises NameError if a field's type
+    annotation cannot be resolved.
+    '''
+    hints = typing.get_type_hints(cls)
+
+    fields = []
+    for f in dataclasses.fields(cls):
+        if f.init:
+            conv = _converter(hints.get(f.name, f.type))
+            fields.append((f.name, conv))
+
+    def decode_dataclass(data: dict):
+        kwargs = {}
+        for name, conv in fields:
+            if name in data:
+                value = data[name]
+                kwargs[name] = value if conv is None or value is None else conv(value)
+        return cls(**kwargs)
+
+    decode_dataclass.__qualname__ = f'decoder[{cls.__qualname__}]'
+    return decode_dataclass
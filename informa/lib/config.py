@@ -0,0 +1,139 @@
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from collections.abc import Callable
+from typing import Any
+
+import yaml
+
+from informa.lib.codec import decode
+
+# Use the libyaml C implementation when available
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader  # type: ignore[assignment]
+
+logger = logging.getLogger('informa')
+
+
+CONFIG_DIR = 'config'
+
+
+class ConfigCache:
+    '''
+    Parsed plugin config, reparsed only when the config file changes.
+
+    Callbacks subscribed to a plugin's config are called with the new config whenever a change is seen, either
+    when the config is next loaded, or by `poll`.
+    '''
+
+    def __init__(self, path: str = CONFIG_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        # Config file version, config class and parsed config, per plugin
+        self._cache: dict[str, tuple[Any, type, Any]] = {}
+        self._listeners: dict[str, list[tuple[type, Callable]]] = defaultdict(list)
+
+    def _version(self, plugin_name: str) -> tuple[int, int, int] | None:
+        try:
+            st = os.stat(f'{self.path}/{plugin_name}.yaml')
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def load(self, plugin_name: str, config_cls: type) -> Any | None:
+        '''
+        Load plugin config, from cache if the file is unchanged. The returned config is shared; do not modify it.
+
+        Params:
+            plugin_name:  Plugin module name
+            config_cls:   Plugin's config class type
+        '''
+        version = self._version(plugin_name)
+
+        with self._lock:
+            cached = self._cache.get(plugin_name)
+
+        if cached and cached[0] == version and cached[1] is config_cls:
+            return cached[2]
+
+        config = None
+        if version is not None:
+            with open(f'{self.path}/{plugin_name}.yaml', encoding='utf8') as f:
+                data = yaml.load(f, Loader=SafeLoader)
+            if data:
+                config = decode(config_cls, data)
+
+        with self._lock:
+            self._cache[plugin_name] = (version, config_cls, config)
+
+        if cached and cached[0] != version:
+            logger.debug('Config reloaded for %s', plugin_name)
+            self._notify(plugin_name, config_cls, config)
+
+        return config
+
+    def write(self, plugin_name: str, data: dict):
+        'Write plugin config as YAML, atomically replacing the config file'
+        path = f'{self.path}/{plugin_name}.yaml'
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=f'.{plugin_name}.yaml.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf8') as f:
+                f.write(yaml.dump(data, Dumper=SafeDumper))
+
+            # mkstemp creates files readable only by the owner
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+    def subscribe(self, plugin_name: str, config_cls: type, callback: Callable):
+        '''
+        Call `callback` with the new config each time the plugin's config file changes
+
+        Params:
+            plugin_name:  Plugin module name
+            config_cls:   Plugin's config class type
+            callback:     Function accepting the new config, which is None if the config was removed
+        '''
+        with self._lock:
+            self._listeners[plugin_name].append((config_cls, callback))
+
+        # Prime the cache, so the next change is seen
+        try:
+            self.load(plugin_name, config_cls)
+        except Exception:
+            logger.exception('Failed loading config for %s', plugin_name)
+
+    def poll(self):
+        'Check subscribed config files for changes, and notify listeners'
+        with self._lock:
+            watched = [(name, listeners[0][0]) for name, listeners in self._listeners.items() if listeners]
+
+        for plugin_name, config_cls in watched:
+            try:
+                self.load(plugin_name, config_cls)
+            except Exception:
+                logger.exception('Failed reloading config for %s', plugin_name)
+
+    def _notify(self, plugin_name: str, config_cls: type, config: Any):
+        with self._lock:
+            listeners = [cb for cls, cb in self._listeners.get(plugin_name, []) if cls is config_cls]
+
+        for callback in listeners:
+            try:
+                callback(config)
+            except Exception:
+                logger.exception('Config change callback failed for %s', plugin_name)
+
+
+config_cache = ConfigCache()
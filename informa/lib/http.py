@@ -0,0 +1,328 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import weakref
+from collections import defaultdict
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from informa.lib import current_plugin
+
+# Transient failures which are retried, with backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+HTTP_CACHE_DIR = 'state/http'
+
+CONDITIONAL_HEADERS = frozenset({'if-none-match', 'if-modified-since'})
+
+
+@dataclass
+class CachedResponse:
+    '''
+    Response from `get_cached`. When `changed` is False the body is identical to the previous fetch, and
+    callers can skip parsing it.
+    '''
+
+    url: str
+    status_code: int
+    content: bytes
+    encoding: str
+    changed: bool
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+
+class HttpCache:
+    '''
+    On-disk cache of response validators and bodies, one file per URL.
+
+    Requests are made conditional with If-None-Match/If-Modified-Since. On a 304, or a 200 with a body identical
+    to the cached one, the response is marked unchanged.
+
+    Responses fetched during a plugin run are staged, and only written once the run's state is persisted by
+    `commit_fetched`. A failed run drops them with `invalidate_plugin`, so the next run sees the content as
+    changed again.
+    '''
+
+    def __init__(self, path: str = HTTP_CACHE_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        # Cache entries waiting on a plugin run to complete, per plugin and URL
+        self._staged: defaultdict[str, dict[str, tuple[dict, bytes]]] = defaultdict(dict)
+
+    def _file(self, url: str) -> str:
+        return f'{self.path}/{hashlib.blake2b(url.encode(), digest_size=16).hexdigest()}'
+
+    def _read(self, url: str) -> tuple[dict, bytes] | None:
+        'Return cached metadata and body for `url`'
+        try:
+            with open(self._file(url), 'rb') as f:
+                meta = orjson.loads(f.readline())
+                body = f.read()
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return None
+
+        # Ignore hash collisions and truncated files
+        if meta.get('url') != url or meta.get('digest') != hashlib.blake2b(body, digest_size=16).hexdigest():
+            return None
+
+        return meta, body
+
+    def _write(self, url: str, meta: dict, body: bytes):
+        'Atomically replace the cache file for `url`, as a metadata line followed by the body'
+        os.makedirs(self.path, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(orjson.dumps(meta) + b'\n')
+                f.write(body)
+            os.replace(tmp_path, self._file(url))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+    def request_headers(self, url: str) -> dict[str, str]:
+        'Conditional request headers for `url`, from the cached validators'
+        cached = self._read(url)
+        if not cached:
+            return {}
+
+        meta, _ = cached
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def update(
+        self, url: str, status_code: int, headers, content: bytes, encoding: str | None, *, conditional: bool = True
+    ) -> CachedResponse | None:
+        '''
+        Store a response to a conditional request, and return it with the body filled from cache on a 304.
+
+        Returns None on a 304 when there is no cached body, and the URL should be refetched unconditionally.
+
+        Params:
+            url:          Requested URL
+            status_code:  Response status
+            headers:      Response headers, a case-insensitive mapping
+            content:      Response body
+            encoding:     Response text encoding, if known
+            conditional:  False if the request was made without conditional headers
+        '''
+        cached = self._read(url)
+
+        if status_code == 304 and conditional:  # noqa: PLR2004
+            if not cached:
+                return None
+            meta, body = cached
+            return CachedResponse(url, 200, body, meta['encoding'], changed=False)
+
+        if status_code != 200:  # noqa: PLR2004
+            return CachedResponse(url, status_code, content, encoding or 'utf-8', changed=True)
+
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'encoding': encoding or 'utf-8',
+            'digest': digest,
+        }
+        changed = cached is None or cached[0]['digest'] != digest
+
+        if changed or cached[0] != meta:
+            if plugin_name := current_plugin.get():
+                # Written once the plugin has processed the response, and its run has been persisted
+                with self._lock:
+                    self._staged[plugin_name][url] = (meta, content)
+            else:
+                self._write(url, meta, content)
+
+        return CachedResponse(url, status_code, content, meta['encoding'], changed=changed)
+
+    def invalidate(self, url: str):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self._file(url))
+
+    def commit_fetched(self, plugin_name: str):
+        'Write the responses staged by a plugin, after a successful run'
+        with self._lock:
+            staged = self._staged.pop(plugin_name, {})
+
+        for url, (meta, content) in staged.items():
+            self._write(url, meta, content)
+
+    def invalidate_plugin(self, plugin_name: str):
+        'Drop the responses staged by a plugin, eg. after a failed run, so their content is processed again'
+        with self._lock:
+            self._staged.pop(plugin_name, None)
+
+
+http_cache = HttpCache()
+
+
+class HttpClient(requests.Session):
+    '''
+    Shared requests session with keep-alive connection pooling per host, retries with exponential backoff, a
+    default timeout and a limit on concurrent requests to each host.
+
+    Params:
+        retries:          Retries for connection errors and `RETRY_STATUSES`; idempotent methods only
+        backoff:          Backoff factor in seconds, doubled for each retry
+        timeout:          Default timeout in seconds, when a request does not pass one
+        host_concurrency: Maximum requests in flight to any one host
+        pool_size:        Connections kept alive per host
+    '''
+
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 10,
+        host_concurrency: int = 4,
+        pool_size: int = 10,
+    ):
+        super().__init__()
+        self.timeout = timeout
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=RETRY_STATUSES,
+                raise_on_status=False,
+                respect_retry_after_header=True,
+            ),
+        )
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+        self._host_limits: defaultdict[str, threading.BoundedSemaphore] = defaultdict(
+            functools.partial(threading.BoundedSemaphore, host_concurrency)
+        )
+        self._lock = threading.Lock()
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            return self._host_limits[urlsplit(url).netloc]
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+
+        with self._host_limit(url):
+            return super().request(method, url, *args, **kwargs)
+
+    def get_cached(self, url: str, **kwargs) -> CachedResponse:
+        '''
+        Conditional GET via the on-disk HTTP cache; check `changed` on the response before parsing it
+
+        Params:
+            url:     URL to fetch
+            kwargs:  Passed to `requests.Session.get`
+        '''
+        headers = kwargs.pop('headers', {})
+        resp = self.get(url, headers=http_cache.request_headers(url) | headers, **kwargs)
+        if cached := http_cache.update(url, resp.status_code, resp.headers, resp.content, resp.encoding):
+            return cached
+
+        # Not modified, but there is no cached body to return
+        resp = self.get(url, headers=_unconditional(headers), **kwargs)
+        return http_cache.update(url, resp.status_code, resp.headers, resp.content, resp.encoding, conditional=False)
+
+
+class AsyncHttpClient(httpx.AsyncClient):
+    '''
+    Async HTTP client with pooled keep-alive connections, retries on connection failure and a limit on
+    concurrent requests to each host.
+    '''
+
+    def __init__(self, retries: int = 3, timeout: float = 10, host_concurrency: int = 4, pool_size: int = 10):
+        super().__init__(
+            follow_redirects=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+        )
+        self._host_limits: defaultdict[str, asyncio.Semaphore] = defaultdict(
+            functools.partial(asyncio.Semaphore, host_concurrency)
+        )
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        async with self._host_limits[request.url.netloc.decode()]:
+            return await super().send(request, **kwargs)
+
+    async def get_cached(self, url: str, **kwargs) -> CachedResponse:
+        '''
+        Conditional GET via the on-disk HTTP cache; check `changed` on the response before parsing it
+
+        Params:
+            url:     URL to fetch
+            kwargs:  Passed to `httpx.AsyncClient.get`
+        '''
+        headers = kwargs.pop('headers', {})
+        resp = await self.get(url, headers=http_cache.request_headers(url) | headers, **kwargs)
+        if cached := http_cache.update(url, resp.status_code, resp.headers, resp.content, resp.encoding):
+            return cached
+
+        # Not modified, but there is no cached body to return
+        resp = await self.get(url, headers=_unconditional(headers), **kwargs)
+        return http_cache.update(url, resp.status_code, resp.headers, resp.content, resp.encoding, conditional=False)
+
+
+def _unconditional(headers: dict[str, str]) -> dict[str, str]:
+    'Request headers without the conditional headers'
+    return {k: v for k, v in headers.items() if k.lower() not in CONDITIONAL_HEADERS}
+
+
+def _settings() -> dict:
+    'Client settings from env vars HTTP_RETRIES, HTTP_TIMEOUT and HTTP_HOST_CONCURRENCY'
+    return {
+        'retries': int(os.environ.get('HTTP_RETRIES', '3')),
+        'timeout': float(os.environ.get('HTTP_TIMEOUT', '10')),
+        'host_concurrency': int(os.environ.get('HTTP_HOST_CONCURRENCY', '4')),
+    }
+
+
+@functools.lru_cache
+def client() -> HttpClient:
+    '''
+    Return the shared HTTP client, so connection setup is amortised across plugin runs
+    '''
+    return HttpClient(backoff=float(os.environ.get('HTTP_BACKOFF', '0.5')), **_settings())
+
+
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHttpClient] = weakref.WeakKeyDictionary()
+
+
+def async_client() -> AsyncHttpClient:
+    '''
+    Return the shared async HTTP client for the running event loop, for use by `async def main` plugins.
+
+    Connections are pooled across plugins. A client is bound to the loop it was created on, so one is kept
+    per loop (the daemon has a single loop; `informa plugin <name> run` creates its own).
+    '''
+    loop = asyncio.get_running_loop()
+    try:
+        return _async_clients[loop]
+    except KeyError:
+        client_ = AsyncHttpClient(**_settings())
+        _async_clients[loop] = client_
+        return client_
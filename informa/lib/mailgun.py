@@ -2,11 +2,10 @@ import logging
 import os
 from typing import Any
 
-import requests
 from jinja2 import Environment, FileSystemLoader
 
 from informa.exceptions import MailgunKeyMissing, MailgunSendFailed, MailgunTemplateFail
-from informa.lib import PluginAdapter
+from informa.lib import PluginAdapter, http
 
 
 def send(
@@ -70,7 +69,7 @@ def _send(subject: str, template: str | None = None, content: str | dict[str, An
         body = subject
 
     # send the email via Mailgun's API
-    resp = requests.post(
+    resp = http.client().post(
         'https://api.eu.mailgun.net/v2/mailgun.mafro.net/messages',
         auth=('api', api_key),
         data={
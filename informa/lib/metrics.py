@@ -0,0 +1,131 @@
+import contextlib
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+# Phases of a plugin run, in order
+PHASES = ('load_state', 'load_config', 'main', 'publish', 'write_state', 'run')
+
+
+@dataclass
+class Timing:
+    count: int = 0
+    total: float = 0
+    max: float = 0
+    last: float = 0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+
+@dataclass
+class PluginMetrics:
+    success: int = 0
+    failure: int = 0
+    last_count: int | None = None
+    returned_total: int = 0
+    phases: dict[str, Timing] = field(default_factory=dict)
+
+
+class Metrics:
+    'Thread-safe registry of plugin run metrics, for this process'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plugins: dict[str, PluginMetrics] = {}
+
+    def _get(self, plugin_name: str) -> PluginMetrics:
+        if plugin_name not in self._plugins:
+            self._plugins[plugin_name] = PluginMetrics()
+        return self._plugins[plugin_name]
+
+    @contextlib.contextmanager
+    def timed(self, plugin_name: str, phase: str) -> Iterator[None]:
+        'Record the duration of a run phase, including when it raises'
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._get(plugin_name).phases.setdefault(phase, Timing()).add(elapsed)
+
+    def run_finished(self, plugin_name: str, success: bool, count: int | None = None):
+        'Record the outcome of a plugin run'
+        with self._lock:
+            metrics = self._get(plugin_name)
+            if success:
+                metrics.success += 1
+                metrics.last_count = count
+                metrics.returned_total += count or 0
+            else:
+                metrics.failure += 1
+
+    def snapshot(self) -> dict[str, PluginMetrics]:
+        'Return a copy of all plugin metrics'
+        with self._lock:
+            return {
+                name: PluginMetrics(
+                    m.success,
+                    m.failure,
+                    m.last_count,
+                    m.returned_total,
+                    {phase: Timing(t.count, t.total, t.max, t.last) for phase, t in m.phases.items()},
+                )
+                for name, m in self._plugins.items()
+            }
+
+    def prometheus(self) -> str:
+        'Render all metrics in the Prometheus text exposition format'
+        plugins = self.snapshot()
+
+        lines = [
+            '# HELP informa_phase_seconds Time spent in each phase of a plugin run',
+            '# TYPE informa_phase_seconds summary',
+        ]
+        for name, m in plugins.items():
+            for phase, t in m.phases.items():
+                labels = f'plugin="{name}",phase="{phase}"'
+                lines.append(f'informa_phase_seconds_count{{{labels}}} {t.count}')
+                lines.append(f'informa_phase_seconds_sum{{{labels}}} {t.total}')
+
+        lines += [
+            '# HELP informa_phase_seconds_max Longest duration of each phase of a plugin run',
+            '# TYPE informa_phase_seconds_max gauge',
+        ]
+        for name, m in plugins.items():
+            for phase, t in m.phases.items():
+                lines.append(f'informa_phase_seconds_max{{plugin="{name}",phase="{phase}"}} {t.max}')
+
+        lines += [
+            '# HELP informa_runs_total Plugin runs by result',
+            '# TYPE informa_runs_total counter',
+        ]
+        for name, m in plugins.items():
+            lines.append(f'informa_runs_total{{plugin="{name}",result="success"}} {m.success}')
+            lines.append(f'informa_runs_total{{plugin="{name}",result="failure"}} {m.failure}')
+
+        lines += [
+            '# HELP informa_returned_total Sum of counts returned by plugin runs',
+            '# TYPE informa_returned_total counter',
+        ]
+        lines += [f'informa_returned_total{{plugin="{name}"}} {m.returned_total}' for name, m in plugins.items()]
+
+        lines += [
+            '# HELP informa_last_count Count returned by the last successful plugin run',
+            '# TYPE informa_last_count gauge',
+        ]
+        lines += [
+            f'informa_last_count{{plugin="{name}"}} {m.last_count}'
+            for name, m in plugins.items()
+            if m.last_count is not None
+        ]
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
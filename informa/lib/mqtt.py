@@ -0,0 +1,135 @@
+import atexit
+import collections
+import functools
+import logging
+import os
+import threading
+
+from paho.mqtt import client as mqtt
+from paho.mqtt.enums import CallbackAPIVersion
+
+logger = logging.getLogger('informa')
+
+
+Message = tuple[str, str | bytes | int | float, bool]
+
+
+class MqttPublisher:
+    '''
+    Long-lived MQTT connection, with the network loop running in a background thread.
+
+    Paho handles reconnection to the broker with exponential backoff. While disconnected, messages are held in
+    a bounded outbound queue and published in order once reconnected.
+
+    Params:
+        host:       Broker hostname
+        port:       Broker port
+        max_queue:  Maximum messages buffered while the broker is down; the oldest are dropped
+    '''
+
+    QOS = 1
+
+    def __init__(self, host: str, port: int = 1883, max_queue: int = 1000):
+        self.host = host
+        self.port = port
+
+        self._lock = threading.Lock()
+        self._queue: collections.deque[Message] = collections.deque(maxlen=max_queue)
+        self._connected = False
+        self._started = False
+
+        self.client = mqtt.Client(CallbackAPIVersion.VERSION2)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+
+    def start(self):
+        'Connect in the background; returns immediately'
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        self.client.connect_async(self.host, self.port)
+        self.client.loop_start()
+
+    def stop(self):
+        'Disconnect from the broker, and stop the network loop'
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def publish(self, messages: list[Message]):
+        '''
+        Publish a batch of messages, or queue them until the broker is connected
+
+        Params:
+            messages:  List of (topic, payload, retain) tuples
+        '''
+        self.start()
+
+        with self._lock:
+            if not self._connected or self._queue:
+                # Preserve ordering behind any messages already queued
+                self._enqueue(messages)
+                return
+
+            self._send(messages)
+
+    def _enqueue(self, messages: list[Message]):
+        if len(self._queue) + len(messages) > (self._queue.maxlen or 0):
+            logger.warning('MQTT queue full, dropping oldest messages')
+        self._queue.extend(messages)
+
+    def _send(self, messages: list[Message]):
+        'Send messages via paho; must be called with the lock held'
+        for topic, payload, retain in messages:
+            info = self.client.publish(topic, payload, qos=self.QOS, retain=retain)
+            if info.rc == mqtt.MQTT_ERR_NO_CONN:
+                # Connection dropped; paho retains QoS>0 messages and resends them on reconnect
+                self._connected = False
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):  # noqa: ARG002
+        if reason_code.is_failure:
+            logger.error('MQTT connection to %s:%s refused: %s', self.host, self.port, reason_code)
+            return
+
+        logger.debug('MQTT connected to %s:%s', self.host, self.port)
+
+        with self._lock:
+            self._connected = True
+
+            # Flush messages buffered while disconnected
+            queued = list(self._queue)
+            self._queue.clear()
+            self._send(queued)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):  # noqa: ARG002
+        with self._lock:
+            self._connected = False
+
+        if self._started:
+            logger.debug('MQTT disconnected from %s:%s: %s', self.host, self.port, reason_code)
+
+
+@functools.lru_cache
+def get_publisher() -> MqttPublisher:
+    'Return the shared MQTT publisher, configured by env vars MQTT_BROKER and MQTT_PORT'
+    publisher = MqttPublisher(os.environ.get('MQTT_BROKER', 'locke'), int(os.environ.get('MQTT_PORT', '1883')))
+
+    # Disconnect cleanly on shutdown
+    atexit.register(publisher.stop)
+
+    return publisher
@@ -1,79 +1,112 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
 import inspect
 import logging
-from collections.abc import Callable
-from dataclasses import dataclass
+import os
+import time
+import weakref
+from collections.abc import Callable, Coroutine, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from types import ModuleType
+from typing import Any
 
 import arrow
 import click
-import yaml
+import orjson
+import requests
 from dataclasses_json import DataClassJsonMixin
 from marshmallow.exceptions import ValidationError
-from paho.mqtt import client as mqtt
-from paho.mqtt.enums import CallbackAPIVersion
 
 from informa.exceptions import AppError
 from informa.lib import (
     ConfigBase,
-    PluginAdapter,
+    Plugin,
     StateBase,
+    _astate_lock,
+    _invalidate_state,
     _load_config,
     _load_state,
+    _state_lock,
     _write_state,
+    app,
+    get_plugin,
     pass_plugin_name,
+    plugin_context,
 )
+from informa.lib.config import config_cache
+from informa.lib.http import http_cache
+from informa.lib.metrics import PHASES, metrics
+from informa.lib.mqtt import get_publisher
 from informa.lib.utils import now_aest
 
+click_pass_plugin = click.make_pass_decorator(Plugin)
 
-@dataclass
-class Plugin:
-    'Click context DTO to hold plugin global attributes'
 
-    name: str
-    logger: logging.Logger
-    state_cls: type
-    config_cls: type | None
-    main: Callable
+def setup_plugin_cli(module: ModuleType) -> Plugin:
+    'Complete the plugin descriptor for this module, setup the CLI context and add common commands'
+    plugin = get_plugin(module.__name__)
+    plugin.main = getattr(module, 'main', None)
 
+    # If the plugin has a CLI, setup the context and add common commands
+    if hasattr(module, 'cli'):
+        module.cli.context_settings = {'obj': plugin}
+        module.cli.add_command(plugin_last_run)
+        module.cli.add_command(plugin_run_now)
+        module.cli.add_command(plugin_run_stats)
+        module.cli.add_command(plugin_record)
 
-click_pass_plugin = click.make_pass_decorator(Plugin)
+    return plugin
 
 
-def setup_plugin_cli(plugin: ModuleType):
-    'Setup plugin CLI context for this plugin, and add common commands'
+@functools.lru_cache
+def _main_config_cls(main_func: Callable) -> type[ConfigBase] | None:
+    'Introspect the passed main_func for a Config parameter, once per function'
+    plugin_config_class: type[ConfigBase] | None = None
 
-    def get_class_attr(type_):
-        'Return the class type defined in the plugin, which inherits from `type_`'
-        clss = [v for _, v in inspect.getmembers(plugin, inspect.isclass) if issubclass(v, type_) and v is not type_]
-        return next(iter(clss), None)
+    for param in inspect.getfullargspec(main_func).annotations.values():
+        if inspect.isclass(param) and issubclass(param, ConfigBase):
+            plugin_config_class = param
 
-    def get_plugin_logger():
-        'Return the class attribute which is an instance of lib.PluginAdapter'
-        return next(iter([v for _, v in inspect.getmembers(plugin) if isinstance(v, PluginAdapter)]), None)
+    return plugin_config_class
 
-    # If the plugin has a CLI, setup the context and add common commands
-    if hasattr(plugin, 'cli'):
-        plugin_config_cls = get_class_attr(ConfigBase)
-        plugin_state_cls = get_class_attr(StateBase)
-        plugin_logger = get_plugin_logger()
 
-        plugin.cli.context_settings = {
-            'obj': Plugin(plugin.__name__, plugin_logger, plugin_state_cls, plugin_config_cls, plugin.main)
-        }
-        plugin.cli.add_command(plugin_last_run)
-        plugin.cli.add_command(plugin_run_now)
+@functools.lru_cache
+def _plugin_executor() -> ThreadPoolExecutor:
+    'Bounded thread pool for sync plugins, sized by env var PLUGIN_THREADS'
+    return ThreadPoolExecutor(
+        max_workers=int(os.environ.get('PLUGIN_THREADS', '8')), thread_name_prefix='informa-plugin'
+    )
 
 
 @pass_plugin_name
 def load_run_persist(
     plugin_name: str, logger: logging.Logger | logging.LoggerAdapter, state_cls: type[StateBase], main_func: Callable
-):
-    _load_run_persist(plugin_name, logger, state_cls, main_func, sync=False)
+) -> Coroutine[Any, Any, None]:
+    '''
+    Return a coroutine running the plugin, to be awaited from an async Rocketry task.
+
+    An `async def main` runs directly on the event loop; a sync `main` runs on the bounded plugin thread pool.
+    '''
+    if inspect.iscoroutinefunction(main_func):
+        return _aload_run_persist(plugin_name, logger, state_cls, main_func, sync=False)
+
+    async def run_in_pool():
+        # Copy the context, so the pool thread sees this task's context vars
+        ctx = contextvars.copy_context()
+        func = functools.partial(_load_run_persist, plugin_name, logger, state_cls, main_func, sync=False)
+        await asyncio.get_running_loop().run_in_executor(_plugin_executor(), ctx.run, func)
+
+    return run_in_pool()
 
 
 def _load_run_persist(
-    plugin_name: str, logger: logging.Logger | logging.LoggerAdapter, state_cls: type[StateBase],
-    main_func: Callable, sync: bool
+    plugin_name: str,
+    logger: logging.Logger | logging.LoggerAdapter,
+    state_cls: type[StateBase],
+    main_func: Callable,
+    sync: bool,
 ):
     '''
     Load plugin state, run plugin main function via callback, persist state to disk.
@@ -88,47 +121,116 @@ def _load_run_persist(
         main_func:    Callback function to trigger plugin logic
         sync:         False if this function was invoked asynchronously from a Rocketry task
     '''
-    try:
-        # Reload config each time plugin runs
-        state = _load_state(plugin_name, logger, state_cls)
+    # Plugin name is available to helpers called from main_func via the plugin context. The state lock is held
+    # for the whole run, so the plugin's other tasks cannot clobber this run's state
+    with plugin_context(plugin_name), _state_lock(plugin_name), metrics.timed(plugin_name, 'run'):
+        start = time.perf_counter()
 
-        plugin_config_class: type[ConfigBase] | None = None
+        with _handle_run_errors(plugin_name, logger):
+            state, args = _prepare_run(plugin_name, logger, state_cls, main_func)
 
-        # Introspect the passed main_func for a Config parameter
-        for param in inspect.getfullargspec(main_func).annotations.values():
-            if issubclass(param, ConfigBase):
-                plugin_config_class = param
+            with metrics.timed(plugin_name, 'main'):
+                ret = main_func(*args)
 
-        logger.info('Running, last run: %s', state.last_run or 'Never')
+            _persist_run(plugin_name, logger, state, ret, start, sync)
 
-        if plugin_config_class:
-            # Reload config each time plugin runs
-            config = _load_config(plugin_name, plugin_config_class)
 
-            # Call plugin with config
-            ret = main_func(state, config)
-        else:
-            # Call plugin without config
-            ret = main_func(state)
+# Per event loop, a lock per plugin serialising its async runs. asyncio locks are bound to the loop using them
+_async_run_locks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Lock]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _async_run_lock(plugin_name: str) -> asyncio.Lock:
+    locks = _async_run_locks.setdefault(asyncio.get_running_loop(), {})
+    return locks.setdefault(plugin_name, asyncio.Lock())
+
 
-        # Handle misbehaving plugins (when main does not return a value)
-        if ret is None:
-            logger.debug('WARN: Plugin %s did not return a value', plugin_name)
-            ret = 1
+async def _aload_run_persist(
+    plugin_name: str,
+    logger: logging.Logger | logging.LoggerAdapter,
+    state_cls: type[StateBase],
+    main_func: Callable,
+    sync: bool,
+):
+    '''
+    As `_load_run_persist`, for an `async def main` running on the event loop
+    '''
+    # Serialise async runs of this plugin on the loop, then hold the state lock against its threaded tasks.
+    # Loading and persisting state block, so run on worker threads
+    async with _async_run_lock(plugin_name), _astate_lock(plugin_name):
+        with plugin_context(plugin_name), metrics.timed(plugin_name, 'run'):
+            start = time.perf_counter()
+
+            with _handle_run_errors(plugin_name, logger):
+                state, args = await asyncio.to_thread(_prepare_run, plugin_name, logger, state_cls, main_func)
 
-        # Update common plugin state attributes
-        state.last_run = now_aest()
-        state.last_count = ret
+                with metrics.timed(plugin_name, 'main'):
+                    ret = await main_func(*args)
+
+                await asyncio.to_thread(_persist_run, plugin_name, logger, state, ret, start, sync)
+
+
+def _prepare_run(
+    plugin_name: str, logger: logging.Logger | logging.LoggerAdapter, state_cls: type[StateBase], main_func: Callable
+) -> tuple[StateBase, tuple]:
+    'Load plugin state and config, returning the state and the arguments for `main_func`'
+    with metrics.timed(plugin_name, 'load_state'):
+        state = _load_state(plugin_name, logger, state_cls)
 
-        if sync is False:
-            # Publish state to MQTT when running async
-            publish_plugin_run_to_mqtt(plugin_name, state)
-            logger.debug('Published to informa/%s via MQTT', plugin_name)
+    logger.info('Running, last run: %s', state.last_run or 'Never')
 
-        # Persist plugin metadata
+    if plugin_config_class := _main_config_cls(main_func):
+        # Reload config each time plugin runs
+        with metrics.timed(plugin_name, 'load_config'):
+            config = _load_config(plugin_name, plugin_config_class)
+
+        # Call plugin with config
+        return state, (state, config)
+
+    # Call plugin without config
+    return state, (state,)
+
+
+def _persist_run(
+    plugin_name: str,
+    logger: logging.Logger | logging.LoggerAdapter,
+    state: StateBase,
+    ret: int | None,
+    start: float,
+    sync: bool,
+):
+    'Record the run on the plugin state, publish to MQTT and persist state'
+    # Handle misbehaving plugins (when main does not return a value)
+    if ret is None:
+        logger.debug('WARN: Plugin %s did not return a value', plugin_name)
+        ret = 1
+
+    # Update common plugin state attributes
+    state.last_run = now_aest()
+    state.last_count = ret
+
+    if sync is False:
+        # Publish state to MQTT when running async
+        with metrics.timed(plugin_name, 'publish'):
+            publish_plugin_run_to_mqtt(plugin_name, state, time.perf_counter() - start)
+        logger.debug('Queued publish to informa/%s via MQTT', plugin_name)
+
+    # Persist plugin metadata
+    with metrics.timed(plugin_name, 'write_state'):
         _write_state(plugin_name, state)
-        logger.debug('State persisted')
+    logger.debug('State persisted')
+
+    metrics.run_finished(plugin_name, success=True, count=ret)
+    http_cache.commit_fetched(plugin_name)
 
+
+@contextlib.contextmanager
+def _handle_run_errors(plugin_name: str, logger: logging.Logger | logging.LoggerAdapter) -> Iterator[None]:
+    'Log a failed plugin run, and drop the partially modified state and cached HTTP responses'
+    try:
+        yield
+        return
     except AppError as e:
         logger.error(str(e))
     except ValidationError as e:
@@ -136,13 +238,29 @@ def _load_run_persist(
     except Exception:
         logger.exception('Unhandled exception')
 
+    metrics.run_finished(plugin_name, success=False)
+    _invalidate_state(plugin_name)
+    http_cache.invalidate_plugin(plugin_name)
+
+
+def publish_plugin_run_to_mqtt(plugin_name: str, state: StateBase, duration: float):
+    '''
+    Write plugin's output to MQTT topics, as a single batch on the shared MQTT connection
 
-def publish_plugin_run_to_mqtt(plugin_name: str, state: StateBase):
-    'Write plugin\'s output to a MQTT topic'
-    client = mqtt.Client(CallbackAPIVersion.VERSION2)
-    client.connect('locke', 1883)
-    client.publish(f'informa/{plugin_name}/last_run', state.last_run.isoformat(), retain=True)
-    client.publish(f'informa/{plugin_name}/last_count', state.last_count, retain=True)
+    Params:
+        plugin_name:  Plugin module name
+        state:        Plugin state after the run
+        duration:     Run duration in seconds
+    '''
+    get_publisher().publish([
+        (f'informa/{plugin_name}/last_run', state.last_run.isoformat(), True),
+        (f'informa/{plugin_name}/last_count', state.last_count, True),
+        (
+            f'informa/{plugin_name}/run',
+            orjson.dumps({'last_run': state.last_run, 'last_count': state.last_count, 'duration': duration}),
+            True,
+        ),
+    ])
 
 
 @pass_plugin_name
@@ -154,8 +272,7 @@ def write_config(plugin_name: str, config: DataClassJsonMixin):
         plugin_name:  Plugin module name, provided by the @pass_plugin_name decorator
         config:       Plugin config to serialise into JSON
     '''
-    with open(f'config/{plugin_name}.yaml', 'w', encoding='utf8') as f:
-        f.write(yaml.dump(config.to_dict()))
+    config_cache.write(plugin_name, config.to_dict())
 
 
 @pass_plugin_name
@@ -173,6 +290,29 @@ def load_config(
     return _load_config(plugin_name, config_cls)
 
 
+@pass_plugin_name
+def on_config_change(plugin_name: str, config_cls: type[ConfigBase]) -> Callable:
+    '''
+    Decorator registering a function to be called with the new config, when the plugin's config file changes
+
+    Params:
+        plugin_name:  Plugin module name, supplied by the @pass_plugin_name decorator
+        config_cls:   Plugin's config class type
+    '''
+
+    def decorator(func: Callable) -> Callable:
+        config_cache.subscribe(plugin_name, config_cls, func)
+        return func
+
+    return decorator
+
+
+@app.task('every 30 seconds', name='informa.config_watch')
+def watch_config():
+    'Notify plugins of config file changes'
+    config_cache.poll()
+
+
 @pass_plugin_name
 def load_state(
     plugin_name: str, logger: logging.Logger | logging.LoggerAdapter, state_cls: type[StateBase]
@@ -197,9 +337,32 @@ def write_state(plugin_name: str, state_obj: StateBase):
         plugin_name:  Plugin module name, provided by the @pass_plugin_name decorator
         state_obj:    Plugin's state object
     '''
+    # Explicit writes always persist, as the state may have been modified in-place
+    state_obj.mark_dirty()
     _write_state(plugin_name, state_obj)
 
 
+@pass_plugin_name
+@contextlib.contextmanager
+def state_lock(plugin_name: str) -> Iterator[None]:
+    '''
+    Hold the plugin's state lock. Use this around a load_state/write_state pair in a task, to avoid racing
+    with the plugin's other tasks.
+
+    If the block raises, the state cached in memory is dropped, so partial changes made before write_state are
+    not seen by the next load.
+
+    Params:
+        plugin_name:  Plugin module name, provided by the @pass_plugin_name decorator
+    '''
+    with _state_lock(plugin_name):
+        try:
+            yield
+        except BaseException:
+            _invalidate_state(plugin_name)
+            raise
+
+
 @click.command('last-run')
 @click_pass_plugin
 def plugin_last_run(plugin: Plugin):
@@ -213,4 +376,58 @@ def plugin_last_run(plugin: Plugin):
 @click_pass_plugin
 def plugin_run_now(plugin: Plugin):
     'Run the plugin now in the foreground'
-    _load_run_persist(plugin.name, plugin.logger, plugin.state_cls, plugin.main, sync=True)
+    if inspect.iscoroutinefunction(plugin.main):
+        asyncio.run(_aload_run_persist(plugin.name, plugin.logger, plugin.state_cls, plugin.main, sync=True))
+    else:
+        _load_run_persist(plugin.name, plugin.logger, plugin.state_cls, plugin.main, sync=True)
+
+
+@click.command('run-stats')
+@click.option(
+    '--url', help='Base URL of the running informa API', default='http://127.0.0.1:3000', envvar='INFORMA_API_URL'
+)
+@click_pass_plugin
+def plugin_run_stats(plugin: Plugin, url: str):
+    'Show run timings and counts from the running informa'
+    try:
+        resp = requests.get(f'{url}/metrics/plugins/{plugin.name}', timeout=5)
+    except requests.RequestException as e:
+        raise click.ClickException(f'Failed querying informa at {url}: {e}') from e
+
+    if resp.status_code == 404:  # noqa: PLR2004
+        print('No runs recorded since informa started')
+        return
+    if resp.status_code != 200:  # noqa: PLR2004
+        raise click.ClickException(f'HTTP {resp.status_code} querying informa at {url}')
+
+    stats = resp.json()
+    print(f'Runs:        {stats["success"]} succeeded, {stats["failure"]} failed')
+    print(f'Last count:  {stats["last_count"]}')
+    print(f'Total count: {stats["returned_total"]}')
+    print()
+    print(f'{"Phase":<12} {"Count":>6} {"Mean":>10} {"Max":>10} {"Last":>10}')
+
+    for phase in PHASES:
+        if t := stats['phases'].get(phase):
+            mean = t['total'] / t['count']
+            print(f'{phase:<12} {t["count"]:>6} {mean:>9.3f}s {t["max"]:>9.3f}s {t["last"]:>9.3f}s')
+
+
+@click.command('record')
+@click.option('--path', help='Cassette file to write; defaults to the plugin\'s replay fixture')
+@click_pass_plugin
+def plugin_record(plugin: Plugin, path: str | None):
+    'Run the plugin against live services, recording its exchanges for offline replay'
+    # Test harness, only imported when recording
+    from informa.lib.replay import Cassette, fixture_path, run_main
+
+    path = path or fixture_path(plugin.name)
+
+    with Cassette(path, record=True) as cassette:
+        if plugin.config_cls and (config := _load_config(plugin.name, plugin.config_cls)):
+            cassette.config = config.to_dict()
+
+        ret = run_main(plugin, cassette)
+
+    print(f'Plugin returned {ret}, recorded to {path}:')
+    print(f'  {len(cassette.http)} HTTP, {len(cassette.scgi)} SCGI and {len(cassette.mailgun)} Mailgun exchanges')
@@ -0,0 +1,132 @@
+import ast
+import functools
+import importlib
+import logging
+import pathlib
+import time
+from dataclasses import dataclass
+from types import ModuleType
+
+from informa.lib import app, fastapi
+from informa.lib.plugin import setup_plugin_cli
+
+logger = logging.getLogger('informa')
+
+
+PLUGIN_PATH = pathlib.Path(__file__).parent.parent / 'plugins'
+
+
+@dataclass(frozen=True)
+class PluginManifest:
+    'Static description of a plugin, determined without importing it'
+
+    filename: str
+    module_name: str
+    cli_name: str | None
+    cli_help: str | None
+
+    @property
+    def import_path(self) -> str:
+        return f'informa.plugins.{self.module_name}'
+
+
+def _parse_cli_group(module_name: str, tree: ast.Module) -> tuple[str | None, str | None]:
+    '''
+    Find the plugin's top-level `cli` click group in the module AST, and return its name and help text.
+
+    The group name is evaluated from the decorator's `name=` kwarg, which is written by convention
+    as an expression on `__name__`.
+    '''
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef) or node.name != 'cli':
+            continue
+
+        cli_name = module_name.replace('_', '-')
+
+        for deco in node.decorator_list:
+            if not isinstance(deco, ast.Call):
+                continue
+            for kw in deco.keywords:
+                if kw.arg == 'name':
+                    try:
+                        cli_name = eval(  # noqa: S307
+                            compile(ast.Expression(kw.value), '<manifest>', 'eval'),
+                            {'__builtins__': {}},
+                            {'__name__': f'informa.plugins.{module_name}'},
+                        )
+                    except Exception:  # noqa: BLE001
+                        logger.debug('Cannot evaluate CLI name for %s, using default', module_name)
+
+        return cli_name, ast.get_docstring(node)
+
+    return None, None
+
+
+@functools.lru_cache
+def manifest() -> dict[str, PluginManifest]:
+    '''
+    Build an index of all plugins by parsing their source, without importing them. Built once per process.
+
+    Returns:
+        Dict of plugin filename to PluginManifest
+    '''
+    plugins = {}
+
+    for plug in sorted(PLUGIN_PATH.glob('*.py')):
+        # Convert dashes into underscores for python imports
+        module_name = plug.stem.replace('-', '_')
+
+        try:
+            tree = ast.parse(plug.read_text(encoding='utf8'), filename=str(plug))
+        except SyntaxError as e:
+            logger.error('Plugin "%s" not parsed: %s', plug.name, e)
+            continue
+
+        cli_name, cli_help = _parse_cli_group(module_name, tree)
+        plugins[plug.name] = PluginManifest(plug.name, module_name, cli_name, cli_help)
+
+    return plugins
+
+
+def find_by_cli_name(cli_name: str) -> PluginManifest | None:
+    'Return the manifest for the plugin exposing a CLI group called `cli_name`'
+    return next((m for m in manifest().values() if m.cli_name == cli_name), None)
+
+
+@functools.lru_cache
+def load_plugin(filename: str) -> ModuleType | None:
+    '''
+    Import a single plugin, complete its descriptor and setup its CLI context
+
+    The Rocketry tasks and FastAPI routes created while importing are recorded on the plugin descriptor,
+    along with the time taken to load the plugin.
+
+    Params:
+        filename:  Plugin filename from the manifest, eg. "dans.py"
+    Returns:
+        The imported module, or None if the plugin's dependencies are missing
+    '''
+    spec = manifest()[filename]
+
+    tasks_before = set(app.session.tasks)
+    routes_before = len(fastapi.router.routes)
+    start = time.perf_counter()
+
+    try:
+        logger.debug('Loading %s', spec.import_path)
+
+        # Dynamic import to register rocketry tasks
+        module = importlib.import_module(spec.import_path)
+
+    except ModuleNotFoundError as e:
+        logger.error('Plugin "%s" not loaded: %s', filename, e)
+        return None
+
+    # Setup CLI for the plugin
+    plugin = setup_plugin_cli(module)
+
+    plugin.tasks = [t for t in app.session.tasks if t not in tasks_before]
+    plugin.routes = fastapi.router.routes[routes_before:]
+    plugin.load_time = time.perf_counter() - start
+
+    return module
@@ -0,0 +1,261 @@
+'''
+Record & replay of a plugin's external exchanges, for running plugins offline in tests and benchmarks.
+
+HTTP requests (via `informa.lib.http`), rtorrent SCGI calls (via both the sync and asyncio rtorrent clients) and
+Mailgun sends are captured into a cassette, a JSON file per plugin under `test/fixtures/replay`. On replay,
+requests are answered from the cassette, matched by method & URL (or SCGI method & params) in the order they were
+recorded, so concurrent requests replay correctly.
+
+Mailgun sends are never made while a cassette is active; they are captured in `Cassette.mailgun`.
+'''
+
+import asyncio
+import base64
+import collections
+import contextlib
+import inspect
+import os
+import sys
+import tempfile
+import xmlrpc.client
+from collections.abc import AsyncIterator, Callable, Iterator
+from types import TracebackType
+from typing import Any, Self
+
+import httpx
+import orjson
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from informa.exceptions import ReplayMissing
+from informa.lib import Plugin, StateBase, plugin_context
+from informa.lib import http as http_lib
+from informa.lib import mailgun as mailgun_lib
+from informa.lib.codec import decode, orjson_default
+
+# Resolved against the source tree, so fixtures are found whatever the working directory
+REPLAY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'test', 'fixtures', 'replay')
+
+# Module of the rtorrent clients, whose SCGI response bodies are intercepted below the XML-RPC layer
+SCGI_MODULE = 'informa.plugins.f1torrents'
+
+# Bodies are stored decoded, so headers describing the encoded body are dropped
+SKIP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+
+
+def fixture_path(plugin_name: str) -> str:
+    return f'{REPLAY_DIR}/{plugin_name}.json'
+
+
+def _headers(headers) -> dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() not in SKIP_HEADERS}
+
+
+def _encode_body(body: bytes) -> dict[str, str]:
+    try:
+        return {'body': body.decode('utf8'), 'body_encoding': 'utf8'}
+    except UnicodeDecodeError:
+        return {'body': base64.b64encode(body).decode(), 'body_encoding': 'base64'}
+
+
+def _decode_body(exchange: dict) -> bytes:
+    if exchange['body_encoding'] == 'base64':
+        return base64.b64decode(exchange['body'])
+    return exchange['body'].encode('utf8')
+
+
+class Cassette:
+    '''
+    Context manager intercepting a plugin's external exchanges, either recording them or replaying them
+
+    Params:
+        path:    Cassette JSON file
+        record:  Make real requests and record them, rather than replay
+    '''
+
+    def __init__(self, path: str, *, record: bool = False):
+        self.path = path
+        self.record = record
+
+        self.config: dict | None = None
+        self.http: list[dict] = []
+        self.scgi: list[dict] = []
+        self.mailgun: list[dict] = []
+
+        self._replay_http: dict[tuple[str, str], collections.deque] = collections.defaultdict(collections.deque)
+        self._replay_scgi: dict[str, collections.deque] = collections.defaultdict(collections.deque)
+        self._stack = contextlib.ExitStack()
+
+    @classmethod
+    def load(cls, path: str) -> Self:
+        'Load a cassette for replay'
+        cassette = cls(path)
+        with open(path, 'rb') as f:
+            data = orjson.loads(f.read())
+
+        cassette.config = data.get('config')
+        for exchange in data.get('http', []):
+            cassette._replay_http[exchange['method'], exchange['url']].append(exchange)
+        for exchange in data.get('scgi', []):
+            cassette._replay_scgi[orjson.dumps([exchange['method'], exchange['params']]).decode()].append(exchange)
+
+        return cassette
+
+    def save(self):
+        with open(self.path, 'wb') as f:
+            f.write(
+                orjson.dumps(
+                    {'config': self.config, 'http': self.http, 'scgi': self.scgi, 'mailgun': self.mailgun},
+                    default=orjson_default,
+                    option=orjson.OPT_INDENT_2,
+                )
+            )
+
+    def _patch(self, obj: Any, name: str, value: Any):
+        original = getattr(obj, name)
+        setattr(obj, name, value)
+        self._stack.callback(setattr, obj, name, original)
+
+    def __enter__(self) -> Self:
+        # Bypass the on-disk HTTP cache, so full responses are recorded, and replayed as changed
+        cache_dir = self._stack.enter_context(tempfile.TemporaryDirectory())
+        self._patch(http_lib, 'http_cache', http_lib.HttpCache(cache_dir))
+
+        self._patch(http_lib.HttpClient, 'request', self._http_request(http_lib.HttpClient.request))
+        self._patch(http_lib.AsyncHttpClient, 'send', self._async_http_send(http_lib.AsyncHttpClient.send))
+        self._patch(mailgun_lib, 'send', self._mailgun_send)
+
+        # Only when the plugin is loaded, to avoid importing it as a side effect. Every sync call streams its
+        # response via SCGITransport.stream_request, and every async call via AsyncRTorrent._stream
+        if scgi := sys.modules.get(SCGI_MODULE):
+            self._patch(scgi.SCGITransport, 'stream_request', self._scgi_stream(scgi.SCGITransport.stream_request))
+            stream = scgi.AsyncRTorrent._stream  # noqa: SLF001
+            self._patch(scgi.AsyncRTorrent, '_stream', self._async_scgi_stream(stream))
+
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None):
+        self._stack.close()
+        if self.record and exc_type is None:
+            self.save()
+
+    def _next_http(self, method: str, url: str) -> dict:
+        try:
+            return self._replay_http[method, url].popleft()
+        except IndexError:
+            raise ReplayMissing(f'{method} {url}') from None
+
+    def _http_request(self, original: Callable) -> Callable:
+        cassette = self
+
+        def request(client, method, url, *args, **kwargs) -> requests.Response:
+            if cassette.record:
+                resp = original(client, method, url, *args, **kwargs)
+                cassette.http.append({
+                    'method': method.upper(),
+                    'url': url,
+                    'status': resp.status_code,
+                    'headers': _headers(resp.headers),
+                    **_encode_body(resp.content),
+                })
+                return resp
+
+            exchange = cassette._next_http(method.upper(), url)
+            resp = requests.Response()
+            resp.status_code = exchange['status']
+            resp.headers = CaseInsensitiveDict(exchange['headers'])
+            resp._content = _decode_body(exchange)  # noqa: SLF001
+            resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+            resp.url = url
+            return resp
+
+        return request
+
+    def _async_http_send(self, original: Callable) -> Callable:
+        cassette = self
+
+        async def send(client, request: httpx.Request, **kwargs) -> httpx.Response:
+            url = str(request.url)
+
+            if cassette.record:
+                resp = await original(client, request, **kwargs)
+                cassette.http.append({
+                    'method': request.method,
+                    'url': url,
+                    'status': resp.status_code,
+                    'headers': _headers(resp.headers),
+                    **_encode_body(resp.content),
+                })
+                return resp
+
+            exchange = cassette._next_http(request.method, url)
+            return httpx.Response(
+                exchange['status'], headers=exchange['headers'], content=_decode_body(exchange), request=request
+            )
+
+        return send
+
+    def _record_scgi(self, method: str, params: tuple, body: bytes):
+        self.scgi.append({'method': method, 'params': params, **_encode_body(body)})
+
+    def _next_scgi(self, method: str, params: tuple) -> bytes:
+        try:
+            return _decode_body(self._replay_scgi[orjson.dumps([method, params]).decode()].popleft())
+        except IndexError:
+            raise ReplayMissing(f'SCGI {method}{params}') from None
+
+    def _scgi_stream(self, original: Callable) -> Callable:
+        cassette = self
+
+        def stream_request(transport, host: str, handler: str, request_body: str | bytes) -> Iterator[bytes]:
+            params, method = xmlrpc.client.loads(request_body)
+
+            if not cassette.record:
+                yield cassette._next_scgi(method, params)
+                return
+
+            chunks = []
+            for chunk in original(transport, host, handler, request_body):
+                chunks.append(chunk)
+                yield chunk
+            cassette._record_scgi(method, params, b''.join(chunks))
+
+        return stream_request
+
+    def _async_scgi_stream(self, original: Callable) -> Callable:
+        cassette = self
+
+        async def stream(client, method: str, params: tuple) -> AsyncIterator[bytes]:
+            if not cassette.record:
+                yield cassette._next_scgi(method, params)
+                return
+
+            chunks = []
+            async for chunk in original(client, method, params):
+                chunks.append(chunk)
+                yield chunk
+            cassette._record_scgi(method, params, b''.join(chunks))
+
+        return stream
+
+    def _mailgun_send(self, _logger, subject: str, template: str | None = None, content: Any = None) -> bool:
+        self.mailgun.append({'subject': subject, 'template': template, 'content': content})
+        return True
+
+
+def run_main(plugin: Plugin, cassette: Cassette, state: StateBase | None = None) -> Any:
+    '''
+    Run a plugin's main function once, with fresh state unless passed, and config from the cassette
+
+    Nothing is persisted or published; returns the value returned by main.
+    '''
+    state = state or plugin.state_cls()
+    args: tuple = (state,)
+
+    if plugin.config_cls and len(inspect.signature(plugin.main).parameters) > 1:
+        args = (state, decode(plugin.config_cls, cassette.config or {}))
+
+    with plugin_context(plugin.name):
+        if inspect.iscoroutinefunction(plugin.main):
+            return asyncio.run(plugin.main(*args))
+        return plugin.main(*args)
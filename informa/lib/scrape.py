@@ -0,0 +1,52 @@
+import functools
+
+import lxml.html
+
+
+def parse(html: str | bytes) -> lxml.html.HtmlElement:
+    '''
+    Parse an HTML page with lxml.
+
+    lxml builds its tree in C, and Python objects are only created for the elements selected from it, making
+    this many times faster than building a BeautifulSoup tree of the whole page.
+    '''
+    return lxml.html.fromstring(html)
+
+
+@functools.cache
+def _xpath(selector: str) -> str:
+    '''
+    Translate a simple CSS selector into XPath, relative to the element it is applied to
+
+    Supports descendant combinators of `tag`, `.class` and `tag.class` steps, eg. 'div.product-info h4'
+    '''
+    steps = []
+    for step in selector.split():
+        name, _, class_ = step.partition('.')
+        xpath = name or '*'
+        if class_:
+            xpath += f"[contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')]"
+        steps.append(xpath)
+
+    return './/' + '//'.join(steps)
+
+
+def select(element: lxml.html.HtmlElement, selector: str) -> list[lxml.html.HtmlElement]:
+    '''
+    Return descendants of `element` matching a simple CSS selector
+
+    Params:
+        element:   Parsed page, or an element within it
+        selector:  Space-separated `tag`, `.class` or `tag.class` steps
+    '''
+    return element.xpath(_xpath(selector))
+
+
+def select_one(element: lxml.html.HtmlElement, selector: str) -> lxml.html.HtmlElement | None:
+    'Return the first descendant of `element` matching `selector`, or None'
+    return next(iter(select(element, selector)), None)
+
+
+def text(element: lxml.html.HtmlElement) -> str:
+    'Return the stripped text content of an element'
+    return element.text_content().strip()
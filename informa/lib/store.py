@@ -0,0 +1,534 @@
+import abc
+import atexit
+import contextlib
+import dataclasses
+import functools
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any
+
+import orjson
+
+from informa.exceptions import StateJsonDecodeError, UnknownStateFsync, UnknownStateStore
+from informa.lib.codec import decode, encode
+
+STATE_DIR = 'state'
+
+# Field metadata key marking a list as an append-only collection
+APPEND_ONLY = 'informa_append_only'
+
+
+def append_only() -> Any:
+    '''
+    Declare a State list field as an append-only collection.
+
+    Stores which support it persist only the items appended (or trimmed from the front) since the state was
+    loaded, rather than reserialising the whole list. Items must not be modified in-place once persisted;
+    reassign the field to rewrite the collection.
+    '''
+    return dataclasses.field(default_factory=list, metadata={APPEND_ONLY: True})
+
+
+class AppendOnlyList(list):
+    '''
+    List which tracks the changes made since it was loaded from a store.
+
+    Appends and deletions from the front are tracked, so they can be persisted incrementally. Any other
+    mutation flags the list for a full rewrite on the next write.
+    '''
+
+    def __init__(self, iterable=(), persisted: int = 0):
+        super().__init__(iterable)
+        # Count of leading items already persisted
+        self.persisted = persisted
+        # Count of persisted items deleted from the front
+        self.trimmed = 0
+        self.rewrite = False
+
+    @property
+    def changed(self) -> bool:
+        return self.rewrite or bool(self.trimmed) or self.persisted != len(self)
+
+    def mark_persisted(self):
+        self.persisted = len(self)
+        self.trimmed = 0
+        self.rewrite = False
+
+    def _removed(self, start: int, count: int):
+        'Track removal of `count` items from index `start`'
+        if start >= self.persisted:
+            # Unpersisted items only
+            return
+        if start == 0 and count <= self.persisted:
+            self.trimmed += count
+            self.persisted -= count
+        else:
+            self.rewrite = True
+
+    def __delitem__(self, key):
+        if isinstance(key, slice):
+            indices = range(*key.indices(len(self)))
+            if indices and indices.step == 1:
+                self._removed(indices.start, len(indices))
+            elif indices:
+                self.rewrite = True
+        else:
+            self._removed(range(len(self))[key], 1)
+        super().__delitem__(key)
+
+    def pop(self, index=-1):
+        self._removed(range(len(self))[index], 1)
+        return super().pop(index)
+
+    def __setitem__(self, key, value):
+        self.rewrite = True
+        super().__setitem__(key, value)
+
+    def insert(self, index, obj):
+        self.rewrite = True
+        super().insert(index, obj)
+
+    def remove(self, value):
+        self.rewrite = True
+        super().remove(value)
+
+    def clear(self):
+        self.rewrite = True
+        super().clear()
+
+    def sort(self, *args, **kwargs):
+        self.rewrite = True
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self.rewrite = True
+        super().reverse()
+
+    def __imul__(self, n):
+        self.rewrite = True
+        return super().__imul__(n)
+
+
+def _append_only_fields(state_cls) -> list[str]:
+    return [f.name for f in dataclasses.fields(state_cls) if f.metadata.get(APPEND_ONLY)]
+
+
+def is_dirty(state_obj: Any) -> bool:
+    'Return True if state has been modified since it was loaded or written'
+    if getattr(state_obj, '_dirty', True):
+        return True
+    return any(
+        isinstance(items, AppendOnlyList) and items.changed
+        for items in (getattr(state_obj, name) for name in _append_only_fields(state_obj))
+    )
+
+
+def mark_clean(state_obj: Any):
+    object.__setattr__(state_obj, '_dirty', False)
+
+
+class StateStore(abc.ABC):
+    'Base class for plugin state persistence backends'
+
+    @abc.abstractmethod
+    def load(self, plugin_name: str, state_cls: type) -> Any | None:
+        '''
+        Load plugin state
+
+        Params:
+            plugin_name:  Plugin module name
+            state_cls:    Plugin's state class type
+        Returns:
+            Instance of `state_cls`, or None if no state has been persisted
+        '''
+
+    @abc.abstractmethod
+    def write(self, plugin_name: str, state_obj: Any):
+        '''
+        Persist plugin state
+
+        Params:
+            plugin_name:  Plugin module name
+            state_obj:    Plugin's state object
+        '''
+
+    def version(self, plugin_name: str) -> Any | None:  # noqa: ARG002
+        '''
+        Return a token which changes whenever the plugin's persisted state changes, or None if the
+        state cannot be versioned
+        '''
+        return None
+
+    def invalidate(self, plugin_name: str):
+        'Drop any state held in memory for this plugin'
+
+    def flush(self):
+        'Ensure all writes are durable'
+
+
+class JsonFileStore(StateStore):
+    '''
+    Store each plugin's state as a single JSON file, rewritten in full on each write.
+
+    Writes go to a temp file which is renamed over the state file, so a crash never leaves a truncated
+    file. Writes are skipped if the file on disk already has the same content.
+
+    The fsync policy controls durability against power loss:
+        always:  fsync file & directory on every write
+        batch:   fsync files written since the last sync, at most every `fsync_interval` seconds and at exit
+        never:   leave it to the OS
+    '''
+
+    FSYNC_POLICIES = ('always', 'batch', 'never')
+
+    def __init__(self, path: str = STATE_DIR, fsync: str = 'batch', fsync_interval: float = 30):
+        if fsync not in self.FSYNC_POLICIES:
+            raise UnknownStateFsync
+
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        # Digest and stat of each state file, as last read or written by this store
+        self._known: dict[str, tuple[bytes, int, int]] = {}
+        self._pending: set[str] = set()
+        self._last_sync = time.monotonic()
+
+    def _remember(self, path: str, data: bytes, st: os.stat_result):
+        with self._lock:
+            self._known[path] = (hashlib.blake2b(data, digest_size=16).digest(), st.st_mtime_ns, st.st_size)
+
+    def _is_unchanged(self, path: str, data: bytes) -> bool:
+        'Return True if the state file on disk already contains `data`'
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        with self._lock:
+            known = self._known.get(path)
+
+        return known == (hashlib.blake2b(data, digest_size=16).digest(), st.st_mtime_ns, st.st_size)
+
+    def version(self, plugin_name: str) -> Any | None:
+        try:
+            st = os.stat(f'{self.path}/{plugin_name}.json')
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def load(self, plugin_name: str, state_cls: type) -> Any | None:
+        path = f'{self.path}/{plugin_name}.json'
+
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+                self._remember(path, raw, os.fstat(f.fileno()))
+
+            data = orjson.loads(raw)
+            if not data:
+                raise StateJsonDecodeError
+        except FileNotFoundError:
+            return None
+
+        # Inflate JSON into the State dataclass
+        state = decode(state_cls, data)
+
+        # Track changes to append-only collections, for dirty checking
+        for name in _append_only_fields(state_cls):
+            items = getattr(state, name)
+            setattr(state, name, AppendOnlyList(items, persisted=len(items)))
+
+        return state
+
+    def write(self, plugin_name: str, state_obj: Any):
+        path = f'{self.path}/{plugin_name}.json'
+        data = encode(state_obj)
+
+        if not self._is_unchanged(path, data):
+            self._write_file(path, data)
+
+        # Track further changes to append-only collections, for dirty checking
+        for name in _append_only_fields(state_obj):
+            items = getattr(state_obj, name)
+            if isinstance(items, AppendOnlyList):
+                items.mark_persisted()
+            else:
+                setattr(state_obj, name, AppendOnlyList(items, persisted=len(items)))
+
+    def _write_file(self, path: str, data: bytes):
+        'Atomically replace the file at `path`'
+        if not os.path.exists(self.path):
+            os.mkdir(self.path)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                if self.fsync == 'always':
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            # mkstemp creates files readable only by the owner
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+        self._remember(path, data, os.stat(path))
+
+        if self.fsync == 'always':
+            self._fsync_dir()
+        elif self.fsync == 'batch':
+            with self._lock:
+                self._pending.add(path)
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.flush()
+
+    def _fsync_dir(self):
+        'Make renames in the state directory durable'
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            self._last_sync = time.monotonic()
+
+        if not pending:
+            return
+
+        for path in pending:
+            with contextlib.suppress(FileNotFoundError), open(path, 'rb') as f:
+                os.fsync(f.fileno())
+
+        self._fsync_dir()
+
+
+class SqliteStore(StateStore):
+    '''
+    Store plugin state in an SQLite database in WAL mode.
+
+    Scalar state fields are stored as a single JSON row per plugin. Fields declared with `append_only()` are
+    stored one row per item, and only changed items are written.
+
+    State not yet in the database is migrated from the JSON file store on first load.
+    '''
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS state (
+            plugin TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS collection (
+            plugin TEXT NOT NULL,
+            field TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            item BLOB NOT NULL,
+            PRIMARY KEY (plugin, field, seq)
+        );
+    '''
+
+    def __init__(self, path: str = STATE_DIR):
+        self.path = path
+        self.fallback = JsonFileStore(path, fsync='never')
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        'Return a connection for the current thread'
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not os.path.exists(self.path):
+                os.mkdir(self.path)
+
+            conn = sqlite3.connect(f'{self.path}/informa.db')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def version(self, plugin_name: str) -> Any | None:
+        row = self._conn().execute('SELECT version FROM state WHERE plugin = ?', (plugin_name,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, plugin_name: str, state_cls: type) -> Any | None:
+        conn = self._conn()
+        collections = _append_only_fields(state_cls)
+
+        row = conn.execute('SELECT data FROM state WHERE plugin = ?', (plugin_name,)).fetchone()
+        if row is None:
+            state = self.fallback.load(plugin_name, state_cls)
+            if state is None:
+                return None
+
+            # Nothing from the JSON store is persisted here yet
+            for name in collections:
+                setattr(state, name, AppendOnlyList(getattr(state, name)))
+            return state
+
+        data = orjson.loads(row[0])
+
+        for name in collections:
+            items = conn.execute(
+                'SELECT item FROM collection WHERE plugin = ? AND field = ? ORDER BY seq', (plugin_name, name)
+            ).fetchall()
+            # Decode all items in a single pass
+            data[name] = orjson.loads(b'[' + b','.join(item for (item,) in items) + b']')
+
+        # Inflate JSON into the State dataclass
+        state = decode(state_cls, data)
+
+        for name in collections:
+            items = getattr(state, name)
+            setattr(state, name, AppendOnlyList(items, persisted=len(items)))
+
+        return state
+
+    def write(self, plugin_name: str, state_obj: Any):
+        conn = self._conn()
+        scalars = {}
+
+        with conn:
+            for f in dataclasses.fields(state_obj):
+                value = getattr(state_obj, f.name)
+
+                if not f.metadata.get(APPEND_ONLY):
+                    scalars[f.name] = value
+                    continue
+
+                if not isinstance(value, AppendOnlyList):
+                    # Track further changes to the collection on this state object
+                    value = AppendOnlyList(value)
+                    value.rewrite = True
+                    setattr(state_obj, f.name, value)
+
+                self._write_collection(conn, plugin_name, f.name, value)
+
+            conn.execute(
+                '''
+                INSERT INTO state (plugin, data) VALUES (?, ?)
+                ON CONFLICT (plugin) DO UPDATE SET data = excluded.data, version = version + 1
+                ''',
+                (plugin_name, encode(scalars)),
+            )
+
+    def _write_collection(self, conn: sqlite3.Connection, plugin_name: str, name: str, items: AppendOnlyList):
+        'Persist the changes to an append-only collection'
+        key = (plugin_name, name)
+
+        if items.rewrite:
+            conn.execute('DELETE FROM collection WHERE plugin = ? AND field = ?', key)
+            new_items = list(items)
+            next_seq = 0
+        else:
+            if items.trimmed:
+                conn.execute(
+                    '''
+                    DELETE FROM collection WHERE plugin = ? AND field = ? AND seq IN (
+                        SELECT seq FROM collection WHERE plugin = ? AND field = ? ORDER BY seq LIMIT ?
+                    )
+                    ''',
+                    (*key, *key, items.trimmed),
+                )
+            new_items = items[items.persisted :]
+            (next_seq,) = conn.execute(
+                'SELECT COALESCE(MAX(seq), -1) + 1 FROM collection WHERE plugin = ? AND field = ?', key
+            ).fetchone()
+
+        conn.executemany(
+            'INSERT INTO collection (plugin, field, seq, item) VALUES (?, ?, ?, ?)',
+            [(*key, next_seq + i, encode(item)) for i, item in enumerate(new_items)],
+        )
+
+        items.mark_persisted()
+
+
+class CachedStore(StateStore):
+    '''
+    Keep inflated state objects in memory between plugin runs, in front of another store.
+
+    A cached object is reused while the underlying store's version for the plugin is unchanged, so edits
+    made by another process (eg. a CLI command) are picked up. Writes of clean state are skipped; note a plugin
+    run always sets `last_run`, so state is written after every run.
+
+    Callers modifying a loaded state object must drop it with `invalidate` if they fail before writing it, as
+    the plugin run and `state_lock` do.
+    '''
+
+    def __init__(self, store: StateStore):
+        self.store = store
+        # Cached state object and its store version, per plugin
+        self._cache: dict[str, tuple[Any, Any]] = {}
+
+    def load(self, plugin_name: str, state_cls: type) -> Any | None:
+        version = self.store.version(plugin_name)
+
+        cached = self._cache.get(plugin_name)
+        if version is not None and cached and cached[0] == version and type(cached[1]) is state_cls:
+            return cached[1]
+
+        state = self.store.load(plugin_name, state_cls)
+        if state is None:
+            self._cache.pop(plugin_name, None)
+            return None
+
+        mark_clean(state)
+        if version is not None:
+            self._cache[plugin_name] = (version, state)
+        return state
+
+    def write(self, plugin_name: str, state_obj: Any):
+        if not is_dirty(state_obj):
+            return
+
+        self.store.write(plugin_name, state_obj)
+        mark_clean(state_obj)
+
+        if (version := self.store.version(plugin_name)) is not None:
+            self._cache[plugin_name] = (version, state_obj)
+
+    def version(self, plugin_name: str) -> Any | None:
+        return self.store.version(plugin_name)
+
+    def invalidate(self, plugin_name: str):
+        self._cache.pop(plugin_name, None)
+        self.store.invalidate(plugin_name)
+
+    def flush(self):
+        self.store.flush()
+
+
+@functools.lru_cache
+def get_state_store() -> StateStore:
+    '''
+    Return the state store configured by env vars:
+        STATE_STORE:  "json" (the default) or "sqlite"
+        STATE_FSYNC:  fsync policy for the JSON store; "always", "batch" (the default) or "never"
+    '''
+    backend = os.environ.get('STATE_STORE', 'json')
+
+    store: StateStore
+    if backend == 'json':
+        store = JsonFileStore(fsync=os.environ.get('STATE_FSYNC', 'batch'))
+    elif backend == 'sqlite':
+        store = SqliteStore()
+    else:
+        raise UnknownStateStore
+
+    # Sync any batched writes on shutdown
+    atexit.register(store.flush)
+
+    return CachedStore(store)
@@ -1,11 +1,19 @@
+import bisect
 import contextlib
 import datetime
 import decimal
 import logging
-from dataclasses import dataclass, field
+import os
+import tempfile
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
 
 import click
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
 
 from informa.lib import (
@@ -13,9 +21,11 @@ from informa.lib import (
     PluginAdapter,
     StateBase,
     app,
+    http,
     mailgun,
 )
-from informa.lib.plugin import load_run_persist, load_state, write_state
+from informa.lib.plugin import load_config, load_run_persist, load_state, write_state
+from informa.lib.store import append_only, get_state_store
 from informa.lib.utils import now_aest
 
 logger = PluginAdapter(logging.getLogger('informa'))
@@ -23,6 +33,10 @@ logger = PluginAdapter(logging.getLogger('informa'))
 
 TEMPLATE_NAME = 'dans.tmpl'
 
+TZ = ZoneInfo('Australia/Melbourne')
+
+CENT = decimal.Decimal('0.01')
+
 
 @dataclass
 class Product:
@@ -39,89 +53,261 @@ class History:
     alerted: bool = False
 
 
+@dataclass
+class HistorySummary:
+    '''
+    Compacted history for one product over a day or a week; `start` is the time of the first query summarised
+    '''
+
+    product: Product
+    start: datetime.datetime
+    count: int
+    low: decimal.Decimal
+    high: decimal.Decimal
+    median: decimal.Decimal
+    alerted: bool = False
+
+
+class HistoryIndex:
+    '''
+    Index over the time-ordered history list, by product id.
+
+    Tracks the position of each product's most recent alert, making lookup O(1). Retention pruning bisects on
+    timestamp and deletes from the front, so is O(expired) rather than a scan of the whole history.
+
+    Positions are absolute; `offset` counts items pruned from the front of the list since it was indexed.
+    '''
+
+    def __init__(self, history: list[History]):
+        self.history = history
+        self.offset = 0
+        self.last_alert: dict[str, int] = {}
+
+        for i, item in enumerate(history):
+            if item.alerted:
+                self.last_alert[item.product.id] = i
+
+        self._length = len(history)
+
+    def is_current(self, history: list[History]) -> bool:
+        'Return True if `history` has not been replaced or modified other than via this index'
+        return history is self.history and len(history) == self._length
+
+    def get_last_alert(self, product: Product) -> History | None:
+        'Lookup most recent alert for this product'
+        pos = self.last_alert.get(product.id)
+        if pos is None or pos < self.offset:
+            return None
+        return self.history[pos - self.offset]
+
+    def append(self, item: History):
+        if item.alerted:
+            self.last_alert[item.product.id] = self.offset + len(self.history)
+        self.history.append(item)
+        self._length += 1
+
+    def prune(self, before: datetime.datetime) -> list[History]:
+        'Remove history older than `before`, returning the removed items'
+        expired = bisect.bisect_left(self.history, before, key=lambda item: item.ts)
+        removed = self.history[:expired]
+        if expired:
+            del self.history[:expired]
+            self.offset += expired
+            self._length -= expired
+        return removed
+
+
 @dataclass
 class State(StateBase):
-    history: list[History] = field(default_factory=list)
+    # Full resolution history, for the recent window
+    history: list[History] = append_only()
+    # Older history compacted per day, then per week
+    daily: list[HistorySummary] = append_only()
+    weekly: list[HistorySummary] = append_only()
+
+    @property
+    def index(self) -> HistoryIndex:
+        'History index, rebuilt only when history was replaced or modified directly'
+        index = getattr(self, '_index', None)
+        if index is None or not index.is_current(self.history):
+            index = HistoryIndex(self.history)
+            # Not a dataclass field, so not persisted; bypass dirty tracking
+            object.__setattr__(self, '_index', index)
+        return index
 
 
 @dataclass
 class Config(ConfigBase):
     products: list[Product]
+    # Maximum product queries in flight at once, also capped by HTTP_HOST_CONCURRENCY
+    max_concurrency: int = 4
+    # Days of history kept at full resolution, and then as daily summaries before compacting to weekly
+    full_resolution_days: int = 90
+    daily_summary_days: int = 400
 
 
 class FailedProductQuery(Exception):
     pass
 
 
-class ProductNeverAlerted(Exception):
-    pass
-
-
-@app.task('every 12 hours', name=__name__)
-def run():
-    load_run_persist(logger, State, main)
+@app.task('every 12 hours', name=__name__, execution='async')
+async def run():
+    await load_run_persist(logger, State, main)
 
 
 def main(state: State, config: Config):
-    sess = requests.Session()
-
-    history_item: History | None = None
     count = 0
 
-    # Iterate configured list of Dan's products
-    for product in config.products:
-        with contextlib.suppress(ProductNeverAlerted):
-            history_item, _ = get_last_alert(product, state.history)
+    # Query all products up-front, so one slow response doesn't stall the rest
+    results = query_products(config.products, config.max_concurrency)
 
-        try:
-            current_price = query_product(sess, product)
-            alerted = False
+    # Iterate configured list of Dan's products, in order
+    for product, current_price in zip(config.products, results, strict=True):
+        history_item = state.index.get_last_alert(product)
 
-            # Check if price within target range, and send an email if so
-            if current_price <= product.target:
-                # Skip product if alerted more recently than 6 days ago
-                if history_item and history_item.ts > now_aest() - datetime.timedelta(days=6):
-                    logger.info('Skipped alerting %s @ %s', product.name, history_item.price)
-                else:
-                    send_alert(product, current_price)
-                    alerted = True
+        if isinstance(current_price, FailedProductQuery):
+            logger.error(current_price)
+            continue
 
-                count += 1
+        alerted = False
 
-            # Track query results
-            result = History(product, current_price, ts=now_aest(), alerted=alerted)
-            add_to_history(state.history, result)
+        # Check if price within target range, and send an email if so
+        if current_price <= product.target:
+            # Skip product if alerted more recently than 6 days ago
+            if history_item and history_item.ts > now_aest() - datetime.timedelta(days=6):
+                logger.info('Skipped alerting %s @ %s', product.name, history_item.price)
+            else:
+                send_alert(product, current_price)
+                alerted = True
 
-        except FailedProductQuery as e:
-            logger.error(e)
+            count += 1
+
+        # Track query results
+        result = History(product, current_price, ts=now_aest(), alerted=alerted)
+        add_to_history(state, result, config)
 
     return count
 
 
-def get_last_alert(product: Product, history: list[History]) -> tuple[History, int]:
-    'Lookup most recent alert for this product'
-    for i, history_item in enumerate(reversed(history)):
-        if history_item.product == product and history_item.alerted:
-            return history_item, i
-    raise ProductNeverAlerted
+def add_to_history(state: State, new_history: History, config: Config):
+    'Add query result to product history, compacting history outside the retention windows'
+    compact_history(state, now_aest(), config.full_resolution_days, config.daily_summary_days)
+
+    state.index.append(new_history)
+
+
+def day_start(ts: datetime.datetime) -> datetime.datetime:
+    return ts.astimezone(TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def week_start(ts: datetime.datetime) -> datetime.datetime:
+    ts = day_start(ts)
+    return ts - datetime.timedelta(days=ts.weekday())
+
+
+def compact_history(state: State, now: datetime.datetime, full_resolution_days: int, daily_summary_days: int):
+    '''
+    Compact history older than `full_resolution_days` into daily summaries, and daily summaries older than
+    `daily_summary_days` into weekly summaries.
+
+    Cutoffs are aligned to day and week boundaries, so each period is only ever summarised once. Only expired
+    items are visited, and they are removed from the front of each list.
+    '''
+    if expired := state.index.prune(day_start(now - datetime.timedelta(days=full_resolution_days))):
+        state.daily.extend(summarise(expired, day_start, lambda item: (item.price, item.price, [(item.price, 1)], 1)))
+
+    week_cutoff = week_start(now - datetime.timedelta(days=daily_summary_days))
+    if expired_days := bisect.bisect_left(state.daily, week_cutoff, key=lambda summary: summary.start):
+        state.weekly.extend(
+            summarise(
+                state.daily[:expired_days],
+                week_start,
+                lambda s: (s.low, s.high, [(s.median, s.count)], s.count),
+            )
+        )
+        del state.daily[:expired_days]
+
+
+def summarise(items: list, period_start: Callable, values: Callable) -> list[HistorySummary]:
+    '''
+    Summarise time-ordered history items per product and period
+
+    Params:
+        items:         History or HistorySummary items
+        period_start:  Function returning the start of the period containing a timestamp
+        values:        Function returning (low, high, [(price, weight)], count) for an item
+    '''
+    periods: dict[tuple[str, datetime.datetime], list] = {}
+
+    for item in items:
+        start = period_start(item.ts if isinstance(item, History) else item.start)
+        periods.setdefault((item.product.id, start), []).append(item)
+
+    summaries = []
+    for group in periods.values():
+        lows, highs, prices, counts = zip(*(values(item) for item in group), strict=True)
+        first = group[0]
+        summaries.append(
+            HistorySummary(
+                group[-1].product,
+                first.ts if isinstance(first, History) else first.start,
+                count=sum(counts),
+                low=min(lows),
+                high=max(highs),
+                median=weighted_median([p for ps in prices for p in ps]),
+                alerted=any(item.alerted for item in group),
+            )
+        )
+
+    return sorted(summaries, key=lambda summary: summary.start)
+
+
+def weighted_median(prices: list[tuple[decimal.Decimal, int]]) -> decimal.Decimal:
+    '''
+    Median of prices weighted by count. Exact for raw prices; for summaries, the median of the medians weighted
+    by how many queries each summarises. When the weight splits evenly, the two middle prices are averaged, as
+    `statistics.median` does.
+    '''
+    prices = sorted(prices)
+    total = sum(weight for _, weight in prices)
+
+    seen = 0
+    for i, (price, weight) in enumerate(prices):
+        seen += weight
+        if seen * 2 == total:
+            return ((price + prices[i + 1][0]) / 2).quantize(CENT)
+        if seen * 2 > total:
+            return price
+    return prices[-1][0]
+
+
+def query_products(products: list[Product], max_workers: int) -> list[decimal.Decimal | FailedProductQuery]:
+    '''
+    Query Dan Murphy's API for many products concurrently
 
+    Params:
+        products:     Products to query for
+        max_workers:  Maximum queries in flight at once
+    Returns:
+        The current price, or the query failure, for each product in order
+    '''
 
-def add_to_history(history: list[History], new_history: History):
-    'Add query result to product history'
-    # Remove history over 13 months old
-    for i, history_item in enumerate(history):
-        if history_item.ts > now_aest() + datetime.timedelta(days=400):
-            del history[i]
+    def query(product: Product) -> decimal.Decimal | FailedProductQuery:
+        try:
+            return query_product(http.client(), product)
+        except FailedProductQuery as e:
+            return e
 
-    history.append(new_history)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dans') as pool:
+        return list(pool.map(query, products))
 
 
-def query_product(sess, product: Product) -> decimal.Decimal:
+def query_product(sess: requests.Session, product: Product) -> decimal.Decimal:
     '''
     Query Dan Murphy's API for a product's current pricing
 
     Params:
-        sess:     Requests session
+        sess:     HTTP client
         product:  Product to query for
     Returns:
         Return the current price
@@ -172,20 +358,157 @@ def cli():
     'Dan Murphy\'s product tracker'
 
 
-def get_history() -> pd.DataFrame:
-    state = load_state(logger, State)
-    df = pd.DataFrame([
+HISTORY_PARQUET = f'state/{__name__}.parquet'
+
+# Bump when HISTORY_SCHEMA changes, to rebuild Parquet snapshots
+HISTORY_FORMAT = 2
+
+# Columnar history schema, with prices as fixed-point integer cents. Each row is a price seen `weight` times;
+# a query is one row, a summary is its low, high and median
+HISTORY_SCHEMA = pa.schema([
+    ('id', pa.dictionary(pa.int32(), pa.string())),
+    ('name', pa.dictionary(pa.int32(), pa.string())),
+    ('target_cents', pa.int64()),
+    ('price_cents', pa.int64()),
+    ('weight', pa.int64()),
+    ('ts', pa.timestamp('us', tz='UTC')),
+    ('alerted', pa.bool_()),
+])
+
+
+def to_cents(price: decimal.Decimal | int) -> int:
+    return int((decimal.Decimal(price) * 100).to_integral_value())
+
+
+def summary_points(summary: HistorySummary) -> list[tuple[decimal.Decimal, int]]:
+    '''
+    Expand a summary into weighted prices: the low and high once each, and the median for the remainder
+    '''
+    if summary.count == 1:
+        return [(summary.median, 1)]
+    if summary.count == 2:  # noqa: PLR2004
+        return [(summary.low, 1), (summary.high, 1)]
+    return [(summary.low, 1), (summary.median, summary.count - 2), (summary.high, 1)]
+
+
+def history_table(state: State) -> pa.Table:
+    'Convert weekly & daily summaries, and full resolution history, into a columnar Arrow table'
+    rows = [
+        (s.product, price, weight, s.start, s.alerted)
+        for s in (*state.weekly, *state.daily)
+        for price, weight in summary_points(s)
+    ]
+    rows.extend((h.product, h.price, 1, h.ts, h.alerted) for h in state.history)
+
+    return pa.table(
         {
-            'id': h.product.id,
-            'name': h.product.name,
-            'target': h.product.target,
-            'price': h.price,
-            'ts': h.ts,
-        }
-        for h in state.history
-    ])
-    df['ts'] = pd.to_datetime(df.ts, utc=True)
-    return df
+            'id': [product.id for product, *_ in rows],
+            'name': [product.name for product, *_ in rows],
+            'target_cents': [to_cents(product.target) for product, *_ in rows],
+            'price_cents': [to_cents(price) for _, price, *_ in rows],
+            'weight': [weight for _, _, weight, *_ in rows],
+            'ts': [ts for *_, ts, _ in rows],
+            'alerted': [alerted for *_, alerted in rows],
+        },
+        schema=HISTORY_SCHEMA,
+    )
+
+
+def write_history(table: pa.Table, path: str):
+    'Atomically write history as Parquet, via a temp file in the destination directory'
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pq.write_table(table, f)
+
+        # mkstemp creates files readable only by the owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+def get_history(columns: list[str] | None = None) -> pd.DataFrame:
+    '''
+    Load history as a DataFrame, reading only `columns`.
+
+    History is read from a Parquet snapshot, which is rebuilt from plugin state when the state has changed.
+
+    Params:
+        columns:  Columns to load from `HISTORY_SCHEMA`; defaults to all
+    '''
+    version = repr((HISTORY_FORMAT, get_state_store().version(__name__))).encode()
+
+    with contextlib.suppress(FileNotFoundError, pa.ArrowInvalid):
+        if (pq.read_schema(HISTORY_PARQUET).metadata or {}).get(b'informa_state_version') == version:
+            return pd.read_parquet(HISTORY_PARQUET, columns=columns)
+
+    table = history_table(load_state(logger, State))
+    write_history(table.replace_schema_metadata({'informa_state_version': version}), HISTORY_PARQUET)
+
+    return table.select(columns or HISTORY_SCHEMA.names).to_pandas()
+
+
+def latest_queries(df: pd.DataFrame) -> pd.DataFrame:
+    'Return the most recent query of each product, indexed by name'
+    return df.loc[df.groupby('name', observed=True).ts.idxmax()].set_index('name')
+
+
+def weighted_quantiles(df: pd.DataFrame, by: str, qs: list[float]) -> pd.DataFrame:
+    '''
+    Price quantiles per group, with each row weighted by the count of queries it summarises. Where the weight
+    splits exactly at a quantile, the prices either side are averaged, as for a median.
+
+    Returns:
+        DataFrame indexed by group, with a column of prices in cents per quantile
+    '''
+    df = df.sort_values([by, 'price_cents'])
+    weights = df.groupby(by, observed=True).weight
+    cumulative = weights.cumsum() / weights.transform('sum')
+
+    def first_price(rows: pd.Series) -> pd.Series:
+        return df.price_cents[rows].groupby(df[by][rows], observed=True).first()
+
+    def quantile(q: float) -> pd.Series:
+        lower = first_price(cumulative >= q)
+        upper = first_price(cumulative > q).reindex(lower.index).fillna(lower)
+        return (lower + upper) / 2
+
+    return pd.DataFrame({q: quantile(q) for q in qs})
+
+
+@cli.command
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+def export(path: str):
+    '''
+    Export history as Parquet
+    \b
+    PATH: Destination file
+    '''
+    write_history(history_table(load_state(logger, State)), path)
+
+
+@cli.command
+def compact():
+    '''
+    Compact history outside the retention windows now, rather than on the next run
+    '''
+    state = load_state(logger, State)
+    config = load_config(Config) or Config(products=[])
+    size = len(state.history), len(state.daily), len(state.weekly)
+
+    compact_history(state, now_aest(), config.full_resolution_days, config.daily_summary_days)
+    write_state(state)
+
+    print(f'Full resolution: {size[0]} -> {len(state.history)}')
+    print(f'Daily summaries: {size[1]} -> {len(state.daily)}')
+    print(f'Weekly summaries: {size[2]} -> {len(state.weekly)}')
 
 
 @cli.command
@@ -193,30 +516,95 @@ def stats():
     '''
     Show product stats
     '''
-    df = get_history()
+    df = get_history(['name', 'target_cents', 'price_cents', 'weight', 'ts'])
+    grouped = df.groupby('name', observed=True)
 
     # Aggregate max/min/median prices
-    price_range = df.groupby(['name']).agg({'price': ['count', 'min', 'max', 'median']})
-    price_range.columns = price_range.columns.get_level_values(1)
+    price_range = pd.concat(
+        [
+            grouped.weight.sum(),
+            grouped.price_cents.min(),
+            grouped.price_cents.max(),
+            weighted_quantiles(df, 'name', [0.5])[0.5],
+        ],
+        axis=1,
+    )
 
     # Determine earliest and most recent query dates
-    query_range = df.groupby(['name']).agg({'ts': ['min', 'max']})
-    query_range.columns = query_range.columns.get_level_values(1)
+    query_range = grouped.ts.agg(['min', 'max'])
 
-    # Pull price from most recent query
-    latest_price = df.sort_values(['ts']).groupby('name').tail(1).set_index('name').drop(columns=['id', 'ts'])
+    # Pull target & price from most recent query
+    latest = latest_queries(df)[['target_cents', 'price_cents']]
 
     # Smash into single dataframe
-    df = pd.concat([price_range, latest_price, query_range], axis=1)
-    df.columns = ['Count', 'Lowest', 'Highest', 'Median', 'Target', 'Latest', 'Latest Fetch', 'First Fetch']
+    df = pd.concat([price_range, latest, query_range], axis=1)
+    df.columns = ['Count', 'Lowest', 'Highest', 'Median', 'Target', 'Latest', 'First Fetch', 'Latest Fetch']
+
+    # Cents to dollars
+    for col in ('Lowest', 'Highest', 'Median', 'Target', 'Latest'):
+        df[col] = df[col] / 100
 
     # Date formatting
-    for col in ('Latest Fetch', 'First Fetch'):
+    for col in ('First Fetch', 'Latest Fetch'):
         df[col] = df[col].dt.strftime('%d-%m-%Y')
 
     print(df)
 
 
+@cli.command
+@click.argument('product_name')
+@click.option('--freq', default='W', help='Pandas period alias, eg. D, W or M')
+def trend(product_name: str, freq: str):
+    '''
+    Show lowest, median and highest price per period for a product
+    \b
+    PRODUCT_NAME: Product name shown in stats command
+    '''
+    df = get_history(['name', 'price_cents', 'weight', 'ts'])
+    df = df[df.name == product_name]
+
+    if df.empty:
+        raise click.ClickException(f'No history for {product_name}')
+
+    df = df.assign(period=df.ts.dt.tz_convert(TZ).dt.tz_localize(None).dt.to_period(freq).dt.start_time)
+    grouped = df.groupby('period')
+
+    periods = (
+        pd.concat(
+            [grouped.price_cents.min(), weighted_quantiles(df, 'period', [0.5])[0.5], grouped.price_cents.max()], axis=1
+        )
+        / 100
+    )
+    periods.columns = ['Lowest', 'Median', 'Highest']
+    periods.index = periods.index.strftime('%d-%m-%Y')
+
+    print(periods)
+
+
+@cli.command
+@click.option('--percentiles', '-p', 'pcts', default='10,25,50,75,90', help='Comma-separated percentiles')
+def percentiles(pcts: str):
+    '''
+    Show price percentiles per product, and the percentile rank of the latest price
+    '''
+    qs = [int(p) / 100 for p in pcts.split(',')]
+    df = get_history(['name', 'price_cents', 'weight', 'ts'])
+
+    report = weighted_quantiles(df, 'name', qs) / 100
+    report.columns = [f'P{round(q * 100)}' for q in qs]
+
+    # Where the latest price sits in each product's price history
+    latest = latest_queries(df).price_cents
+    report['Latest'] = latest / 100
+
+    below = df.weight.where(df.price_cents <= df.name.map(latest).astype('int64'), 0)
+    report['Latest Rank'] = (
+        (below.groupby(df.name, observed=True).sum() / df.groupby('name', observed=True).weight.sum()).mul(100).round()
+    )
+
+    print(report)
+
+
 @cli.command
 @click.option('--fix', is_flag=True, default=False)
 def validate(fix: bool):
@@ -230,6 +618,8 @@ def validate(fix: bool):
             print(entry.product.name, init, entry.price)
 
     if fix:
+        # Reassign history to rewrite all entries, as they were modified in-place
+        state.history = list(state.history)
         write_state(state)
 
 
@@ -244,4 +634,6 @@ def delete(product_name: str):
     state = load_state(logger, State)
 
     state.history = [entry for entry in state.history if entry.product.name != product_name]
+    state.daily = [entry for entry in state.daily if entry.product.name != product_name]
+    state.weekly = [entry for entry in state.weekly if entry.product.name != product_name]
     write_state(state)
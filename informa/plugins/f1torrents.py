@@ -1,12 +1,22 @@
+import asyncio
+import bisect
+import contextlib
+import dataclasses
 import datetime
+import functools
+import io
 import logging
 import math
 import os
 import re
 import socket
+import xml.etree.ElementTree as ET  # noqa: N817
 import xmlrpc.client
+from collections.abc import AsyncIterator, Iterable, Iterator, Sequence
 from dataclasses import dataclass, field
+from typing import Any
 from urllib.parse import urlparse
+from xml.parsers.expat import ExpatError
 
 import click
 import feedparser
@@ -21,21 +31,48 @@ from informa.lib import (
     PluginAdapter,
     StateBase,
     app,
+    http,
     mailgun,
     pretty,
 )
-from informa.lib.plugin import load_config, load_run_persist, load_state, write_state
+from informa.lib.plugin import (
+    load_config,
+    load_run_persist,
+    load_state,
+    on_config_change,
+    state_lock,
+    write_config,
+    write_state,
+)
 
 logger = PluginAdapter(logging.getLogger('informa'))
 
 
 RTORRENT_HOST = '192.168.1.104'
+RTORRENT_PORT = 5000
 TEMPLATE_NAME = 'f1torrents.tmpl'
 
 RT_PRI_HIGH = 2
 RT_PRI_NORM = 1
 RT_PRI_OFF = 0
 
+# Calls per system.multicall request
+MULTICALL_BATCH = 500
+
+# SCGI response read size, and header line limit
+SCGI_CHUNK = 64 * 1024
+SCGI_MAX_HEADER = 8 * 1024
+
+# Fields of each download and file queried from rtorrent
+DOWNLOAD_FIELDS = ('d.hash=', 'd.name=', 'd.completed_bytes=', 'd.custom1=', 'd.is_meta=')
+FILE_FIELDS = ('f.path=', 'f.size_bytes=', 'f.size_chunks=', 'f.completed_chunks=', 'f.priority=')
+
+# Nesting of the <data> element of an array in an XML-RPC response
+RESPONSE_ARRAY_DEPTH = 6
+
+# Days either side of a race start which make up a race weekend
+WEEKEND_DAYS = 2
+
 
 @dataclass
 class Download:
@@ -60,47 +97,227 @@ class Race:
     start: datetime.datetime
 
 
+@dataclass
+class TitleRule:
+    '''
+    Match torrent titles of a series with a regex
+
+    Params:
+        pattern:     Regex searched in the title, with named groups `season`, `session`, and optionally `round`,
+                     or `race` to take the race part of the key as matched
+        sessions:    Session group match to the session type in the race key, eg. "Qualifying": "qu"
+        key_prefix:  Prefix for the race keys of this series
+    '''
+
+    pattern: str
+    sessions: dict[str, str]
+    key_prefix: str = ''
+
+    @functools.cached_property
+    def regex(self) -> re.Pattern:
+        return re.compile(self.pattern)
+
+    def match(self, title: str, season: int) -> str | None:
+        'Return the race key for a title in the season, eg. 2023x04ra, or None if not matched'
+        m = self.regex.search(title)
+        if not m or int(m['season']) != season:
+            return None
+
+        session_type = self.sessions.get(m['session'])
+        if not session_type:
+            return None
+
+        groups = self.regex.groupindex
+        if 'race' in groups and m['race']:
+            race = m['race']
+        else:
+            race = m['season']
+            if 'round' in groups and m['round']:
+                race = f'{race}x{m["round"]}'
+
+        return f'{self.key_prefix}{race}{session_type}'
+
+
+# Sky F1 1080p sessions, excluding Ted's Notebook. The race is the 7 characters after "Formula.1.", as keyed
+# before title rules, so keys in existing state still match; eg. 2023x04, or 2023.Se for a season review
+DEFAULT_TITLE_RULES = (
+    TitleRule(
+        r'^Formula\.1\.(?=(?P<race>.{7}))(?P<season>\d{4})(?:x(?P<round>\d{2}))?\.'
+        r'(?=.*\.SkyF1HD\.1080p)(?!.*Teds)(?:[^.]+\.)*?'
+        r'(?P<session>Sprint\.Qualifying|Sprint\.Shootout|Sprint|Qualifying|Race|Season\.Review)\.',
+        {
+            'Sprint.Qualifying': 'sq',
+            'Sprint.Shootout': 'sq',
+            'Sprint': 'sr',
+            'Qualifying': 'qu',
+            'Race': 'ra',
+            'Season.Review': 'rv',
+        },
+    ),
+)
+
+# Patterns of the built-in rules, current and previous. Config written by earlier versions may hold a copy
+BUILTIN_TITLE_PATTERNS = frozenset({
+    r'^Formula\.1\.(?P<season>\d{4})(?:x(?P<round>\d{2}))?\.(?=.*\.SkyF1HD\.1080p)(?!.*Teds)(?:[^.]+\.)*?'
+    r'(?P<session>Sprint\.Qualifying|Sprint\.Shootout|Sprint|Qualifying|Race|Season\.Review)\.',
+    *(rule.pattern for rule in DEFAULT_TITLE_RULES),
+})
+
+
 @dataclass
 class Config(ConfigBase):
     current_season: int
     calendar: list[Race] | None = None
+    calendar_updated: datetime.datetime | None = None
+    calendar_refresh_days: int = 7
+    # Replaces DEFAULT_TITLE_RULES when set. The defaults are not stored in config, so changes to them apply
+    title_rules: list[TitleRule] = field(default_factory=list)
+
+    def __post_init__(self):
+        # Swap copies of the built-in rules written to config for the current built-in rules
+        rules: list[TitleRule] = []
+        for rule in self.title_rules or []:
+            if rule.pattern in BUILTIN_TITLE_PATTERNS:
+                rules.extend(r for r in DEFAULT_TITLE_RULES if r not in rules)
+            else:
+                rules.append(rule)
+
+        self.title_rules = [] if rules == list(DEFAULT_TITLE_RULES) else rules
+
+    @property
+    def rules(self) -> Sequence[TitleRule]:
+        'Title rules to match torrents with'
+        return self.title_rules or DEFAULT_TITLE_RULES
+
+
+class RaceWeekends:
+    '''
+    Sorted, non-overlapping race weekend windows of a calendar, for lookup by bisect
+
+    Params:
+        calendar:  Races from the plugin config
+    '''
+
+    def __init__(self, calendar: list[Race]):
+        self.starts: list[datetime.date] = []
+        self.ends: list[datetime.date] = []
+
+        margin = datetime.timedelta(days=WEEKEND_DAYS)
+
+        for race_date in sorted(r.start.date() for r in calendar):
+            start, end = race_date - margin, race_date + margin
+            # Merge windows of back-to-back races
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __contains__(self, day: datetime.date) -> bool:
+        i = bisect.bisect_right(self.starts, day) - 1
+        return i >= 0 and day <= self.ends[i]
+
+
+# Race weekends, and the config they were built from
+_weekends: tuple[Config, RaceWeekends] | None = None
+
+
+def race_weekends(config: Config) -> RaceWeekends:
+    'Return the race weekends for the config, rebuilt only when the config has been reloaded'
+    global _weekends  # noqa: PLW0603
+
+    cached = _weekends
+    if cached and cached[0] is config:
+        return cached[1]
+
+    weekends = RaceWeekends(config.calendar or [])
+    _weekends = (config, weekends)
+    return weekends
+
+
+@on_config_change(Config)
+def config_changed(config: Config | None):
+    'Rebuild the race weekends as soon as the config file is edited, rather than on the next weekend check'
+    if config:
+        race_weekends(config)
+        logger.info('Config reloaded, %d races in the calendar', len(config.calendar or []))
 
 
 @app.cond()
 def is_f1_weekend():
-    cal = fetch_f1_calendar()
-    if not cal:
+    '''
+    True during a race weekend in the configured calendar
+
+    Evaluated each scheduler cycle, so it only reads the calendar from config, which is refreshed from
+    Google Calendar by `refresh_calendar`.
+    '''
+    config = load_config(Config)
+    if not config or not config.calendar:
         return False
 
     today = datetime.datetime.now(tz=datetime.UTC).date()
 
-    for race in [Race(k, v) for k, v in cal.items()]:
-        if race.start.date() - datetime.timedelta(days=3) < today < race.start.date() + datetime.timedelta(days=3):
-            return True
+    if today in race_weekends(config):
+        return True
 
     logger.debug('Today not within F1 weekend range')
     return False
 
 
-def fetch_f1_calendar() -> dict[str, datetime.datetime] | None:
-    'Fetch current F1 calendar'
+def calendar_stale(config: Config) -> bool:
+    'True when the configured calendar is missing, or older than its refresh interval'
+    if not config.calendar or not config.calendar_updated:
+        return True
+    age = datetime.datetime.now(tz=datetime.UTC) - config.calendar_updated
+    return age > datetime.timedelta(days=config.calendar_refresh_days)
+
+
+def update_calendar(config: Config) -> Config | None:
+    '''
+    Fetch the F1 calendar and write it to config
+
+    Returns:
+        The updated config, or None if the fetch failed
+    '''
+    cal = fetch_f1_calendar(config.current_season)
+    if not cal:
+        return None
+
+    # Loaded config is shared, so write a copy
+    config = dataclasses.replace(
+        config,
+        calendar=[Race(k, v) for k, v in cal.items()],
+        calendar_updated=datetime.datetime.now(tz=datetime.UTC),
+    )
+    write_config(config)
+    return config
+
+
+@app.task('every 6 hours')
+def refresh_calendar():
+    'Refresh the F1 calendar in config, when stale'
+    config = load_config(Config)
+    if config and calendar_stale(config):
+        update_calendar(config)
+
+
+def fetch_f1_calendar(current_season: int) -> dict[str, datetime.datetime] | None:
+    'Fetch F1 calendar for a season'
     gsuite_creds = os.environ.get('GSUITE_OAUTH_CREDS')
     if not gsuite_creds:
         logger.error('No Google service account credentials')
         return None
 
     try:
-        gc = GoogleCalendar(credentials=Credentials.from_service_account_file(os.environ.get('GSUITE_OAUTH_CREDS')))
+        gc = GoogleCalendar(credentials=Credentials.from_service_account_file(gsuite_creds))
     except googleapiclient.errors.HttpError:
         logger.error('Failed to authenticate to Google Calendar API')
         return None
 
-    config = load_config(Config)
-
     try:
         events = gc.get_events(
             calendar_id='c_e615a5f4fc5d2ddb8ff9e902a50fcf0c26ffe628f149c11d13b4c51e123ce8a7@group.calendar.google.com',
-            time_min=datetime.date(config.current_season, 1, 1),
+            time_min=datetime.date(current_season, 1, 1),
             single_events=True,
             order_by='startTime',
         )
@@ -111,9 +328,9 @@ def fetch_f1_calendar() -> dict[str, datetime.datetime] | None:
         return None
 
 
-@app.task(cron('*/15 * * * *') & is_f1_weekend, name=__name__)
-def run():
-    load_run_persist(logger, State, main)
+@app.task(cron('*/15 * * * *') & is_f1_weekend, name=__name__, execution='async')
+async def run():
+    await load_run_persist(logger, State, main)
 
 
 def main(state: State, config: Config) -> int:
@@ -121,7 +338,7 @@ def main(state: State, config: Config) -> int:
     Check for new F1 torrents and add to rtorrent
     '''
     try:
-        if check_torrentgalaxy(config.current_season, state):
+        if check_torrentgalaxy(config, state):
             # if torrents found, try to add immediately
             add_magnet_to_rtorrent(state.races)
             return 1
@@ -131,49 +348,80 @@ def main(state: State, config: Config) -> int:
     return 0
 
 
-@app.task('every 5 minute')
-def set_torrent_file_priorities():
+# Hashes of F1 torrents with tag and priorities set, which are skipped by the sweep
+_settled_torrents: set[str] = set()
+
+
+@app.task('every 5 minute', execution='async')
+async def set_torrent_file_priorities():
     '''
     Set priority high on the 02.Race.Session or 02.Qualifying.Session torrent parts
+
+    Only F1 torrents which are new, or whose tag has changed, since the last sweep are examined. Once all are
+    settled, a sweep is a single request listing the downloads.
     '''
-    rt = RTorrent(RTORRENT_HOST, 5000)
+    rt = AsyncRTorrent(RTORRENT_HOST, RTORRENT_PORT)
     try:
-        torrents = rt.get_torrents()
+        downloads = [d async for d in rt.iter_downloads()]
     except RtorrentError as e:
         # No error logging to save log noise when jorg is switched off
         logger.debug(e)
         return
 
+    # Forget removed torrents
+    _settled_torrents.intersection_update(d[0] for d in downloads)
+
+    changed = [d for d in downloads if 'Formula.1.' in d[1] and (d[0] not in _settled_torrents or d[3] != 'F1')]
+    if not changed:
+        return
+
+    try:
+        torrents = await rt.get_torrents(downloads=changed)
+    except RtorrentError as e:
+        logger.debug(e)
+        return
+
+    # Batch all updates into multicall requests
+    calls: list[tuple[str, tuple]] = []
+    targets: list[str] = []
+
     for hash_id, torrent_data in torrents.items():
-        if 'Formula.1.' not in torrent_data['name']:
-            continue
+        # Set label on F1 torrents
+        if torrent_data['tag'] != 'F1':
+            calls.append(('d.custom1.set', (hash_id, 'F1')))
+            targets.append(hash_id)
+
+        for i, file_data in enumerate(torrent_data['files']):
+            if '02' in file_data['filename'] and file_data['priority'] != 'high':
+                calls.append(('f.priority.set', (f'{hash_id}:f{i}', RT_PRI_HIGH)))
+                targets.append(torrent_data['name'])
 
+    failed = set()
+
+    if calls:
         try:
-            # Set label on F1 torrents
-            rt.set_tag(hash_id, 'F1')
+            results = await rt.multicall(calls)
         except RtorrentError as e:
-            logger.error('Failed setting tag on %s (%s)', hash_id, e)
-            continue
-
-        for i, file_data in enumerate(torrent_data['files']):
-            if '02' in file_data['filename']:
-                try:
-                    pri = rt.get_file_priority(hash_id, i)
+            logger.error('Failed setting tags & priorities (%s)', e)
+            return
 
-                    if pri != RT_PRI_HIGH:
-                        rt.set_file_priority(hash_id, i, RT_PRI_HIGH)
-                        logger.debug('Set high priority on %s', torrent_data['name'])
+        for (method, params), target, result in zip(calls, targets, results, strict=True):
+            if isinstance(result, xmlrpc.client.Fault):
+                logger.error('Failed %s on %s (%s)', method, params[0], result.faultString)
+                failed.add(params[0].split(':')[0])
+            elif method == 'f.priority.set':
+                logger.debug('Set high priority on %s', target)
 
-                except RtorrentError as e:
-                    logger.error('Failed setting priority on %s:%s (%s)', hash_id, i, e)
-                    continue
+    # Files are unknown until a magnet's metadata is downloaded, so those torrents are examined again
+    _settled_torrents.update(d[0] for d in changed if not d[4] and d[0] not in failed)
 
 
 @app.task('every 15 minutes')
 def add_torrents():
-    state = load_state(logger, State)
-    if add_magnet_to_rtorrent(state.races):
-        write_state(state)
+    with state_lock():
+        state = load_state(logger, State)
+        if add_magnet_to_rtorrent(state.races):
+            write_state(state)
 
 
 def add_magnet_to_rtorrent(races: dict[str, Download]) -> bool:
@@ -185,12 +433,12 @@ def add_magnet_to_rtorrent(races: dict[str, Download]) -> bool:
     for key, race_data in races.items():
         if not race_data.added_to_rtorrent:
             try:
-                rt = RTorrent(RTORRENT_HOST, 5000)
+                rt = RTorrent(RTORRENT_HOST, RTORRENT_PORT)
                 rt.add_magnet(race_data.magnet)
             except RtorrentError as e:
                 if 'No route to host' in str(e):
                     # Wake jorg via wol-sender running on 3001
-                    requests.get('http://locke:3001/wake/d0:50:99:c1:63:c9', timeout=3)
+                    http.client().get('http://locke:3001/wake/d0:50:99:c1:63:c9', timeout=3)
                     logger.info('WOL packet sent to wake rtorrent')
                     return False
 
@@ -217,57 +465,54 @@ def add_magnet_to_rtorrent(races: dict[str, Download]) -> bool:
     return torrent_added
 
 
-def check_torrentgalaxy(current_season: int, state: State) -> bool:
+def match_title(title: str, rules: Sequence[TitleRule], season: int) -> str | None:
+    'Return the race key from the first rule matching a torrent title in the season, or None'
+    for rule in rules:
+        if key := rule.match(title, season):
+            return key
+    return None
+
+
+def check_torrentgalaxy(config: Config, state: State) -> bool:
     torrent_url = 'https://torrentgalaxy.to/rss?magnet&user=48067'
 
     try:
-        sess = requests.Session()
-        resp = sess.get(torrent_url, timeout=5)
+        resp = http.client().get_cached(torrent_url, timeout=5)
 
     except requests.RequestException as e:
         raise FailedFetchingTorrents(f'Failed loading from {torrent_url}') from e
 
+    if not resp.changed:
+        logger.debug('Torrent feed unchanged')
+        return False
+
     feed = feedparser.parse(resp.text)
 
     ret = False
 
-    RACE_TYPES = {'Race', 'Qualifying', 'Sprint', 'Season.Review', 'Shootout'}
-
     for entry in feed['entries']:
         title = entry['title']
 
-        if 'Formula.1' in title and str(current_season) in title and 'SkyF1HD.1080p' in title:
-            if not any(s in title for s in RACE_TYPES) or 'Teds' in title:
-                logger.debug('Skipped: %s', title)
-                continue
-
-            try:
-                # Find magnet link
-                magnet = entry['links'][0]['href']
-                if not magnet:
-                    raise ValueError
-            except (ValueError, KeyError, IndexError):
-                logger.error('Failed extracting magnet: %s', entry.get('links', 'No key "links" on entry obj!'))
-                continue
-
-            # Race / Qualifying / Sprint etc
-            if 'Sprint' in title:
-                session_type = 'sq' if 'Qualifying' in title else 'sr'
-            elif 'Qualifying' in title:
-                session_type = 'qu'
-            elif 'Race' in title:
-                session_type = 'ra'
-            else:
-                session_type = 'rv'
+        # Create a different key for each session type (eg. 2023x04ra)
+        key = match_title(title, config.rules, config.current_season)
+        if not key:
+            logger.debug('Skipped: %s', title)
+            continue
 
-            logger.debug('Found: %s (%s)', title, session_type)
+        try:
+            # Find magnet link
+            magnet = entry['links'][0]['href']
+            if not magnet:
+                raise ValueError
+        except (ValueError, KeyError, IndexError):
+            logger.error('Failed extracting magnet: %s', entry.get('links', 'No key "links" on entry obj!'))
+            continue
 
-            # Create a different key for each session type (eg. 2023x04ra)
-            key = f'{title[10:17]}{session_type}'
+        logger.debug('Found: %s (%s)', title, key)
 
-            if key not in state.races:
-                state.races[key] = Download(key=key, title=title, magnet=magnet)
-                ret = True
+        if key not in state.races:
+            state.races[key] = Download(key=key, title=title, magnet=magnet)
+            ret = True
 
     return ret
 
@@ -276,49 +521,238 @@ class RtorrentError(Exception):
     pass
 
 
+@functools.lru_cache
+def resolve(host: str) -> tuple:
+    '''
+    Resolve an rtorrent host:port once, rather than per request
+
+    SCGI allows one request per connection, so each request still needs a new socket.
+    '''
+    host, port = host.split(':')
+    return socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)[0]
+
+
+def scgi_request(request_body: bytes) -> bytes:
+    'Wrap an XML-RPC request in an SCGI request'
+    header = b'CONTENT_LENGTH\x00%d\x00SCGI\x001\x00' % len(request_body)
+    return b'%d:%s,%s' % (len(header), header, request_body)
+
+
+def scgi_content_length(line: bytes) -> int | None:
+    'Return the Content-Length from an SCGI response header line, or None for any other header'
+    name, _, value = line.partition(b':')
+    if name.strip().lower() == b'content-length':
+        return int(value)
+    return None
+
+
 class SCGITransport(xmlrpc.client.Transport):
     def single_request(self, host, handler, request_body, verbose=0):  # noqa: ARG002
-        # Create SCGI header
-        header = f'CONTENT_LENGTH\x00{len(request_body)}\x00SCGI\x001\x00'
-        request_body = f'{len(header)}:{header},{request_body}'
+        p, u = self.getparser()
+
+        try:
+            # Feed the XML parser as the response arrives
+            for chunk in self.stream_request(host, handler, request_body):
+                p.feed(chunk)
+            p.close()
+        except ExpatError as e:
+            raise RtorrentError('Failed parsing SCGI response!') from e
+
+        return u.close()
+
+    def stream_request(self, host: str, handler: str, request_body: str | bytes) -> Iterator[bytes]:
+        '''
+        Send an XML-RPC request over SCGI, and yield the response body in chunks as it is received
+
+        Params:
+            host:          rtorrent host:port, or empty for a unix socket
+            handler:       Unix socket path, when no host
+            request_body:  XML-RPC request
+        '''
+        if isinstance(request_body, str):
+            request_body = request_body.encode('utf8')
+
         sock = None
 
         try:
             if host:
-                host, port = host.split(':')
-                addrinfo = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
-                sock = socket.socket(*addrinfo[0][:3])
-                sock.connect(addrinfo[0][4])
+                addrinfo = resolve(host)
+                sock = socket.socket(*addrinfo[:3])
+                sock.connect(addrinfo[4])
             else:
                 sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
                 sock.connect(handler)
 
-            sock.send(request_body.encode('ascii'))
-            return self.parse_response(sock.makefile())
+            sock.sendall(scgi_request(request_body))
+
+            with sock.makefile('rb') as response:
+                yield from self.read_response(response)
 
         finally:
             if sock:
                 sock.close()
 
-    def parse_response(self, response):
-        p, u = self.getparser()
+    def read_response(self, response: io.BufferedIOBase) -> Iterator[bytes]:
+        '''
+        Skip the SCGI response headers, and yield the body in chunks, up to the Content-Length when sent
+        '''
+        content_length = None
 
-        response_body = ''
         while True:
-            data = response.read(1024)
+            line = response.readline(SCGI_MAX_HEADER)
+            if not line:
+                raise RtorrentError('Failed parsing SCGI response!')
+            if not line.strip():
+                break
+
+            # Content-Length: 0 is an empty body, not a missing length
+            if (length := scgi_content_length(line)) is not None:
+                content_length = length
+
+        remaining = content_length
+        while remaining is None or remaining > 0:
+            data = response.read1(SCGI_CHUNK if remaining is None else min(SCGI_CHUNK, remaining))
             if not data:
                 break
-            response_body += data
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+
+
+def unmarshal(value: ET.Element) -> Any:
+    'Convert a parsed XML-RPC <value> element'
+    if len(value) == 0:
+        return value.text or ''
+
+    typed = value[0]
+
+    if typed.tag in {'i4', 'i8', 'int'}:
+        return int(typed.text or 0)
+    if typed.tag == 'string':
+        return typed.text or ''
+    if typed.tag == 'boolean':
+        return typed.text == '1'
+    if typed.tag == 'double':
+        return float(typed.text or 0)
+    if typed.tag == 'array':
+        return [unmarshal(v) for v in typed.iterfind('data/value')]
+    if typed.tag == 'struct':
+        return {m.findtext('name'): unmarshal(m.find('value')) for m in typed.iterfind('member')}  # type: ignore[arg-type]
+    if typed.tag == 'nil':
+        return None
+    return typed.text
 
-        try:
-            # Remove SCGI headers from the response
-            _, response_body = re.split(r'\n\s*?\n', response_body, maxsplit=1)
-            p.feed(response_body)
-            p.close()
-            return u.close()
 
-        except ValueError as e:
-            raise RtorrentError('Failed parsing SCGI response!') from e
+class ArrayResponseParser:
+    '''
+    Incremental parser of an XML-RPC response which returns an array, returning items as soon as they are parsed
+
+    Parsed items are discarded, so memory use is independent of the length of the array.
+    '''
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(('start', 'end'))
+        self._array_data: ET.Element | None = None
+        self._depth = 0
+
+    def feed(self, chunk: bytes) -> list:
+        '''
+        Parse part of the response
+
+        Returns:
+            Array items completed by this chunk
+        Raises:
+            xmlrpc.client.Fault:  The response is a fault
+        '''
+        self._parser.feed(chunk)
+        return self._read_items()
+
+    def close(self) -> list:
+        'Finish parsing the response, returning any remaining items'
+        self._parser.close()
+        return self._read_items()
+
+    def _read_items(self) -> list:
+        items = []
+
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                self._depth += 1
+                # <methodResponse><params><param><value><array><data>
+                if elem.tag == 'data' and self._depth == RESPONSE_ARRAY_DEPTH:
+                    self._array_data = elem
+                continue
+
+            self._depth -= 1
+
+            if self._array_data is not None and elem.tag == 'value' and self._depth == RESPONSE_ARRAY_DEPTH:
+                items.append(unmarshal(elem))
+                self._array_data.remove(elem)
+
+            elif elem.tag == 'fault':
+                fault = unmarshal(elem[0])
+                raise xmlrpc.client.Fault(fault['faultCode'], fault['faultString'])
+
+        return items
+
+
+def iter_response_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    '''
+    Parse an XML-RPC response which returns an array, yielding each item as soon as it is parsed
+
+    Params:
+        chunks:  Response body
+    Raises:
+        xmlrpc.client.Fault:  The response is a fault
+    '''
+    parser = ArrayResponseParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def multicall_batches(calls: list[tuple[str, tuple]]) -> Iterator[list[dict]]:
+    'Split calls into system.multicall requests of MULTICALL_BATCH calls'
+    for i in range(0, len(calls), MULTICALL_BATCH):
+        yield [{'methodName': method, 'params': list(params)} for method, params in calls[i : i + MULTICALL_BATCH]]
+
+
+def multicall_results(responses: list) -> list:
+    'Unpack system.multicall results, where each is a single-item list, or a fault struct'
+    return [xmlrpc.client.Fault(r['faultCode'], r['faultString']) if isinstance(r, dict) else r[0] for r in responses]
+
+
+def describe_download(download: list, files: list) -> dict:
+    '''
+    Describe a download and its files, for display
+
+    Params:
+        download:  Fields of the download from d.multicall2
+        files:     Fields of each file from f.multicall
+    '''
+    try:
+        # torrent total progress based on each file's progress, ignoring 'skipped' files
+        torrent_progress = sum(f[3] for f in files if f[4] > 0) / sum(f[2] for f in files if f[4] > 0) * 100
+    except ZeroDivisionError:
+        # all files are 'skip'
+        torrent_progress = 0
+
+    return {
+        'name': download[1],
+        'size': format_size(download[2]),
+        'tag': download[3],
+        'files': [
+            {
+                'filename': f[0],
+                'size': format_size(f[1]),
+                'progress': f'{float(f[3]) / float(f[2]) * 100:.1f}%' if f[2] else 0,
+                'priority': 'skip' if f[4] == RT_PRI_OFF else 'high' if f[4] == RT_PRI_HIGH else 'normal',
+            }
+            for f in files
+        ],
+        'progress': f'{torrent_progress:.1f}%',
+        'complete': torrent_progress == 100,  # noqa: PLR2004
+    }
 
 
 class SCGIServerProxy(xmlrpc.client.ServerProxy):
@@ -373,73 +807,76 @@ class SCGIServerProxy(xmlrpc.client.ServerProxy):
 
 class RTorrent:
     def __init__(self, host, port):
-        self.server = SCGIServerProxy(f'scgi://{host}:{port}/')
+        self.host = f'{host}:{port}'
+        self.server = SCGIServerProxy(f'scgi://{self.host}/')
+        self.transport = self.server('transport')
+
+    def iter_downloads(self, tag_filter=None) -> Iterator[list]:
+        '''
+        Stream the hash, name, completed bytes, tag and metadata-pending flag of each download, as the response
+        is received
+
+        Params:
+            tag_filter (str):  Only downloads with this tag
+        '''
+        request = xmlrpc.client.dumps(('', 'main', *DOWNLOAD_FIELDS), 'd.multicall2')  # empty target
 
-    def get_torrents(self, tag_filter=None):
         try:
-            downloads = self.server.d.multicall2(
-                '',  # empty target
-                'main',
-                'd.hash=',
-                'd.name=',
-                'd.completed_bytes=',
-                'd.custom1=',
-            )
-            if downloads is None:
-                raise RtorrentError('get_torrents: Failed to load from rtorrent SCGI')
+            for d in iter_response_array(self.transport.stream_request(self.host, '/', request)):
+                if not tag_filter or d[3] == tag_filter:
+                    yield d
 
         except ConnectionRefusedError as e:
             raise RtorrentError('get_torrents: Rtorrent is down') from e
-        except (OSError, xmlrpc.client.Fault) as e:
+        except (OSError, ET.ParseError, xmlrpc.client.Fault) as e:
             raise RtorrentError(f'get_torrents: Failed to load from rtorrent SCGI: {e}') from e
 
+    def get_torrents(self, tag_filter=None, downloads=None):
+        '''
+        Describe downloads and their files
+
+        Params:
+            tag_filter (str):   Only downloads with this tag
+            downloads (list):   Downloads from iter_downloads, rather than querying all
+        '''
+        if downloads is None:
+            downloads = list(self.iter_downloads(tag_filter))
+
+        # Query the files of all downloads in one batch
+        download_files = self.multicall([('f.multicall', (d[0], '', *FILE_FIELDS)) for d in downloads])
+
         data = {}
 
-        for d in downloads:
-            if not tag_filter or (tag_filter and d[4] == tag_filter):
-                # calculate % done
-                data[d[0]] = {
-                    'name': d[1],
-                    'size': format_size(d[2]),
-                    'tag': d[3],
-                    'files': [],
-                }
-
-                try:
-                    files = self.server.f.multicall(
-                        d[0],
-                        '',
-                        'f.path=',
-                        'f.size_bytes=',
-                        'f.size_chunks=',
-                        'f.completed_chunks=',
-                        'f.priority=',
-                    )
-                except ConnectionRefusedError as e:
-                    raise RtorrentError('get_torrents: Rtorrent is down') from e
-                except (OSError, xmlrpc.client.Fault) as e:
-                    raise RtorrentError(f'get_torrents: Failed to load d.files from rtorrent SCGI: {e}') from e
-
-                for f in files:
-                    data[d[0]]['files'].append({
-                        'filename': f[0],
-                        'size': format_size(f[1]),
-                        'progress': f'{float(f[3]) / float(f[2]) * 100:.1f}%' if f[2] else 0,
-                        'priority': 'skip' if f[4] == RT_PRI_OFF else 'high' if f[4] == RT_PRI_HIGH else 'normal',
-                    })
-
-                try:
-                    # torrent total progress based on each file's progress, ignoring 'skipped' files
-                    torrent_progress = sum(f[3] for f in files if f[4] > 0) / sum(f[2] for f in files if f[4] > 0) * 100
-                except ZeroDivisionError:
-                    # all files are 'skip'
-                    torrent_progress = 0
-
-                data[d[0]]['progress'] = f'{torrent_progress:.1f}%'
-                data[d[0]]['complete'] = torrent_progress == 100  # noqa: PLR2004
+        for d, files in zip(downloads, download_files, strict=True):
+            if isinstance(files, xmlrpc.client.Fault):
+                raise RtorrentError(f'get_torrents: Failed to load d.files from rtorrent SCGI: {files.faultString}')
+
+            data[d[0]] = describe_download(d, files)
 
         return data
 
+    def multicall(self, calls: list[tuple[str, tuple]]) -> list:
+        '''
+        Make many calls in batched system.multicall requests, rather than a round-trip per call
+
+        Params:
+            calls:  Method name and params of each call
+        Returns:
+            Result of each call in order, or an xmlrpc.client.Fault for a call which failed
+        '''
+        results: list = []
+
+        for batch in multicall_batches(calls):
+            try:
+                results.extend(multicall_results(self.server.system.multicall(batch)))
+
+            except ConnectionRefusedError as e:
+                raise RtorrentError('multicall: Rtorrent is down') from e
+            except (OSError, xmlrpc.client.Fault) as e:
+                raise RtorrentError(f'multicall: Failed calling rtorrent SCGI: {e}') from e
+
+        return results
+
     def add_magnet(self, magnet_url):
         '''
         Add a magnet URL
@@ -507,6 +944,156 @@ class RTorrent:
             raise RtorrentError(f'get_file_priority: Failed to load from rtorrent SCGI: {e}') from e
 
 
+class AsyncRTorrent:
+    '''
+    asyncio rtorrent client, making XML-RPC calls over SCGI
+
+    SCGI serves one request per connection, so connections are limited rather than reused; many calls should be
+    batched with `multicall`.
+
+    Params:
+        host:             rtorrent host
+        port:             rtorrent SCGI port
+        timeout:          Seconds to wait when connecting, and for each read of a response
+        max_connections:  Maximum concurrent requests to rtorrent
+    '''
+
+    def __init__(self, host: str, port: int, timeout: float = 10, max_connections: int = 4):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._connections = asyncio.Semaphore(max_connections)
+
+    async def _stream(self, method: str, params: tuple) -> AsyncIterator[bytes]:
+        '''
+        Make an XML-RPC call, and yield the response body in chunks as it is received
+        '''
+        request = scgi_request(xmlrpc.client.dumps(params, method).encode('utf8'))
+
+        async with self._connections:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            except ConnectionRefusedError as e:
+                raise RtorrentError(f'{method}: Rtorrent is down') from e
+            except OSError as e:
+                raise RtorrentError(f'{method}: Failed connecting to rtorrent SCGI: {e}') from e
+
+            try:
+                writer.write(request)
+                await asyncio.wait_for(writer.drain(), self.timeout)
+
+                content_length = None
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), self.timeout)
+                    if not line:
+                        raise RtorrentError(f'{method}: Failed parsing SCGI response!')
+                    if not line.strip():
+                        break
+                    # Content-Length: 0 is an empty body, not a missing length
+                    if (length := scgi_content_length(line)) is not None:
+                        content_length = length
+
+                remaining = content_length
+                while remaining is None or remaining > 0:
+                    size = SCGI_CHUNK if remaining is None else min(SCGI_CHUNK, remaining)
+                    data = await asyncio.wait_for(reader.read(size), self.timeout)
+                    if not data:
+                        break
+                    if remaining is not None:
+                        remaining -= len(data)
+                    yield data
+
+            except OSError as e:
+                raise RtorrentError(f'{method}: Failed calling rtorrent SCGI: {e}') from e
+
+            finally:
+                writer.close()
+                # The connection is finished with, so a failure while closing is not an error
+                with contextlib.suppress(OSError):
+                    await writer.wait_closed()
+
+    async def call(self, method: str, *params) -> Any:
+        '''
+        Make an XML-RPC call to rtorrent
+
+        Raises:
+            RtorrentError:  Connecting failed, or the call returned a fault
+        '''
+        p, u = xmlrpc.client.getparser()
+
+        try:
+            async for chunk in self._stream(method, params):
+                p.feed(chunk)
+            p.close()
+            return u.close()[0]
+
+        except ExpatError as e:
+            raise RtorrentError(f'{method}: Failed parsing SCGI response!') from e
+        except xmlrpc.client.Fault as e:
+            raise RtorrentError(f'{method}: {e.faultString}') from e
+
+    async def multicall(self, calls: list[tuple[str, tuple]]) -> list:
+        '''
+        Make many calls in batched system.multicall requests, rather than a round-trip per call
+
+        Params:
+            calls:  Method name and params of each call
+        Returns:
+            Result of each call in order, or an xmlrpc.client.Fault for a call which failed
+        '''
+        results: list = []
+        for batch in multicall_batches(calls):
+            results.extend(multicall_results(await self.call('system.multicall', batch)))
+        return results
+
+    async def iter_downloads(self, tag_filter: str | None = None) -> AsyncIterator[list]:
+        '''
+        Stream the hash, name, completed bytes, tag and metadata-pending flag of each download, as the response
+        is received
+
+        Params:
+            tag_filter:  Only downloads with this tag
+        '''
+        parser = ArrayResponseParser()
+
+        try:
+            async for chunk in self._stream('d.multicall2', ('', 'main', *DOWNLOAD_FIELDS)):
+                for d in parser.feed(chunk):
+                    if not tag_filter or d[3] == tag_filter:
+                        yield d
+
+            for d in parser.close():
+                if not tag_filter or d[3] == tag_filter:
+                    yield d
+
+        except (ET.ParseError, xmlrpc.client.Fault) as e:
+            raise RtorrentError(f'd.multicall2: Failed to load from rtorrent SCGI: {e}') from e
+
+    async def get_torrents(self, tag_filter: str | None = None, downloads: list | None = None) -> dict[str, dict]:
+        '''
+        Describe downloads and their files
+
+        Params:
+            tag_filter:  Only downloads with this tag
+            downloads:   Downloads from iter_downloads, rather than querying all
+        '''
+        if downloads is None:
+            downloads = [d async for d in self.iter_downloads(tag_filter)]
+
+        # Query the files of all downloads in one batch
+        download_files = await self.multicall([('f.multicall', (d[0], '', *FILE_FIELDS)) for d in downloads])
+
+        data = {}
+
+        for d, files in zip(downloads, download_files, strict=True):
+            if isinstance(files, xmlrpc.client.Fault):
+                raise RtorrentError(f'f.multicall: Failed to load d.files from rtorrent SCGI: {files.faultString}')
+
+            data[d[0]] = describe_download(d, files)
+
+        return data
+
+
 def format_size(size):
     if size <= 0:
         return '0B'
@@ -534,7 +1121,7 @@ def found():
 @cli.command
 def get_torrents():
     'Load the current torrents from rtorrent'
-    rt = RTorrent(RTORRENT_HOST, 5000)
+    rt = RTorrent(RTORRENT_HOST, RTORRENT_PORT)
     try:
         torrents = rt.get_torrents()
         pretty.table([t for t in torrents.values() if 'Formula.1' in t['name']], columns=('progress', 'name'))
@@ -545,10 +1132,15 @@ def get_torrents():
 @cli.command
 def calendar():
     'Fetch F1 calendar for the current configured year, and write to config'
-    cal = fetch_f1_calendar()
-    if not cal:
-        return False
+    config = load_config(Config)
+    if not config:
+        logger.error('No config for %s', __name__)
+        return
+
+    config = update_calendar(config)
+    if not config or not config.calendar:
+        return
 
-    for r in [Race(k, v) for k, v in cal.items()]:
+    for r in config.calendar:
         print(f'{r.title}')
         print(f'   {r.start}')
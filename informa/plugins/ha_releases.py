@@ -1,11 +1,10 @@
 import logging
 from dataclasses import dataclass
 
-import bs4
 import click
 import requests
 
-from informa.lib import PluginAdapter, StateBase, app, mailgun
+from informa.lib import PluginAdapter, StateBase, app, http, mailgun, scrape
 from informa.lib.plugin import load_run_persist, load_state
 
 logger = PluginAdapter(logging.getLogger('informa'))
@@ -26,9 +25,9 @@ class State(StateBase):
     last_release_seen: str | None = None
 
 
-@app.task('every 24 hours', name=__name__)
-def run():
-    load_run_persist(logger, State, main)
+@app.task('every 24 hours', name=__name__, execution='async')
+async def run():
+    await load_run_persist(logger, State, main)
 
 
 def main(state: State) -> int:
@@ -44,16 +43,20 @@ def fetch_ha_releases(last_release_seen: str | None) -> NewVersion | None:
     'Fetch the HA release notes and parse the HTML'
     try:
         # Fetch release notes page
-        resp = requests.get('https://www.home-assistant.io/blog/categories/release-notes/', timeout=5)
+        resp = http.client().get_cached('https://www.home-assistant.io/blog/categories/release-notes/', timeout=5)
     except requests.RequestException as e:
         logger.error('Failed loading HA release notes: %s', e)
         return None
 
-    soup = bs4.BeautifulSoup(resp.text, 'html.parser')
+    if not resp.changed:
+        logger.debug('Release notes unchanged')
+        return None
+
+    page = scrape.parse(resp.text)
 
     try:
         # Extract latest version
-        version = soup.select('.release-date')[0].text.strip()
+        version = scrape.text(scrape.select(page, '.release-date')[0])
     except:  # noqa: E722 bare-except
         logger.error('New HA version parse failed!')
         mailgun.send(logger, 'New HA version parse failed!')
@@ -63,12 +66,12 @@ def fetch_ha_releases(last_release_seen: str | None) -> NewVersion | None:
 
     if version != last_release_seen:
         # Extract the release notes URL
-        for article in soup.find_all('article'):
-            for link in article.find_all('a', href=True):
-                title = link.find('div', class_='title')
+        for article in scrape.select(page, 'article'):
+            for link in scrape.select(article, 'a'):
+                title = scrape.select_one(link, 'div.title')
 
-                if title and version[0:-2] in title.text:
-                    return NewVersion(version, link['href'], title.text.strip())
+                if link.get('href') and title is not None and version[0:-2] in title.text_content():
+                    return NewVersion(version, link.get('href'), scrape.text(title))
 
     return None
 
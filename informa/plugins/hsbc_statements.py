@@ -23,9 +23,9 @@ class State(StateBase):
     pass
 
 
-@app.task('every 24 hours', name=__name__)
-def run():
-    load_run_persist(logger, State, main)
+@app.task('every 24 hours', name=__name__, execution='async')
+async def run():
+    await load_run_persist(logger, State, main)
 
 
 def main(_) -> int:
@@ -2,7 +2,7 @@ import logging
 import os
 import socket
 import warnings
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import List
 
 import click
@@ -14,18 +14,19 @@ import yaml
 
 from informa.lib import PluginAdapter, StateBase, app
 from informa.lib.plugin import load_run_persist, load_state
+from informa.lib.store import append_only
 
 logger = PluginAdapter(logging.getLogger('informa'))
 
 
 @dataclass
 class State(StateBase):
-    completed: List[str] = field(default_factory=list)
+    completed: List[str] = append_only()
 
 
-@app.task('every 1 hours', name=__name__)
-def run():
-    load_run_persist(logger, State, main)
+@app.task('every 1 hours', name=__name__, execution='async')
+async def run():
+    await load_run_persist(logger, State, main)
 
 
 def main(state: State) -> int:
@@ -1,11 +1,12 @@
+import asyncio
 import logging
 from dataclasses import dataclass, field
 
-import bs4
 import click
-import requests
+import httpx
 
-from informa.lib import PluginAdapter, StateBase, app, mailgun
+from informa.lib import PluginAdapter, StateBase, app, mailgun, scrape
+from informa.lib.http import async_client
 from informa.lib.plugin import load_run_persist, load_state
 
 logger = PluginAdapter(logging.getLogger('informa'))
@@ -24,37 +25,42 @@ class NewRelease:
     price: str
 
 
-@app.task('every 12 hours', name=__name__)
-def run():
-    load_run_persist(logger, State, main)
+@app.task('every 12 hours', name=__name__, execution='async')
+async def run():
+    await load_run_persist(logger, State, main)
 
 
-def main(state: State) -> int:
-    if nr := query_cellar_releases(state.products_seen):
-        notify(nr)
+async def main(state: State) -> int:
+    if nr := await query_cellar_releases(state.products_seen):
+        # Mailgun is a blocking client
+        await asyncio.to_thread(notify, nr)
 
     return len(state.products_seen)
 
 
-def query_cellar_releases(products_seen: set[str]) -> NewRelease | None:
+async def query_cellar_releases(products_seen: set[str]) -> NewRelease | None:
     try:
-        resp = requests.get('https://www.tahbilk.com.au/cellar-release', timeout=5)
-    except requests.RequestException as e:
+        resp = await async_client().get_cached('https://www.tahbilk.com.au/cellar-release', timeout=5)
+    except httpx.HTTPError as e:
         logger.error('Failed loading Tahbilk website: %s', e)
         return None
 
-    soup = bs4.BeautifulSoup(resp.text, 'html.parser')
+    if not resp.changed:
+        logger.debug('Cellar release page unchanged')
+        return None
+
+    page = scrape.parse(resp.text)
 
     # Iterate all products
-    for product_info in soup.select('div.product-info'):
-        title = product_info.select('h4')[0].text
+    for product_info in scrape.select(page, 'div.product-info'):
+        title = scrape.select(product_info, 'h4')[0].text_content()
 
         # Track all seen products, so they're notified only once
         products_seen.add(title)
 
         # Alert on anything not already seen
         if title not in products_seen:
-            price = product_info.select('.old-price')[0].text
+            price = scrape.select(product_info, '.old-price')[0].text_content()
             logger.info('Found %s at %s', title, price)
             return NewRelease(title, price)
 
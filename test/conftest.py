@@ -1,3 +1,9 @@
+import socketserver
+import struct
+import threading
+import xmlrpc.client
+from urllib.parse import parse_qs, urlparse
+
 import pytest
 
 
@@ -8,3 +14,206 @@ def http_response():
             return f.read()
 
     return _http_response
+
+
+class FakeMqttBroker(socketserver.ThreadingTCPServer):
+    '''
+    Minimal MQTT 3.1.1 broker stand-in, recording PUBLISH messages
+
+    Handles CONNECT, PUBLISH (QoS 0 & 1), PINGREQ and DISCONNECT.
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0):
+        self.messages: list[tuple[str, bytes, bool]] = []
+        self.received = threading.Event()
+        super().__init__(('127.0.0.1', port), FakeMqttHandler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+
+class FakeMqttHandler(socketserver.StreamRequestHandler):
+    def read_packet(self) -> tuple[int, bytes] | None:
+        header = self.rfile.read(1)
+        if not header:
+            return None
+
+        # Variable length encoding of remaining length
+        length, shift = 0, 0
+        while True:
+            byte = self.rfile.read(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+
+        return header[0], self.rfile.read(length)
+
+    def handle(self):
+        while packet := self.read_packet():
+            header, body = packet
+            packet_type = header >> 4
+
+            if packet_type == 1:  # CONNECT
+                self.wfile.write(b'\x20\x02\x00\x00')
+            elif packet_type == 3:  # PUBLISH
+                qos, retain = (header >> 1) & 3, bool(header & 1)
+                topic_len = struct.unpack('!H', body[:2])[0]
+                topic = body[2 : 2 + topic_len].decode()
+                offset = 2 + topic_len
+                if qos:
+                    self.wfile.write(b'\x40\x02' + body[offset : offset + 2])
+                    offset += 2
+                self.server.messages.append((topic, body[offset:], retain))
+                self.server.received.set()
+            elif packet_type == 12:  # PINGREQ
+                self.wfile.write(b'\xd0\x00')
+            elif packet_type == 14:  # DISCONNECT
+                return
+
+
+@pytest.fixture
+def start_mqtt_broker():
+    'Start a FakeMqttBroker, optionally on a given port'
+    brokers = []
+
+    def _start(port: int = 0) -> FakeMqttBroker:
+        broker = FakeMqttBroker(port)
+        threading.Thread(target=broker.serve_forever, daemon=True).start()
+        brokers.append(broker)
+        return broker
+
+    yield _start
+
+    for broker in brokers:
+        broker.shutdown()
+        broker.server_close()
+
+
+@pytest.fixture
+def mqtt_broker(start_mqtt_broker):
+    return start_mqtt_broker()
+
+
+class FakeRtorrent(socketserver.ThreadingTCPServer):
+    '''
+    Minimal rtorrent SCGI XML-RPC stand-in, with torrents held in `torrents`
+
+    Handles the commands used by f1torrents: d.multicall2, f.multicall, d.custom1.set, f.priority, f.priority.set,
+    load.start, load.start_verbose and system.multicall. The name of each method called is recorded in `calls`.
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    DOWNLOAD_FIELDS = {  # noqa: RUF012
+        'd.hash=': lambda h, _: h,
+        'd.name=': lambda _, t: t['name'],
+        'd.completed_bytes=': lambda _, t: sum(f[3] for f in t['files']) * 1024,
+        'd.custom1=': lambda _, t: t['tag'],
+        'd.is_meta=': lambda _, t: int(t['meta']),
+    }
+    FILE_FIELDS = {'f.path=': 0, 'f.size_bytes=': 1, 'f.size_chunks=': 2, 'f.completed_chunks=': 3, 'f.priority=': 4}  # noqa: RUF012
+
+    def __init__(self):
+        # Hash to name, tag, metadata-pending flag, and each file's path, size, chunks, completed chunks & priority
+        self.torrents: dict[str, dict] = {}
+        # Files of torrents added from a magnet
+        self.magnet_files = ['01.Pre-Race.Buildup.mkv', '02.Race.Session.mkv', '03.Post-Race.Analysis.mkv']
+        self.calls: list[str] = []
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), FakeRtorrentHandler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def add_torrent(self, hash_id: str, name: str, files: list[str], tag: str = '', meta: bool = False):
+        self.torrents[hash_id] = {
+            'name': name,
+            'tag': tag,
+            'meta': meta,
+            'files': [[path, 1024, 1, 0, 1] for path in files],
+        }
+
+    def dispatch(self, method: str, params: tuple):  # noqa: PLR0911
+        if method == 'system.multicall':
+            results: list = []
+            for call in params[0]:
+                try:
+                    results.append([self.dispatch(call['methodName'], tuple(call['params']))])
+                except xmlrpc.client.Fault as e:
+                    results.append({'faultCode': e.faultCode, 'faultString': e.faultString})
+            return results
+
+        if method == 'd.multicall2':
+            return [[self.DOWNLOAD_FIELDS[f](h, t) for f in params[2:]] for h, t in self.torrents.items()]
+
+        if method == 'f.multicall':
+            return [[f[self.FILE_FIELDS[field]] for field in params[2:]] for f in self._torrent(params[0])['files']]
+
+        if method == 'd.custom1.set':
+            self._torrent(params[0])['tag'] = params[1]
+            return 0
+
+        if method in {'f.priority', 'f.priority.set'}:
+            hash_id, _, index = params[0].partition(':f')
+            try:
+                file = self._torrent(hash_id)['files'][int(index)]
+            except (IndexError, ValueError):
+                raise xmlrpc.client.Fault(-501, 'Unsupported target type found') from None
+            if method == 'f.priority':
+                return file[4]
+            file[4] = params[1]
+            return 0
+
+        if method in {'load.start', 'load.start_verbose'}:
+            query = parse_qs(urlparse(params[1]).query)
+            hash_id = query['xt'][0].rsplit(':', 1)[1].upper()
+            self.add_torrent(hash_id, query.get('dn', [hash_id])[0], self.magnet_files)
+            return 0
+
+        raise xmlrpc.client.Fault(-506, f"Method '{method}' not defined")
+
+    def _torrent(self, hash_id: str) -> dict:
+        try:
+            return self.torrents[hash_id]
+        except KeyError:
+            raise xmlrpc.client.Fault(-501, 'Could not find info-hash.') from None
+
+
+class FakeRtorrentHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # Netstring of SCGI headers, followed by the request body
+        length = b''
+        while (byte := self.rfile.read(1)) != b':':
+            length += byte
+        headers = self.rfile.read(int(length)).split(b'\x00')
+        self.rfile.read(1)
+
+        params, method = xmlrpc.client.loads(self.rfile.read(int(headers[1])))
+
+        with self.server.lock:
+            self.server.calls.append(method)
+            try:
+                response = xmlrpc.client.dumps((self.server.dispatch(method, params),), methodresponse=True)
+            except xmlrpc.client.Fault as e:
+                response = xmlrpc.client.dumps(e, methodresponse=True)
+
+        body = response.encode()
+        self.wfile.write(b'Status: 200 OK\r\nContent-Type: text/xml\r\nContent-Length: %d\r\n\r\n' % len(body))
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def fake_rtorrent():
+    'Start a FakeRtorrent SCGI server'
+    server = FakeRtorrent()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
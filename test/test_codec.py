@@ -0,0 +1,69 @@
+import datetime
+import decimal
+from dataclasses import dataclass
+
+import orjson
+
+from informa.lib.codec import decode, encode
+from informa.plugins.dans import History, Product, State
+from informa.plugins.f1torrents import Download
+from informa.plugins.f1torrents import State as F1State
+
+
+def make_state() -> State:
+    product = Product('123', 'Wine', 20)
+    return State(
+        last_run=datetime.datetime(2024, 8, 1, 9, 30, tzinfo=datetime.UTC),
+        last_count=1,
+        history=[
+            History(
+                product, decimal.Decimal('19.99'), datetime.datetime(2024, 8, 1, tzinfo=datetime.UTC), alerted=True
+            ),
+            History(product, decimal.Decimal('24.50'), datetime.datetime(2024, 8, 2, tzinfo=datetime.UTC)),
+        ],
+    )
+
+
+def test_codec_roundtrip():
+    '''
+    Ensure decode is the inverse of encode, for nested dataclasses with Decimal & datetime
+    '''
+    state = make_state()
+
+    assert decode(State, orjson.loads(encode(state))) == state
+
+
+def test_codec_matches_from_dict():
+    '''
+    Ensure decode produces the same result as dataclasses_json from_dict
+    '''
+    data = orjson.loads(encode(make_state()))
+
+    assert decode(State, data) == State.from_dict(data)
+
+
+def test_codec_decodes_dict_values_and_defaults():
+    '''
+    Ensure dict values are decoded, and missing fields take their defaults
+    '''
+    state = decode(F1State, {'races': {'2024x01ra': {'key': '2024x01ra', 'title': 'Race', 'magnet': 'magnet:?'}}})
+
+    assert state.races == {'2024x01ra': Download('2024x01ra', 'Race', 'magnet:?')}
+    assert state.last_run is None
+
+
+@dataclass
+class Window:
+    span: tuple[datetime.date, decimal.Decimal | None]
+    dates: tuple[datetime.date, ...] = ()
+
+
+def test_codec_decodes_fixed_length_tuples():
+    '''
+    Ensure each element of a fixed length tuple is decoded by its own type, and variadic tuples by one type
+    '''
+    window = decode(Window, {'span': ['2024-08-01', '1.50'], 'dates': ['2024-08-01', '2024-08-02']})
+
+    assert window.span == (datetime.date(2024, 8, 1), decimal.Decimal('1.50'))
+    assert window.dates == (datetime.date(2024, 8, 1), datetime.date(2024, 8, 2))
+    assert decode(Window, {'span': ['2024-08-01', None]}).span == (datetime.date(2024, 8, 1), None)
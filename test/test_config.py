@@ -0,0 +1,82 @@
+import os
+from dataclasses import dataclass
+
+import pytest
+import yaml
+
+from informa.lib import ConfigBase, plugin_context
+from informa.lib.config import ConfigCache
+from informa.lib.plugin import on_config_change, watch_config
+
+
+@dataclass
+class Config(ConfigBase):
+    season: int
+
+
+def test_config_cache_reparses_on_change(tmp_path):
+    '''
+    Ensure config is parsed once, and reparsed after the file changes
+    '''
+    cache = ConfigCache(str(tmp_path))
+    cache.write('test', {'season': 2024})
+
+    config = cache.load('test', Config)
+    assert config == Config(2024)
+    assert cache.load('test', Config) is config
+
+    cache.write('test', {'season': 2025})
+    assert cache.load('test', Config) == Config(2025)
+
+
+def test_config_cache_write_is_atomic(tmp_path):
+    '''
+    Ensure a failed write leaves the previous config in place, and no temp files behind
+    '''
+    cache = ConfigCache(str(tmp_path))
+    cache.write('test', {'season': 2024})
+
+    with pytest.raises(yaml.representer.RepresenterError):
+        cache.write('test', {'season': object()})
+
+    assert cache.load('test', Config) == Config(2024)
+    assert os.listdir(tmp_path) == ['test.yaml']
+
+
+def test_config_cache_notifies_on_change(tmp_path):
+    '''
+    Ensure subscribers are called with the new config on poll
+    '''
+    cache = ConfigCache(str(tmp_path))
+    cache.write('test', {'season': 2024})
+
+    seen = []
+    cache.subscribe('test', Config, seen.append)
+
+    cache.poll()
+    assert seen == []
+
+    cache.write('test', {'season': 2025})
+    cache.poll()
+    assert seen == [Config(2025)]
+
+
+def test_plugin_config_change_callback_sees_edited_config(tmp_path, monkeypatch):
+    '''
+    Ensure a plugin's @on_config_change callback is called with the edited config by the config watch task
+    '''
+    cache = ConfigCache(str(tmp_path))
+    monkeypatch.setattr('informa.lib.plugin.config_cache', cache)
+    cache.write('informa.plugins.test', {'season': 2024})
+
+    seen = []
+    with plugin_context('informa.plugins.test'):
+
+        @on_config_change(Config)
+        def config_changed(config: Config):
+            seen.append(config)
+
+    (tmp_path / 'informa.plugins.test.yaml').write_text('season: 2025\n', encoding='utf8')
+    watch_config()
+
+    assert seen == [Config(2025)]
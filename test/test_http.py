@@ -0,0 +1,121 @@
+import http.server
+import threading
+
+import pytest
+
+from informa.lib import plugin_context
+from informa.lib.http import HttpCache, HttpClient
+
+
+class FlakyHandler(http.server.BaseHTTPRequestHandler):
+    'Respond 503 to the first request, then 200'
+
+    protocol_version = 'HTTP/1.1'
+    requests_seen = 0
+
+    def do_GET(self):  # noqa: N802
+        type(self).requests_seen += 1
+        status = 503 if self.requests_seen == 1 else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def flaky_server():
+    FlakyHandler.requests_seen = 0
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_client_retries_transient_status(flaky_server):
+    '''
+    Ensure a 503 is retried, and the retry succeeds
+    '''
+    client = HttpClient(retries=2, backoff=0)
+
+    resp = client.get(f'http://127.0.0.1:{flaky_server.server_port}/')
+
+    assert resp.status_code == 200  # noqa: PLR2004
+    assert FlakyHandler.requests_seen == 2  # noqa: PLR2004
+
+
+class ETagHandler(http.server.BaseHTTPRequestHandler):
+    'Serve a fixed body with an ETag, honouring If-None-Match'
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # noqa: N802
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', '5')
+        self.end_headers()
+        self.wfile.write(b'hello')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def etag_url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ETagHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_client_get_cached_short_circuits_on_304(tmp_path, monkeypatch, etag_url):
+    '''
+    Ensure the second fetch is conditional, and returns the cached body marked unchanged
+    '''
+    monkeypatch.setattr('informa.lib.http.http_cache', HttpCache(str(tmp_path)))
+
+    client = HttpClient()
+    first = client.get_cached(etag_url)
+    second = client.get_cached(etag_url)
+
+    assert (first.changed, first.text) == (True, 'hello')
+    assert (second.changed, second.text) == (False, 'hello')
+
+
+def test_http_cache_commits_plugin_fetches_after_run(tmp_path, monkeypatch, etag_url):
+    '''
+    Ensure responses fetched during a plugin run are only cached once the run commits them
+    '''
+    cache = HttpCache(str(tmp_path))
+    monkeypatch.setattr('informa.lib.http.http_cache', cache)
+    client = HttpClient()
+
+    with plugin_context('informa.plugins.test'):
+        assert client.get_cached(etag_url).changed is True
+        # Failed run, the response is seen as changed again
+        cache.invalidate_plugin('informa.plugins.test')
+        assert client.get_cached(etag_url).changed is True
+        # Not yet committed
+        assert client.get_cached(etag_url).changed is True
+        cache.commit_fetched('informa.plugins.test')
+        assert client.get_cached(etag_url).changed is False
+
+
+def test_http_client_get_cached_refetches_304_without_cached_body(tmp_path, monkeypatch, etag_url):
+    '''
+    Ensure a 304 with nothing cached is refetched without conditional headers, rather than returning no body
+    '''
+    monkeypatch.setattr('informa.lib.http.http_cache', HttpCache(str(tmp_path)))
+
+    resp = HttpClient().get_cached(etag_url, headers={'If-None-Match': '"v1"'})
+
+    assert (resp.status_code, resp.changed, resp.text) == (200, True, 'hello')
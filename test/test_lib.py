@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from informa.lib import StateBase, pass_plugin_name, plugin_context
+from informa.lib.plugin import _aload_run_persist, load_state, state_lock, write_state
+from informa.lib.store import CachedStore, JsonFileStore
+
+
+@pass_plugin_name
+def plugin_name_of_caller(plugin_name: str) -> str:
+    return plugin_name
+
+
+def test_pass_plugin_name_uses_calling_module():
+    '''
+    Ensure the calling module's name is passed through
+    '''
+    assert plugin_name_of_caller() == __name__
+
+
+def test_pass_plugin_name_uses_plugin_context():
+    '''
+    Ensure the current plugin context takes precedence over the calling module
+    '''
+    with plugin_context('informa.plugins.dans'):
+        assert plugin_name_of_caller() == 'informa.plugins.dans'
+
+    assert plugin_name_of_caller() == __name__
+
+
+def test_async_plugins_run_concurrently_on_loop(tmp_path, monkeypatch):
+    '''
+    Ensure async plugin mains run concurrently on the event loop, and their state is persisted
+    '''
+    monkeypatch.setattr('informa.lib.get_state_store', lambda: JsonFileStore(str(tmp_path)))
+    monkeypatch.setattr('informa.lib.plugin.publish_plugin_run_to_mqtt', lambda *_: None)
+
+    async def run_both():
+        both_running = asyncio.Barrier(2)
+
+        async def main(state: StateBase) -> int:  # noqa: ARG001
+            # Deadlocks unless both plugins are running at once
+            await both_running.wait()
+            return 3
+
+        await asyncio.wait_for(
+            asyncio.gather(
+                *(_aload_run_persist(name, logging.getLogger(), StateBase, main, sync=False) for name in ('a', 'b'))
+            ),
+            timeout=5,
+        )
+
+    asyncio.run(run_both())
+
+    assert JsonFileStore(str(tmp_path)).load('a', StateBase).last_count == 3  # noqa: PLR2004
+    assert JsonFileStore(str(tmp_path)).load('b', StateBase).last_count == 3  # noqa: PLR2004
+
+
+def test_async_runs_of_one_plugin_are_serialised(tmp_path, monkeypatch):
+    '''
+    Ensure overlapping async runs of the same plugin do not run main concurrently, and each run sees the state
+    persisted by the previous run, including on a later event loop
+    '''
+    monkeypatch.setattr('informa.lib.get_state_store', lambda: JsonFileStore(str(tmp_path)))
+    monkeypatch.setattr('informa.lib.plugin.publish_plugin_run_to_mqtt', lambda *_: None)
+
+    running = []
+    overlapped = []
+
+    async def main(state: StateBase) -> int:
+        overlapped.append(bool(running))
+        running.append(state)
+        # Yield to the loop, giving the other run a chance to start main
+        await asyncio.sleep(0.05)
+        running.pop()
+        return (state.last_count or 0) + 1
+
+    async def run_twice():
+        await asyncio.wait_for(
+            asyncio.gather(
+                *(_aload_run_persist('serial', logging.getLogger(), StateBase, main, sync=False) for _ in range(2))
+            ),
+            timeout=5,
+        )
+
+    asyncio.run(run_twice())
+    asyncio.run(run_twice())
+
+    assert overlapped == [False] * 4
+    assert JsonFileStore(str(tmp_path)).load('serial', StateBase).last_count == 4  # noqa: PLR2004
+
+
+def test_state_lock_drops_cached_state_on_failure(tmp_path, monkeypatch):
+    '''
+    Ensure state modified in a failed state_lock block is not returned by the next load
+    '''
+    store = CachedStore(JsonFileStore(str(tmp_path)))
+    monkeypatch.setattr('informa.lib.get_state_store', lambda: store)
+    write_state(StateBase(last_count=1))
+
+    with pytest.raises(ValueError, match='failed'), state_lock():
+        state = load_state(logging.getLogger(), StateBase)
+        state.last_count = 2
+        raise ValueError('failed')
+
+    assert load_state(logging.getLogger(), StateBase).last_count == 1
+
+
+def test_async_run_waits_for_state_lock_held_by_task(tmp_path, monkeypatch):
+    '''
+    Ensure an async run waits, without blocking the loop, while another task holds the plugin's state lock
+    '''
+    monkeypatch.setattr('informa.lib.get_state_store', lambda: JsonFileStore(str(tmp_path)))
+    monkeypatch.setattr('informa.lib.plugin.publish_plugin_run_to_mqtt', lambda *_: None)
+
+    async def main(state: StateBase) -> int:  # noqa: ARG001
+        return 1
+
+    async def run_while_locked() -> list[str]:
+        events = []
+        locked, release = threading.Event(), threading.Event()
+
+        def task():
+            with plugin_context('locked'), state_lock():
+                locked.set()
+                release.wait(5)
+                events.append('task done')
+
+        thread = threading.Thread(target=task)
+        thread.start()
+        locked.wait(5)
+
+        run = asyncio.create_task(_aload_run_persist('locked', logging.getLogger(), StateBase, main, sync=False))
+        await asyncio.sleep(0.05)
+        events.append('loop free')
+        release.set()
+        await asyncio.wait_for(run, timeout=5)
+        events.append('run done')
+        thread.join()
+        return events
+
+    assert asyncio.run(run_while_locked()) == ['loop free', 'task done', 'run done']
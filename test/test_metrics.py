@@ -0,0 +1,26 @@
+import pytest
+
+from informa.lib.metrics import Metrics
+
+
+def test_metrics_timed_records_failed_phase():
+    '''
+    Ensure a phase which raises is still timed, and the run is counted as a failure
+    '''
+    metrics = Metrics()
+
+    with pytest.raises(ValueError), metrics.timed('test', 'main'):
+        raise ValueError
+
+    metrics.run_finished('test', success=False)
+    with metrics.timed('test', 'main'):
+        pass
+    metrics.run_finished('test', success=True, count=4)
+
+    snapshot = metrics.snapshot()['test']
+    assert (snapshot.success, snapshot.failure, snapshot.last_count) == (1, 1, 4)
+    assert snapshot.phases['main'].count == 2  # noqa: PLR2004
+
+    text = metrics.prometheus()
+    assert 'informa_runs_total{plugin="test",result="failure"} 1' in text
+    assert 'informa_phase_seconds_count{plugin="test",phase="main"} 2' in text
@@ -0,0 +1,60 @@
+import datetime
+import socket
+import time
+
+import orjson
+
+from informa.lib import StateBase
+from informa.lib.mqtt import MqttPublisher
+from informa.lib.plugin import publish_plugin_run_to_mqtt
+
+
+def wait_for(predicate, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+def test_mqtt_publishes_run_batch(mqtt_broker, monkeypatch):
+    '''
+    Ensure a plugin run is published as last_run, last_count and run metrics over one connection
+    '''
+    publisher = MqttPublisher('127.0.0.1', mqtt_broker.port)
+    monkeypatch.setattr('informa.lib.plugin.get_publisher', lambda: publisher)
+
+    state = StateBase(last_run=datetime.datetime(2024, 8, 1, tzinfo=datetime.UTC), last_count=3)
+    try:
+        publish_plugin_run_to_mqtt('test', state, 1.5)
+        wait_for(lambda: len(mqtt_broker.messages) == 3)  # noqa: PLR2004
+    finally:
+        publisher.stop()
+
+    assert mqtt_broker.messages[:2] == [
+        ('informa/test/last_run', b'2024-08-01T00:00:00+00:00', True),
+        ('informa/test/last_count', b'3', True),
+    ]
+    assert orjson.loads(mqtt_broker.messages[2][1])['duration'] == 1.5  # noqa: PLR2004
+
+
+def test_mqtt_buffers_while_broker_down(start_mqtt_broker):
+    '''
+    Ensure messages published while the broker is down are sent once it is reachable
+    '''
+    # Reserve a free port, which is not listening
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    publisher = MqttPublisher('127.0.0.1', port)
+    publisher.publish([('informa/test/a', 'one', False), ('informa/test/b', 'two', False)])
+    assert publisher.queued == 2  # noqa: PLR2004
+
+    try:
+        broker = start_mqtt_broker(port)
+
+        wait_for(lambda: len(broker.messages) == 2)  # noqa: PLR2004
+        assert [m[:2] for m in broker.messages] == [('informa/test/a', b'one'), ('informa/test/b', b'two')]
+    finally:
+        publisher.stop()
@@ -0,0 +1,135 @@
+import datetime
+import decimal
+import time
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from informa.plugins.dans import (
+    Config,
+    FailedProductQuery,
+    History,
+    Product,
+    State,
+    compact_history,
+    history_table,
+    main,
+    weighted_median,
+    weighted_quantiles,
+    write_history,
+)
+
+
+def fake_query_product(sess, product: Product) -> decimal.Decimal:  # noqa: ARG001
+    # Earlier products respond slower, so queries complete out of order
+    time.sleep(0.05 * (3 - int(product.id)))
+    if product.id == '1':
+        raise FailedProductQuery('HTTP 500')
+    return decimal.Decimal(product.id)
+
+
+@patch('informa.plugins.dans.send_alert')
+@patch('informa.plugins.dans.query_product', side_effect=fake_query_product)
+def test_dans_main_queries_concurrently_in_order(mock_query_product, mock_send_alert):
+    '''
+    Ensure history is appended in config order, and a failed product query doesn't affect the others
+    '''
+    products = [Product(str(i), f'Wine {i}', target=10) for i in range(3)]
+    state = State()
+
+    assert main(state, Config(products)) == 2  # noqa: PLR2004
+
+    assert [h.product.id for h in state.history] == ['0', '2']
+    assert mock_send_alert.call_count == 2  # noqa: PLR2004
+
+
+def test_dans_history_index_tracks_alerts_across_pruning():
+    '''
+    Ensure last alert lookup follows appends, and expired alerts are forgotten when pruned
+    '''
+    product = Product('1', 'Wine', target=10)
+    start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    state = State(
+        history=[
+            History(product, decimal.Decimal(9), start + datetime.timedelta(days=d), alerted=True) for d in range(3)
+        ]
+    )
+
+    assert state.index.get_last_alert(product) is state.history[2]
+
+    state.index.append(History(product, decimal.Decimal(12), start + datetime.timedelta(days=3)))
+    assert state.index.get_last_alert(product).ts == start + datetime.timedelta(days=2)
+
+    assert len(state.index.prune(start + datetime.timedelta(days=3))) == 3  # noqa: PLR2004
+    assert state.index.get_last_alert(product) is None
+    assert len(state.history) == 1
+
+
+def test_dans_history_table_stores_integer_cents():
+    '''
+    Ensure prices are exported as exact integer cents
+    '''
+    product = Product('1', 'Wine', target=10)
+    ts = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+
+    df = history_table(
+        State(history=[History(product, decimal.Decimal('12.99'), ts), History(product, decimal.Decimal('0.1'), ts)])
+    )
+
+    assert df.column('price_cents').to_pylist() == [1299, 10]
+    assert df.column('target_cents').to_pylist() == [1000, 1000]
+
+
+def test_dans_compact_history_preserves_count_and_range():
+    '''
+    Ensure compacted history keeps query count, lowest & highest price, and recent history at full resolution
+    '''
+    product = Product('1', 'Wine', target=10)
+    now = datetime.datetime(2024, 6, 1, 12, tzinfo=datetime.UTC)
+    state = State(
+        history=[
+            History(product, decimal.Decimal(10 + h % 7), now - datetime.timedelta(hours=12 * h))
+            for h in reversed(range(1000))
+        ]
+    )
+
+    compact_history(state, now, full_resolution_days=90, daily_summary_days=400)
+
+    assert state.history[0].ts >= now - datetime.timedelta(days=91)
+    assert state.daily
+    assert state.weekly
+    assert len(state.history) + sum(s.count for s in (*state.daily, *state.weekly)) == 1000  # noqa: PLR2004
+
+    table = history_table(state)
+    assert pc.sum(table.column('weight')).as_py() == 1000  # noqa: PLR2004
+    assert pc.min_max(table.column('price_cents')).as_py() == {'min': 1000, 'max': 1600}
+
+
+def test_dans_write_history_creates_directory(tmp_path):
+    '''
+    Ensure history is written on a fresh install, where the state directory does not yet exist, without leaving
+    temp files behind
+    '''
+    product = Product('1', 'Wine', target=10)
+    table = history_table(
+        State(history=[History(product, decimal.Decimal('12.99'), datetime.datetime.now(datetime.UTC))])
+    )
+    path = tmp_path / 'state' / 'history.parquet'
+
+    write_history(table, str(path))
+
+    assert pq.read_table(path).column('price_cents').to_pylist() == [1299]
+    assert [p.name for p in path.parent.iterdir()] == ['history.parquet']
+
+
+def test_dans_weighted_median_averages_even_split():
+    '''
+    Ensure the middle prices are averaged when the weight splits evenly, and the weighted middle taken otherwise
+    '''
+    assert weighted_median([(decimal.Decimal('12'), 2), (decimal.Decimal('10'), 2)]) == decimal.Decimal('11.00')
+    assert weighted_median([(decimal.Decimal('12'), 3), (decimal.Decimal('10'), 2)]) == decimal.Decimal('12')
+
+    df = pd.DataFrame({'name': ['a', 'a', 'b', 'b'], 'price_cents': [1200, 1000, 1000, 1200], 'weight': [2, 2, 2, 3]})
+    assert weighted_quantiles(df, 'name', [0.5])[0.5].to_dict() == {'a': 1100, 'b': 1200}
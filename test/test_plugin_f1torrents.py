@@ -0,0 +1,361 @@
+import asyncio
+import datetime
+import io
+import socket
+import threading
+import xmlrpc.client
+from unittest.mock import patch
+
+import pytest
+
+from informa.lib.codec import decode
+from informa.plugins import f1torrents
+from informa.plugins.f1torrents import (
+    DEFAULT_TITLE_RULES,
+    RT_PRI_HIGH,
+    RT_PRI_NORM,
+    AsyncRTorrent,
+    Config,
+    Download,
+    Race,
+    RaceWeekends,
+    RtorrentError,
+    SCGITransport,
+    TitleRule,
+    add_magnet_to_rtorrent,
+    calendar_stale,
+    iter_response_array,
+    match_title,
+    race_weekends,
+    set_torrent_file_priorities,
+)
+
+
+def race(day: int) -> Race:
+    return Race(f'Race {day}', datetime.datetime(2025, 3, day, 4, tzinfo=datetime.UTC))
+
+
+@pytest.mark.parametrize(
+    ('day', 'expected'),
+    [
+        (1, False),
+        (7, False),
+        (8, True),
+        (10, True),
+        (12, True),
+        (13, False),
+        (15, True),
+        (21, True),
+        (22, False),
+    ],
+)
+def test_race_weekends_contains(day, expected):
+    '''
+    Ensure days within two days of a race are in a race weekend, including across back-to-back races
+    '''
+    weekends = RaceWeekends([race(17), race(10), race(19)])
+
+    assert (datetime.date(2025, 3, day) in weekends) is expected
+
+
+def test_race_weekends_cached_per_config():
+    '''
+    Ensure race weekends are rebuilt only for a newly loaded config
+    '''
+    config = Config(2025, [race(10)])
+
+    assert race_weekends(config) is race_weekends(config)
+    assert race_weekends(Config(2025, [race(10)])) is not race_weekends(config)
+
+
+def test_calendar_stale():
+    '''
+    Ensure a missing or old calendar is refreshed
+    '''
+    now = datetime.datetime.now(tz=datetime.UTC)
+
+    assert calendar_stale(Config(2025))
+    assert calendar_stale(Config(2025, [race(10)], now - datetime.timedelta(days=8)))
+    assert not calendar_stale(Config(2025, [race(10)], now - datetime.timedelta(days=1)))
+
+
+@pytest.mark.parametrize(
+    ('title', 'expected'),
+    [
+        ('Formula.1.2025x04.Bahrain.Race.SkyF1HD.1080p', '2025x04ra'),
+        ('Formula.1.2025x04.Bahrain.Qualifying.SkyF1HD.1080p', '2025x04qu'),
+        ('Formula.1.2025x06.Miami.Sprint.Qualifying.SkyF1HD.1080p', '2025x06sq'),
+        ('Formula.1.2025x06.Miami.Sprint.SkyF1HD.1080p', '2025x06sr'),
+        ('Formula.1.2025x06.Miami.Sprint.Race.SkyF1HD.1080p', '2025x06sr'),
+        ('Formula.1.2025.Season.Review.SkyF1HD.1080p', '2025.Serv'),
+        ('Formula.1.2025.Season.Review.Part.Two.SkyF1HD.1080p', '2025.Serv'),
+        ('Formula.1.2025x04.Bahrain.Pre-Race.Buildup.SkyF1HD.1080p', None),
+        ('Formula.1.2025x04.Bahrain.Teds.Race.Notebook.SkyF1HD.1080p', None),
+        ('Formula.1.2025x04.Bahrain.Race.SkyF1HD.SD', None),
+        ('Formula.1.2024x04.Bahrain.Race.SkyF1HD.1080p', None),
+        ('Formula.2.2025x04.Bahrain.Race.SkyF1HD.1080p', None),
+    ],
+)
+def test_match_title_default_rules(title, expected):
+    '''
+    Ensure the default rules key each session of the current season
+    '''
+    assert match_title(title, list(DEFAULT_TITLE_RULES), 2025) == expected
+
+
+def test_match_title_configured_rules():
+    '''
+    Ensure rules for other series are decoded from config, and keyed with their prefix
+    '''
+    config = decode(
+        Config,
+        {
+            'current_season': 2025,
+            'title_rules': [
+                {
+                    'pattern': r'^Formula\.2\.(?P<season>\d{4})x(?P<round>\d{2})\..*\.(?P<session>Feature|Sprint)\.',
+                    'sessions': {'Feature': 'fe', 'Sprint': 'sp'},
+                    'key_prefix': 'f2-',
+                },
+            ],
+        },
+    )
+
+    assert config.title_rules == [TitleRule(config.title_rules[0].pattern, {'Feature': 'fe', 'Sprint': 'sp'}, 'f2-')]
+    assert match_title('Formula.2.2025x03.Bahrain.Feature.Race.1080p', config.title_rules, 2025) == 'f2-2025x03fe'
+    assert match_title('Formula.1.2025x03.Bahrain.Race.SkyF1HD.1080p', config.title_rules, 2025) is None
+
+
+def test_written_config_does_not_pin_default_rules():
+    '''
+    Ensure config written after a calendar update leaves out the built-in rules, so changes to them still apply
+    '''
+    config = Config(current_season=2025, calendar=[race(16)])
+
+    assert config.to_dict()['title_rules'] == []
+    config = decode(Config, config.to_dict())
+    assert config.rules == DEFAULT_TITLE_RULES
+    assert match_title('Formula.1.2025x03.Bahrain.Race.SkyF1HD.1080p', config.rules, 2025) == '2025x03ra'
+
+
+def test_config_drops_pinned_default_rules():
+    '''
+    Ensure a copy of the previous built-in rule, written to config by earlier versions, gives the current defaults
+    '''
+    config = decode(
+        Config,
+        {
+            'current_season': 2025,
+            'title_rules': [
+                {
+                    'pattern': r'^Formula\.1\.(?P<season>\d{4})(?:x(?P<round>\d{2}))?\.(?=.*\.SkyF1HD\.1080p)'
+                    r'(?!.*Teds)(?:[^.]+\.)*?'
+                    r'(?P<session>Sprint\.Qualifying|Sprint\.Shootout|Sprint|Qualifying|Race|Season\.Review)\.',
+                    'sessions': {'Race': 'ra'},
+                },
+            ],
+        },
+    )
+
+    assert config.title_rules == []
+    assert config.rules == DEFAULT_TITLE_RULES
+
+
+@pytest.fixture
+def rtorrent(fake_rtorrent):
+    '''
+    Point the plugin at a FakeRtorrent, with no torrents yet settled by the priority sweep
+    '''
+    f1torrents._settled_torrents.clear()
+
+    with (
+        patch('informa.plugins.f1torrents.RTORRENT_HOST', '127.0.0.1'),
+        patch('informa.plugins.f1torrents.RTORRENT_PORT', fake_rtorrent.port),
+    ):
+        yield fake_rtorrent
+
+
+def sweep(rtorrent) -> list[str]:
+    'Run the priority sweep, returning the methods it called'
+    rtorrent.calls.clear()
+    asyncio.run(set_torrent_file_priorities())
+    return rtorrent.calls
+
+
+def priorities(rtorrent, hash_id: str) -> list[int]:
+    return [f[4] for f in rtorrent.torrents[hash_id]['files']]
+
+
+def test_set_torrent_file_priorities_batches_calls(rtorrent):
+    '''
+    Ensure a sweep costs one request to list torrents, one for their files, and one for all updates
+    '''
+    rtorrent.add_torrent('HASH1', 'Formula.1.2025x01.Australia.SkyF1HD.1080p', ['01.Pre-Race.mp4', '02.Race.mp4'])
+    rtorrent.add_torrent('HASH2', 'Formula.1.2025x02.China.SkyF1HD.1080p', ['02.Race.mp4'], tag='F1')
+    rtorrent.add_torrent('HASH3', 'Some.Other.Show', ['02.Episode.mp4'])
+    rtorrent.torrents['HASH2']['files'][0][4] = RT_PRI_HIGH
+
+    assert sweep(rtorrent) == ['d.multicall2', 'system.multicall', 'system.multicall']
+
+    assert rtorrent.torrents['HASH1']['tag'] == 'F1'
+    assert priorities(rtorrent, 'HASH1') == [RT_PRI_NORM, RT_PRI_HIGH]
+    assert rtorrent.torrents['HASH3']['tag'] == ''
+    assert priorities(rtorrent, 'HASH3') == [RT_PRI_NORM]
+
+
+def test_set_torrent_file_priorities_skips_settled(rtorrent):
+    '''
+    Ensure settled torrents are not examined again, unless their tag changes or their metadata was pending
+    '''
+    rtorrent.add_torrent('HASH1', 'Formula.1.2025x01.Australia.SkyF1HD.1080p', ['02.Race.mp4'])
+    rtorrent.add_torrent('HASH2', 'Formula.1.2025x02.China.SkyF1HD.1080p', [], meta=True)
+
+    sweep(rtorrent)
+
+    # Only the torrent with pending metadata is examined again
+    rtorrent.torrents['HASH2'].update(meta=False, files=[['02.Race.mp4', 1024, 1, 0, 1]])
+    assert sweep(rtorrent) == ['d.multicall2', 'system.multicall', 'system.multicall']
+    assert priorities(rtorrent, 'HASH2') == [RT_PRI_HIGH]
+
+    # Once settled, a sweep only lists downloads
+    assert sweep(rtorrent) == ['d.multicall2']
+
+    # A changed tag is set again
+    rtorrent.torrents['HASH1']['tag'] = 'Other'
+    assert sweep(rtorrent) == ['d.multicall2', 'system.multicall', 'system.multicall']
+    assert rtorrent.torrents['HASH1']['tag'] == 'F1'
+
+
+@patch('informa.lib.mailgun.send')
+def test_added_magnets_are_tagged_and_prioritised(mock_send, rtorrent):
+    '''
+    Ensure a found race is added to rtorrent, then tagged and prioritised by the sweep
+    '''
+    races = {
+        '2025x01ra': Download(
+            '2025x01ra',
+            'Formula.1.2025x01.Australia.Race.SkyF1HD.1080p',
+            'magnet:?xt=urn:btih:abc123&dn=Formula.1.2025x01.Australia.Race.SkyF1HD.1080p',
+        )
+    }
+
+    assert add_magnet_to_rtorrent(races)
+    assert races['2025x01ra'].added_to_rtorrent
+    assert mock_send.call_count == 1
+
+    sweep(rtorrent)
+
+    assert rtorrent.torrents['ABC123']['tag'] == 'F1'
+    assert priorities(rtorrent, 'ABC123') == [RT_PRI_NORM, RT_PRI_HIGH, RT_PRI_NORM]
+
+
+def test_async_rtorrent_raises_on_fault_and_down(fake_rtorrent):
+    '''
+    Ensure faults and connection failures are raised as RtorrentError
+    '''
+    rt = AsyncRTorrent('127.0.0.1', fake_rtorrent.port)
+
+    with pytest.raises(RtorrentError, match='Could not find info-hash'):
+        asyncio.run(rt.call('d.custom1.set', 'MISSING', 'F1'))
+
+    fake_rtorrent.shutdown()
+    fake_rtorrent.server_close()
+
+    with pytest.raises(RtorrentError, match='Rtorrent is down'):
+        asyncio.run(rt.call('d.multicall2', '', 'main', 'd.hash='))
+
+
+def test_async_rtorrent_times_out():
+    '''
+    Ensure a call to an unresponsive rtorrent times out
+    '''
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        rt = AsyncRTorrent('127.0.0.1', server.getsockname()[1], timeout=0.1)
+
+        with pytest.raises(RtorrentError, match='Failed calling'):
+            asyncio.run(rt.call('d.multicall2', '', 'main', 'd.hash='))
+
+
+def test_async_rtorrent_reads_empty_body():
+    '''
+    Ensure a Content-Length of zero ends the response, without waiting for the connection to close
+    '''
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        done = threading.Event()
+
+        def respond():
+            conn, _ = server.accept()
+            with conn:
+                conn.recv(65536)
+                conn.sendall(b'Status: 200 OK\r\nContent-Length: 0\r\n\r\n')
+                done.wait(5)
+
+        thread = threading.Thread(target=respond)
+        thread.start()
+
+        async def read() -> list[bytes]:
+            rt = AsyncRTorrent('127.0.0.1', server.getsockname()[1], timeout=1)
+            return [chunk async for chunk in rt._stream('system.listMethods', ())]  # noqa: SLF001
+
+        try:
+            assert asyncio.run(read()) == []
+        finally:
+            done.set()
+            thread.join()
+
+
+def scgi_response(body: bytes, content_length: bool = True) -> io.BufferedReader:
+    headers = b'Status: 200 OK\r\nContent-Type: text/xml\r\n'
+    if content_length:
+        headers += b'Content-Length: %d\r\n' % len(body)
+    # Trailing bytes beyond the Content-Length are not part of the response
+    return io.BufferedReader(io.BytesIO(headers + b'\r\n' + body + b'garbage'))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024])
+def test_iter_response_array_streams_items(chunk_size):
+    '''
+    Ensure array items are parsed from a response split at any point
+    '''
+    downloads = [['hash1', 'Formula.1.2025x01', 1024, 'F1'], ['hash2', 'Other & <Show>', 0, '']]
+    body = xmlrpc.client.dumps((downloads,), methodresponse=True).encode()
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    assert list(iter_response_array(chunks)) == downloads
+
+
+def test_iter_response_array_raises_fault():
+    '''
+    Ensure a fault response is raised as xmlrpc.client.Fault
+    '''
+    body = xmlrpc.client.dumps(xmlrpc.client.Fault(-501, 'Unsupported target type'), methodresponse=True).encode()
+
+    with pytest.raises(xmlrpc.client.Fault, match='Unsupported target type'):
+        list(iter_response_array([body]))
+
+
+@pytest.mark.parametrize('content_length', [True, False])
+def test_scgi_read_response(content_length):
+    '''
+    Ensure SCGI headers are skipped, and the body is read up to the Content-Length when sent
+    '''
+    body = xmlrpc.client.dumps(('ok',), methodresponse=True).encode()
+
+    data = b''.join(SCGITransport().read_response(scgi_response(body, content_length)))
+
+    assert data == (body if content_length else body + b'garbage')
+
+
+def test_scgi_read_response_empty_body():
+    '''
+    Ensure a Content-Length of zero is an empty body, rather than reading to the end of the stream
+    '''
+    assert list(SCGITransport().read_response(scgi_response(b''))) == []
+
+
+def test_scgi_read_response_without_headers():
+    '''
+    Ensure a response with no header terminator is an error
+    '''
+    with pytest.raises(RtorrentError):
+        list(SCGITransport().read_response(io.BufferedReader(io.BytesIO(b'Status: 200 OK'))))
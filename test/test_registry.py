@@ -0,0 +1,37 @@
+import sys
+
+from informa.lib import get_plugin
+from informa.lib.registry import find_by_cli_name, load_plugin, manifest
+
+
+def test_manifest_resolves_cli_names_without_import():
+    '''
+    Ensure plugin CLI names are parsed from source, and the plugins are not imported
+    '''
+    sys.modules.pop('informa.plugins.megadl', None)
+
+    assert find_by_cli_name('ha-releases').module_name == 'ha_releases'
+    assert find_by_cli_name('megadl').cli_help == 'MEGA zip downloader'
+    assert 'informa.plugins.megadl' not in sys.modules
+
+
+def test_manifest_includes_plugins_without_cli():
+    '''
+    Ensure API-only plugins are in the manifest, without a CLI name
+    '''
+    assert manifest()['mp3.py'].cli_name is None
+
+
+def test_load_plugin_populates_descriptor():
+    '''
+    Ensure the plugin descriptor is populated as the plugin is imported
+    '''
+    module = load_plugin('tahbilk.py')
+    plugin = get_plugin(module.__name__)
+
+    assert plugin.state_cls is module.State
+    assert plugin.config_cls is None
+    assert plugin.logger is module.logger
+    assert plugin.main is module.main
+    assert [t.name for t in plugin.tasks] == ['informa.plugins.tahbilk']
+    assert plugin.load_time > 0
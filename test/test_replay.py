@@ -0,0 +1,101 @@
+import asyncio
+import http.server
+import threading
+
+import pytest
+
+from informa.exceptions import ReplayMissing
+from informa.lib import get_plugin
+from informa.lib.http import HttpClient
+from informa.lib.registry import load_plugin
+from informa.lib.replay import Cassette, fixture_path, run_main
+from informa.plugins.f1torrents import AsyncRTorrent, RTorrent
+
+
+@pytest.mark.parametrize(
+    ('module_name', 'expected', 'sends'),
+    [
+        ('dans', 2, 2),
+        ('f1torrents', 1, 1),
+        ('ha_releases', 1, 1),
+        ('tahbilk', 3, 0),
+    ],
+)
+def test_replay_runs_plugin_offline(module_name, expected, sends):
+    '''
+    Ensure each recorded plugin runs from its cassette, and any Mailgun sends are captured
+    '''
+    load_plugin(f'{module_name}.py')
+    plugin = get_plugin(f'informa.plugins.{module_name}')
+
+    with Cassette.load(fixture_path(plugin.name)) as cassette:
+        ret = run_main(plugin, cassette)
+
+    assert ret == expected
+    assert len(cassette.mailgun) == sends
+
+
+class HelloHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # noqa: N802
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', '5')
+        self.end_headers()
+        self.wfile.write(b'hello')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_record_then_replay(tmp_path):
+    '''
+    Ensure a recorded response is replayed without the server, and unrecorded requests fail
+    '''
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), HelloHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/'
+    path = str(tmp_path / 'cassette.json')
+
+    try:
+        with Cassette(path, record=True):
+            assert HttpClient().get(url).text == 'hello'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    with Cassette.load(path):
+        resp = HttpClient().get(url)
+        assert resp.status_code == 200  # noqa: PLR2004
+        assert resp.text == 'hello'
+
+        with pytest.raises(ReplayMissing):
+            HttpClient().get(url)
+
+
+def test_record_then_replay_rtorrent(tmp_path, fake_rtorrent):
+    '''
+    Ensure sync and asyncio rtorrent calls, including streamed responses, are recorded and replayed
+    '''
+    fake_rtorrent.add_torrent('ABC', 'Formula.1.2024x12.Britain.Race.SkyF1HD.1080p', ['02.Race.Session.mkv'])
+    path = str(tmp_path / 'cassette.json')
+
+    def downloads() -> list:
+        return list(RTorrent('127.0.0.1', fake_rtorrent.port).iter_downloads())
+
+    def torrents() -> dict:
+        return asyncio.run(AsyncRTorrent('127.0.0.1', fake_rtorrent.port).get_torrents())
+
+    with Cassette(path, record=True):
+        recorded = (downloads(), torrents())
+
+    calls = len(fake_rtorrent.calls)
+
+    with Cassette.load(path):
+        assert (downloads(), torrents()) == recorded
+
+        with pytest.raises(ReplayMissing):
+            downloads()
+
+    assert len(fake_rtorrent.calls) == calls
@@ -0,0 +1,21 @@
+from informa.lib import scrape
+
+
+def test_scrape_select_matches_tag_class_and_descendants():
+    '''
+    Ensure simple CSS selectors match by tag, by one of many classes, and through descendants
+    '''
+    page = scrape.parse(
+        '<html><body>'
+        '<div class="product-info featured"><h4> Shiraz </h4><span class="old-price">$20</span></div>'
+        '<div class="product-info-extra"><h4>Not a product</h4></div>'
+        '<p class="product-info">Not a div</p>'
+        '</body></html>'
+    )
+
+    products = scrape.select(page, 'div.product-info')
+
+    assert len(products) == 1
+    assert scrape.text(scrape.select(products[0], 'h4')[0]) == 'Shiraz'
+    assert [scrape.text(e) for e in scrape.select(page, 'div .old-price')] == ['$20']
+    assert scrape.select_one(page, 'article') is None
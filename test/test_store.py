@@ -0,0 +1,172 @@
+import datetime
+import decimal
+import logging
+from dataclasses import dataclass
+
+import pytest
+
+from informa.exceptions import StateJsonDecodeError
+from informa.lib import StateBase, _load_state
+from informa.lib.store import CachedStore, JsonFileStore, SqliteStore, append_only
+
+
+@dataclass
+class Item:
+    name: str
+    price: decimal.Decimal
+    ts: datetime.datetime
+
+
+@dataclass
+class State(StateBase):
+    items: list[Item] = append_only()
+    seen: set[str] | None = None
+
+
+def make_item(i: int) -> Item:
+    return Item(f'item{i}', decimal.Decimal(f'{i}.99'), datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC))
+
+
+def collection_seqs(store: SqliteStore) -> list[int]:
+    return [seq for (seq,) in store._conn().execute('SELECT seq FROM collection ORDER BY seq')]  # noqa: SLF001
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteStore(str(tmp_path))
+
+
+def test_sqlite_store_roundtrip(store):
+    '''
+    Ensure state is inflated back into the State dataclass
+    '''
+    state = State(last_count=2, items=[make_item(1), make_item(2)], seen={'a'})
+    store.write('test', state)
+
+    assert store.load('test', State) == state
+
+
+def test_sqlite_store_appends_incrementally(store):
+    '''
+    Ensure only new items are written, and trimmed items are removed
+    '''
+    store.write('test', State(items=[make_item(i) for i in range(3)]))
+
+    state = store.load('test', State)
+    del state.items[0]
+    state.items.append(make_item(3))
+    store.write('test', state)
+
+    assert collection_seqs(store) == [1, 2, 3]
+    assert [i.name for i in store.load('test', State).items] == ['item1', 'item2', 'item3']
+
+
+def test_sqlite_store_rewrites_reassigned_collection(store):
+    '''
+    Ensure a reassigned or reordered collection is rewritten in full
+    '''
+    store.write('test', State(items=[make_item(i) for i in range(3)]))
+
+    state = store.load('test', State)
+    state.items = [i for i in state.items if i.name != 'item1']
+    store.write('test', state)
+
+    assert collection_seqs(store) == [0, 1]
+    assert [i.name for i in store.load('test', State).items] == ['item0', 'item2']
+
+
+def test_sqlite_store_migrates_from_json(tmp_path, store):
+    '''
+    Ensure state missing from the database is loaded from the JSON store
+    '''
+    state = State(last_count=1, items=[make_item(1)])
+    JsonFileStore(str(tmp_path)).write('test', state)
+
+    migrated = store.load('test', State)
+    assert migrated == state
+
+    store.write('test', migrated)
+    assert collection_seqs(store) == [0]
+
+
+def test_json_store_skips_unchanged_write(tmp_path):
+    '''
+    Ensure the state file is not rewritten when its content is unchanged, and no temp files are left behind
+    '''
+    store = JsonFileStore(str(tmp_path), fsync='always')
+    state = State(last_count=1, items=[make_item(1)])
+    store.write('test', state)
+
+    path = tmp_path / 'test.json'
+    inode = path.stat().st_ino
+
+    store.write('test', store.load('test', State))
+    assert path.stat().st_ino == inode
+
+    state.last_count = 2
+    store.write('test', state)
+    assert path.stat().st_ino != inode
+
+    assert [p.name for p in tmp_path.iterdir()] == ['test.json']
+
+
+def test_json_store_writes_after_external_change(tmp_path):
+    '''
+    Ensure a write is not skipped when the file was changed by another process
+    '''
+    store = JsonFileStore(str(tmp_path))
+    state = State(last_count=1)
+    store.write('test', state)
+
+    (tmp_path / 'test.json').write_text('{"last_count": 99}', encoding='utf8')
+
+    store.write('test', state)
+    assert store.load('test', State).last_count == 1
+
+
+def test_cached_store_reuses_state_until_changed(tmp_path):
+    '''
+    Ensure the inflated state is reused between loads, and reloaded after another process writes the file
+    '''
+    store = CachedStore(JsonFileStore(str(tmp_path)))
+    store.write('test', State(last_count=1))
+
+    state = store.load('test', State)
+    assert store.load('test', State) is state
+
+    JsonFileStore(str(tmp_path)).write('test', State(last_count=2))
+
+    reloaded = store.load('test', State)
+    assert reloaded is not state
+    assert reloaded.last_count == 2
+
+
+def test_cached_store_skips_clean_write(tmp_path):
+    '''
+    Ensure state is only written when dirty
+    '''
+    store = CachedStore(JsonFileStore(str(tmp_path)))
+    store.write('test', State(last_count=1))
+    version = store.version('test')
+
+    state = store.load('test', State)
+    store.write('test', state)
+    assert store.version('test') == version
+
+    state.items.append(make_item(1))
+    store.write('test', state)
+    assert store.version('test') != version
+
+
+def test_load_state_fails_on_corrupt_state(tmp_path, monkeypatch):
+    '''
+    Ensure corrupt state fails the load, rather than resetting state, and the corrupt file is left in place
+    '''
+    monkeypatch.setattr('informa.lib.get_state_store', lambda: JsonFileStore(str(tmp_path)))
+    path = tmp_path / 'test.json'
+    path.write_text('{"last_count": 1', encoding='utf8')
+
+    with pytest.raises(StateJsonDecodeError):
+        _load_state('test', logging.getLogger(), State)
+
+    assert path.read_text(encoding='utf8') == '{"last_count": 1'